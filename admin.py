@@ -0,0 +1,50 @@
+"""
+Admin dashboard.
+
+A password-protected page with store and cache statistics and the newest
+stored timetables. It is closed unless ADMIN_PASSWORD is set.
+"""
+import hmac
+import time
+from functools import wraps
+from typing import Any, Callable
+
+from flask import Blueprint, flash, redirect, render_template, request, session, url_for
+
+from cache import result_cache
+from config import ADMIN_PASSWORD
+from store import recent_timetables, store_stats
+
+admin = Blueprint("admin", __name__, url_prefix="/admin")
+
+def login_required(view: Callable[..., Any]) -> Callable[..., Any]:
+    @wraps(view)
+    def wrapped(*args: Any, **kwargs: Any) -> Any:
+        if not session.get("admin"):
+            return redirect(url_for("admin.login"))
+        return view(*args, **kwargs)
+    return wrapped
+
+@admin.route("/login", methods=["GET", "POST"])
+def login():
+    """Log in with ADMIN_PASSWORD."""
+    if request.method == "POST":
+        password = request.form.get("password", "")
+        if ADMIN_PASSWORD and hmac.compare_digest(password.encode("utf-8"), ADMIN_PASSWORD.encode("utf-8")):
+            session["admin"] = True
+            return redirect(url_for("admin.dashboard"))
+        flash("Invalid password" if ADMIN_PASSWORD else "The admin dashboard is disabled")
+    return render_template("admin/login.html")
+
+@admin.route("/logout")
+def logout():
+    session.pop("admin", None)
+    return redirect(url_for("admin.login"))
+
+@admin.route("/")
+@login_required
+def dashboard():
+    """Store and cache statistics with the newest stored timetables."""
+    recent = [dict(t, created=time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(t["created"])))
+              for t in recent_timetables()]
+    return render_template("admin/dashboard.html", store=store_stats(), cache=result_cache.stats(), recent=recent)
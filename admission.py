@@ -0,0 +1,204 @@
+"""
+Request Coalescing and Admission Control.
+
+`SingleFlight` lets concurrent identical requests share one computation:
+the first caller for a key runs it and everyone arriving meanwhile waits
+for that result. `AdmissionController` bounds how many generations run at
+once; a few more may wait, served round-robin across clients so one busy
+client cannot starve the rest, and everything past that is shed at once
+with a 429 and a Retry-After estimate instead of piling up into timeouts.
+Both are per process, like the job queue.
+"""
+import copy
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple, Type
+
+from config import (
+    ADMISSION_MAX_ACTIVE, ADMISSION_QUEUE_LIMIT, ADMISSION_PER_CLIENT, ADMISSION_QUEUE_TIMEOUT
+)
+from exceptions import OverloadedError
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key; results are copied for followers so nobody shares mutable state."""
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any], retry_on: Tuple[Type[BaseException], ...] = ()) -> Tuple[Any, bool]:
+        """
+        Run `fn` once for all concurrent callers with the same `key`.
+
+        Args:
+            key: Identity of the computation.
+            fn: The computation.
+            retry_on: Errors of the leader that are its own business (such as
+                its cancellation); a follower seeing one runs the call again.
+
+        Returns:
+            Tuple of the result and whether this caller ran it (False when it was shared).
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    call.followers += 1
+            if leader:
+                try:
+                    result = fn()
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    if call.error is None and call.followers:
+                        # Followers copy this snapshot, never the leader's object, which it may go on changing
+                        call.result = copy.deepcopy(result)
+                        logger.info(f"Shared one computation with {call.followers} concurrent request(s)")
+                    call.done.set()
+                return result, True
+
+            call.done.wait()
+            if call.error is None:
+                return copy.deepcopy(call.result), False
+            if not isinstance(call.error, retry_on):
+                raise call.error
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+class _Ticket:
+    __slots__ = ("granted",)
+
+    def __init__(self):
+        self.granted = False
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, per-client round-robin wait queue."""
+    def __init__(self, max_active: int = ADMISSION_MAX_ACTIVE, queue_limit: int = ADMISSION_QUEUE_LIMIT,
+                 per_client: int = ADMISSION_PER_CLIENT, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        """
+        Args:
+            max_active: Generations allowed to run at once.
+            queue_limit: Requests allowed to wait for a slot; more are shed.
+            per_client: Running plus waiting requests allowed per client.
+            queue_timeout: Seconds a request may wait before it is shed.
+        """
+        self.max_active = max(1, max_active)
+        self.queue_limit = queue_limit
+        self.per_client = per_client
+        self.queue_timeout = queue_timeout
+        self._changed = threading.Condition()
+        self._active = 0
+        self._queued = 0
+        self._held: Dict[str, int] = {}
+        # Client -> waiting tickets; granting pops the first client and re-appends it, giving round robin
+        self._waiting: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        # Smoothed seconds a slot is held, for Retry-After
+        self._hold_time = 1.0
+
+    @contextmanager
+    def admit(self, client: str) -> Iterator[None]:
+        """
+        Hold a generation slot for the block.
+
+        Raises:
+            OverloadedError: 429 when the client has too many requests in, the
+                queue is full, or no slot frees up within `queue_timeout`.
+        """
+        with self._changed:
+            if self._held.get(client, 0) >= self.per_client:
+                raise self._shed("client", f"Too many concurrent requests from this client (limit {self.per_client})")
+            if self._active < self.max_active and not self._waiting:
+                self._active += 1
+                outcome = "admitted"
+            elif self._queued >= self.queue_limit:
+                raise self._shed("queue", "Server is busy, try again later")
+            else:
+                ticket = _Ticket()
+                self._waiting.setdefault(client, deque()).append(ticket)
+                self._queued += 1
+                outcome = "queued"
+            self._held[client] = self._held.get(client, 0) + 1
+            if outcome == "queued" and not self._changed.wait_for(lambda: ticket.granted, timeout=self.queue_timeout):
+                self._withdraw(client, ticket)
+                self._release_client(client)
+                raise self._shed("timeout", "Server is busy, try again later")
+        metrics.inc("timetable_admission_total", outcome=outcome)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - start
+            with self._changed:
+                self._hold_time = 0.8 * self._hold_time + 0.2 * held
+                self._active -= 1
+                self._release_client(client)
+                self._grant()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._changed:
+            return {
+                "active": self._active,
+                "queued": self._queued,
+                "max_active": self.max_active,
+                "queue_limit": self.queue_limit,
+                "per_client": self.per_client,
+                "clients": len(self._held),
+            }
+
+    def _retry_after(self) -> int:
+        """Whole seconds until a newly queued request would likely be served."""
+        return max(1, math.ceil(self._hold_time * (self._queued + 1) / self.max_active))
+
+    def _shed(self, reason: str, message: str) -> OverloadedError:
+        metrics.inc("timetable_admission_total", outcome=f"shed_{reason}")
+        logger.warning(f"Shed request ({reason}): {self._active} active, {self._queued} queued")
+        return OverloadedError(message, retry_after=self._retry_after())
+
+    def _grant(self) -> None:
+        """Hand free slots to waiting clients in turn."""
+        while self._active < self.max_active and self._waiting:
+            client, tickets = self._waiting.popitem(last=False)
+            tickets.popleft().granted = True
+            if tickets:
+                self._waiting[client] = tickets
+            self._active += 1
+            self._queued -= 1
+        self._changed.notify_all()
+
+    def _withdraw(self, client: str, ticket: _Ticket) -> None:
+        tickets = self._waiting.get(client)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self._waiting[client]
+            self._queued -= 1
+
+    def _release_client(self, client: str) -> None:
+        self._held[client] -= 1
+        if not self._held[client]:
+            del self._held[client]
+
+inflight = SingleFlight()
+admission = AdmissionController()
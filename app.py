@@ -1,18 +1,41 @@
 """
 Smart Timetable Generator - Flask Web Application
 """
+import atexit
+import json
 import logging
 import time
+from contextlib import nullcontext
 from http import HTTPStatus
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple
 
-from flask import Flask, render_template, request, Response, jsonify
+from flask import Flask, render_template, request, Response, g, stream_with_context
 
-from scheduler import generate_scheduler_response
-from config import PORT, DEBUG, MAX_SUBJECTS, MAX_TEACHERS, MIN_PERIODS, MAX_PERIODS
-from exceptions import TimetableError
-from utils import api_response, extract_request_data, validate_request_data, generate_csv
-from database import init_app, get_db
+from scheduler import generate_scheduler_response, generate_school_response, ProgressCallback
+from config import (
+    PORT, DEBUG, MAX_SUBJECTS, MAX_TEACHERS, MAX_SECTIONS, MIN_PERIODS, MAX_PERIODS, JOB_EVENT_KEEPALIVE,
+    PROFILE_HEADER, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE, CLIENT_ID_HEADER, TIMETABLE_PAGE_SIZE,
+    TIMETABLE_MAX_PAGE_SIZE
+)
+from exceptions import TimetableError, InfeasibleScheduleError, OverloadedError, GenerationCancelledError
+from utils import (
+    api_response, parse_generation_request, extract_export_options,
+    extract_history_filters, extract_repair_request, extract_term_request, extract_timetable_filters
+)
+from database import init_app, history_writer, history_page, history_stats
+from admission import admission, inflight
+from cache import result_cache
+from constraint_spec import compile_cache_info
+from jobs import job_manager, FINISHED_STATES
+from metrics import metrics
+from profiling import start_profile, dump_profile
+from export import EXPORT_FORMATS, export_stream, result_sources
+from repair import repair_timetable
+from term import plan_term
+from store import timetable_writer, get_timetable, timetable_version, query_slots
+from encoding import COMPACT_MEDIA_TYPE, negotiate_coding, encode_body, encoded_bodies
+from admin import admin
+from capture import capture_log
 
 # --- Logging Setup ---
 logging.basicConfig(
@@ -26,13 +49,40 @@ app.secret_key = 'dev-secret-key'
 
 # --- Database Init ---
 init_app(app)
+atexit.register(timetable_writer.flush)
+app.register_blueprint(admin)
+
+# --- Instrumentation ---
+@app.before_request
+def start_request_timer() -> None:
+    """Start the request clock and, when asked for, a profiler."""
+    g.request_start = time.perf_counter()
+    g.profiler = start_profile(PROFILE_HEADER in request.headers)
+
+@app.after_request
+def record_request(response: Response) -> Response:
+    """Observe request latency and dump the profile, if one was running."""
+    start = g.pop("request_start", None)
+    if start is not None:
+        metrics.observe("timetable_http_request_duration_seconds", time.perf_counter() - start,
+                        endpoint=request.endpoint or "unknown", method=request.method, status=response.status_code)
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        dump_profile(profiler, request.endpoint)
+        metrics.inc("timetable_profiles_total")
+    return response
 
 # --- Error Handlers ---
 @app.errorhandler(TimetableError)
 def handle_timetable_error(error: TimetableError) -> Tuple[Response, int]:
     """Handle custom TimetableError exceptions."""
     logger.error(f"Timetable error: {error.message}")
-    return api_response(error=error.message, status=error.status_code)
+    conflict = getattr(error, "conflict", None)
+    response, status = api_response(data={"conflict": conflict} if conflict else None, error=error.message,
+                                    status=error.status_code)
+    if isinstance(error, OverloadedError):
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response, status
 
 @app.errorhandler(Exception)
 def handle_generic_error(error: Exception) -> Tuple[Response, int]:
@@ -55,92 +105,316 @@ def app_info() -> Tuple[Response, int]:
         "limits": {
             "max_subjects": MAX_SUBJECTS,
             "max_teachers": MAX_TEACHERS,
+            "max_sections": MAX_SECTIONS,
             "periods_range": f"{MIN_PERIODS}-{MAX_PERIODS}"
-        }
+        },
+        "cache": result_cache.stats(),
+        "constraint_specs": compile_cache_info(),
+        "admission": dict(admission.stats(), inflight=inflight.inflight()),
+        "jobs": job_manager.stats()
     }
     return api_response(data=info)
 
+@app.route("/metrics")
+def metrics_endpoint() -> Response:
+    """Prometheus text exposition, merged across every worker sharing METRICS_DIR."""
+    for state, count in job_manager.stats().items():
+        metrics.set("timetable_jobs", count, status=state)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/")
 def index():
     """Render the main page."""
     return render_template("index.html")
 
-@app.route("/generate", methods=["POST"])
-def generate() -> Tuple[Response, int]:
-    """API endpoint to generate timetable."""
-    logger.info("Received generation request")
+def _generate(spec: Dict[str, Any], progress: Optional[ProgressCallback], client: Optional[str]) -> Dict[str, Any]:
+    """
+    Run the scheduler for a cache miss, holding an admission slot when serving
+    a client directly, and offer the run to the capture log.
+    """
+    with admission.admit(client) if client is not None else nullcontext():
+        start_time = time.perf_counter()
+        try:
+            if spec["sections"] is not None:
+                result = generate_school_response(spec["sections"], spec["periods_per_day"],
+                                                  strategy=spec["options"]["strategy"], progress=progress,
+                                                  facilities=spec["options"]["facilities"],
+                                                  constraints=spec["options"]["constraints"],
+                                                  seed=spec["options"]["seed"],
+                                                  unavailable=spec["options"]["unavailable"])
+            else:
+                result = generate_scheduler_response(spec["subjects"], spec["teachers"], spec["periods_per_day"],
+                                                     progress=progress, **spec["options"])
+        except GenerationCancelledError:
+            raise
+        except Exception as e:
+            capture_log.record(spec, time.perf_counter() - start_time, error=getattr(e, "message", str(e)))
+            raise
+    capture_log.record(spec, time.perf_counter() - start_time, result=result)
+    result_cache.put(spec["key"], result)
+    timetable_writer.save(spec["key"], result, strategy=spec["options"]["strategy"])
+    for stage, seconds in result.get("meta", {}).get("timings", {}).items():
+        metrics.observe("timetable_stage_duration_seconds", seconds, stage=stage)
+    return result
+
+def _run_generation(spec: Dict[str, Any], progress: Optional[ProgressCallback] = None,
+                    client: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Serve a parsed request from the cache or generate it, then record it in the history.
+    Concurrent identical requests share one generation. With a `client`, the
+    generation goes through admission control and may be shed with a 429;
+    background jobs pass none, since their queue is bounded already.
+    """
     start_time = time.time()
-    
-    data = request.get_json()
-    if not data:
-        raise TimetableError("Invalid JSON body")
-        
-    # Extract and Validate
-    subjects, teachers, periods_per_day = extract_request_data(data)
-    validate_request_data(subjects, teachers, periods_per_day)
+    key = spec["key"]
+    result = result_cache.get(key)
+    cache_status = "hit"
     
     # Generate
-    try:
-        result = generate_scheduler_response(subjects, teachers, periods_per_day)
-    except Exception as e:
-        logger.error(f"Algorithm error: {str(e)}")
-        raise TimetableError(f"Generation failed: {str(e)}", status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
+    if result is None:
+        try:
+            # A leader that was cancelled or shed says nothing about this request, so it tries itself
+            result, leader = inflight.do(key, lambda: _generate(spec, progress, client),
+                                         retry_on=(GenerationCancelledError, OverloadedError))
+            cache_status = "miss" if leader else "coalesced"
+        except OverloadedError:
+            metrics.inc("timetable_cache_requests_total", result="miss")
+            raise
+        except TimetableError as e:
+            _record_history(spec, time.time() - start_time, "cancelled" if e.status_code == HTTPStatus.CONFLICT else "failed")
+            raise
+        except Exception as e:
+            logger.error(f"Algorithm error: {str(e)}")
+            _record_history(spec, time.time() - start_time, "failed")
+            raise TimetableError(f"Generation failed: {str(e)}", status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
+    metrics.inc("timetable_cache_requests_total", result=cache_status)
     
     duration = time.time() - start_time
+    metrics.observe("timetable_generation_duration_seconds", duration, cache=cache_status)
     logger.info(f"Timetable generated successfully in {duration:.4f}s")
     
     # Add metadata
-    result["meta"] = {
+    result.setdefault("meta", {}).update({
         "generation_time_seconds": round(duration, 4),
-        "status": "success"
-    }
+        "status": "success",
+        "cache": cache_status,
+        "result_id": key
+    })
     
-    # Save to History
+    # Save to History (queued; written in batches off the request path)
+    _record_history(spec, duration, "success")
+
+    return result
+
+def _record_history(spec: Dict[str, Any], duration: float, status: str) -> None:
+    history_writer.record(len(spec["subjects"]), len(spec["teachers"]), spec["periods_per_day"], duration, status,
+                          strategy=spec["options"]["strategy"], result_id=spec["key"])
+
+def _client_id() -> str:
+    """Who a request counts against for admission fairness."""
+    if CLIENT_ID_HEADER and request.headers.get(CLIENT_ID_HEADER):
+        # X-Forwarded-For style lists name the original client first
+        return request.headers[CLIENT_ID_HEADER].split(",")[0].strip()
+    return request.remote_addr or "unknown"
+
+def _negotiate() -> Tuple[bool, Optional[str]]:
+    """Whether to send the compact encoding (?encoding=compact or asked for by Accept), and the content coding."""
+    compact = request.args.get("encoding") == "compact" or COMPACT_MEDIA_TYPE in request.accept_mimetypes.values()
+    return compact, negotiate_coding(request.accept_encodings)
+
+def _etag(version: str, compact: bool, coding: Optional[str]) -> str:
+    """A strong tag per representation of a content digest: each encoding and coding of it has its own bytes."""
+    return "-".join(filter(None, [version, "compact" if compact else "json", coding]))
+
+def _encoded_response(body: bytes, compact: bool, coding: Optional[str], etag: Optional[str] = None) -> Response:
+    """A response for a body from `encode_body`, with the headers its representation needs."""
+    response = Response(body, mimetype=COMPACT_MEDIA_TYPE if compact else "application/json")
+    response.vary.update(("Accept", "Accept-Encoding"))
+    if coding is not None:
+        response.headers["Content-Encoding"] = coding
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+@app.route("/generate", methods=["POST"])
+def generate() -> Tuple[Response, int]:
+    """API endpoint to generate timetable."""
+    logger.info("Received generation request")
+    spec = parse_generation_request(request.get_json())
+    compact, coding = _negotiate()
+    result = _run_generation(spec, client=_client_id())
+    return _encoded_response(encode_body(result, compact, coding), compact, coding), HTTPStatus.OK
+
+@app.route("/repair", methods=["POST"])
+def repair() -> Tuple[Response, int]:
+    """Apply a change to an existing timetable, re-solving only the affected slots."""
+    data = request.get_json(silent=True)
+    if not data:
+        raise TimetableError("Invalid JSON body")
+    if data.get("result_id"):
+        stored = result_cache.get(str(data["result_id"])) or get_timetable(str(data["result_id"]))
+        if stored is None:
+            raise TimetableError(f"Result '{data['result_id']}' not found or expired", status_code=HTTPStatus.NOT_FOUND)
+        if "sections" in stored:
+            raise TimetableError("Repair works on single-class results")
+        data = dict(data, result=stored)
+    result, delta = extract_repair_request(data)
+    with metrics.timer("timetable_stage_duration_seconds", stage="repair"):
+        return api_response(data=repair_timetable(result, delta))
+
+@app.route("/term", methods=["POST"])
+def term() -> Tuple[Response, int]:
+    """Timetable a whole term, solving each distinct week (rotation label, short week) once."""
+    spec, calendar = extract_term_request(request.get_json(silent=True) or {})
+    with admission.admit(_client_id()), metrics.timer("timetable_stage_duration_seconds", stage="term"):
+        return api_response(data=plan_term(spec, calendar, cache=result_cache))
+
+@app.route("/history")
+def history() -> Tuple[Response, int]:
+    """Newest-first generation history, keyset-paginated with ?limit= and ?before=<next_cursor>."""
+    filters = extract_history_filters(request.args)
     try:
-        db = get_db()
-        db.execute(
-            'INSERT INTO history (subjects, teachers, periods, duration, status) VALUES (?, ?, ?, ?, ?)',
-            (str(len(subjects)), str(len(teachers)), periods_per_day, duration, 'success')
-        )
-        db.commit()
-    except Exception as e:
-        logger.error(f"DB Error: {e}")
+        limit = int(request.args.get("limit", HISTORY_PAGE_SIZE))
+        before = int(request.args["before"]) if request.args.get("before") else None
+    except ValueError:
+        raise TimetableError("limit and before must be integers")
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    items, next_cursor = history_page(limit, before, filters)
+    return api_response(data={"items": items, "next_cursor": next_cursor})
+
+@app.route("/history/stats")
+def history_statistics() -> Tuple[Response, int]:
+    """p50/p95 generation time per input size, over the same filters as /history."""
+    return api_response(data={"sizes": history_stats(extract_history_filters(request.args)),
+                              "pending_writes": history_writer.pending()})
+
+@app.route("/timetables/<result_id>")
+def timetable(result_id: str) -> Tuple[Response, int]:
+    """A stored timetable by its result id; conditional on If-None-Match, so a repeat fetch gets a 304."""
+    compact, coding = _negotiate()
+    version = timetable_version(result_id)
+    if version is None:
+        raise TimetableError(f"Timetable '{result_id}' not found", status_code=HTTPStatus.NOT_FOUND)
+    # Answered from the stored digest alone, before the payload is loaded
+    etag = _etag(version, compact, coding)
+    if etag in request.if_none_match:
+        response = Response(status=HTTPStatus.NOT_MODIFIED)
+        response.set_etag(etag)
+        response.vary.update(("Accept", "Accept-Encoding"))
+        return response, HTTPStatus.NOT_MODIFIED
+    body = encoded_bodies.get(etag)
+    if body is None:
+        result = get_timetable(result_id)
+        if result is None:
+            raise TimetableError(f"Timetable '{result_id}' not found", status_code=HTTPStatus.NOT_FOUND)
+        # It may have been replaced since the version was read
+        etag = _etag(result["version"], compact, coding)
+        body = encode_body(result, compact, coding)
+        encoded_bodies.put(etag, body)
+    return _encoded_response(body, compact, coding, etag), HTTPStatus.OK
+
+@app.route("/timetables/slots")
+def timetable_slots() -> Tuple[Response, int]:
+    """Slots across every stored timetable, filtered by teacher, day, period, subject or section; paged with ?cursor=."""
+    filters = extract_timetable_filters(request.args)
+    try:
+        limit = int(request.args.get("limit", TIMETABLE_PAGE_SIZE))
+    except ValueError:
+        raise TimetableError("limit must be an integer")
+    limit = max(1, min(limit, TIMETABLE_MAX_PAGE_SIZE))
+    items, next_cursor = query_slots(filters, limit, request.args.get("cursor") or None)
+    return api_response(data={"items": items, "next_cursor": next_cursor})
+
+@app.route("/jobs", methods=["POST"])
+def submit_job() -> Tuple[Response, int]:
+    """Queue a /generate body on the background pool and return its job id at once."""
+    spec = parse_generation_request(request.get_json())
+
+    def task(progress: ProgressCallback) -> Dict[str, Any]:
+        return _run_generation(spec, progress=progress)
 
-    return api_response(data=result)
+    job = job_manager.submit(task)
+    return api_response(data=job.snapshot(), status=HTTPStatus.ACCEPTED)
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id: str) -> Tuple[Response, int]:
+    """Poll a job; the result is included once it has succeeded."""
+    return api_response(data=job_manager.get(job_id).snapshot())
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id: str) -> Tuple[Response, int]:
+    """Cancel a queued or running job."""
+    return api_response(data=job_manager.cancel(job_id).snapshot(include_result=False))
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id: str) -> Response:
+    """Server-sent events: a `progress` event per update and a final `done` event."""
+    events = job_manager.events(job_id, JOB_EVENT_KEEPALIVE)
+
+    def stream():
+        for snapshot in events:
+            if snapshot is None:
+                yield ": keepalive\n\n"
+                continue
+            name = "done" if snapshot["status"] in FINISHED_STATES else "progress"
+            yield f"event: {name}\ndata: {json.dumps(snapshot)}\n\n"
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/validate", methods=["POST"])
 def validate_input() -> Tuple[Response, int]:
-    """Pre-flight validation endpoint."""
+    """Pre-flight validation endpoint, including the feasibility pre-check."""
     try:
         data = request.get_json()
         if not data:
             return api_response(error="No data", status=400)
             
-        subjects, teachers, periods = extract_request_data(data)
-        validate_request_data(subjects, teachers, periods)
+        parse_generation_request(data)
         return api_response(data={"valid": True})
+    except InfeasibleScheduleError as e:
+        return api_response(data={"valid": False, "error": e.message, "conflict": e.conflict}, status=200)
     except TimetableError as e:
         return api_response(data={"valid": False, "error": e.message}, status=200)
 
+def _export_response(options: Dict[str, Any]) -> Response:
+    """
+    Stream the requested timetables; results are loaded one at a time as the
+    stream reaches them, from the cache or, once it has expired, the store.
+    """
+    for result_id in options["result_ids"]:
+        if not result_cache.contains(result_id) and timetable_version(result_id) is None:
+            raise TimetableError(f"Result '{result_id}' not found or expired", status_code=HTTPStatus.NOT_FOUND)
+
+    def sources():
+        yield from options["timetables"]
+        for result_id in options["result_ids"]:
+            result = result_cache.get(result_id) or get_timetable(result_id)
+            if result is not None:
+                yield from result_sources(result_id[:12], result)
+
+    mimetype, extension = EXPORT_FORMATS[options["format"]]
+    filename = f"timetable.{extension}"
+    headers = {"Content-disposition": f"attachment; filename={filename}"}
+    if options["compress"]:
+        headers["Content-Encoding"] = "gzip"
+    chunks = export_stream(options["format"], sources(), named=options["named"], teacher=options["teacher"],
+                           week_of=options["week_of"], compress=options["compress"])
+    # The store is read through the request's connection, so the stream keeps the request context
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
 @app.route("/export", methods=["POST"])
-def export_csv() -> Response:
-    """Export timetable to CSV."""
-    try:
-        data = request.get_json()
-        timetable = data.get("timetable")
-        if not timetable:
-            return jsonify({"error": "No timetable data provided"}), 400
-            
-        csv_content = generate_csv(timetable)
-        
-        return Response(
-            csv_content,
-            mimetype="text/csv",
-            headers={"Content-disposition": "attachment; filename=timetable.csv"}
-        )
-    except Exception as e:
-        logger.error(f"Export error: {e}")
-        return jsonify({"error": "Failed to export CSV"}), 500
+def export_timetables() -> Response:
+    """Export timetables as CSV, NDJSON or iCalendar, streamed in chunks."""
+    data = request.get_json(silent=True) or {}
+    return _export_response(extract_export_options(dict(request.args.items(), **data)))
+
+@app.route("/export/<result_id>", methods=["GET"])
+def export_result(result_id: str) -> Response:
+    """Export a stored result; e.g. ?format=ical&teacher=Smith is a subscribable per-teacher feed."""
+    options = dict(request.args.items())
+    options["result_ids"] = [result_id]
+    return _export_response(extract_export_options(options))
 
 if __name__ == "__main__":
     logger.info(f"Starting server on port {PORT}, debug={DEBUG}")
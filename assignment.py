@@ -0,0 +1,252 @@
+"""
+Teacher Assignment.
+
+Decides who teaches what before any slot is placed. Whole subjects are
+matched to teachers with a min-cost flow (the Hungarian assignment with a
+convex per-teacher load cost), which honours qualifications, preferences
+and weekly limits while keeping loads even. Subjects that have to be
+shared, because they are listed in `split` or no single teacher has room
+for them, are then spread hour by hour with a second flow.
+"""
+import heapq
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import PREFERENCE_WEIGHT
+from exceptions import TimetableError, InfeasibleScheduleError
+
+logger = logging.getLogger(__name__)
+
+INF = float("inf")
+
+# Subject -> teacher -> weekly periods
+Assignment = Dict[str, Dict[str, int]]
+
+class MinCostFlow:
+    """Successive shortest paths with Dijkstra over reduced costs; edge costs must be non-negative."""
+    def __init__(self, nodes: int):
+        self.graph: List[List[int]] = [[] for _ in range(nodes)]
+        self.to: List[int] = []
+        self.cap: List[int] = []
+        self.cost: List[int] = []
+
+    def add_edge(self, u: int, v: int, cap: int, cost: int) -> int:
+        """Add u -> v with its residual twin; returns the edge id for `flow`."""
+        edge = len(self.to)
+        self.graph[u].append(edge)
+        self.to.append(v)
+        self.cap.append(cap)
+        self.cost.append(cost)
+        self.graph[v].append(edge + 1)
+        self.to.append(u)
+        self.cap.append(0)
+        self.cost.append(-cost)
+        return edge
+
+    def flow(self, edge: int) -> int:
+        return self.cap[edge ^ 1]
+
+    def solve(self, source: int, sink: int) -> Tuple[int, int]:
+        """Push the maximum flow at minimum cost; returns (flow, cost)."""
+        graph, to, cap, cost = self.graph, self.to, self.cap, self.cost
+        potential = [0] * len(graph)
+        total_flow = total_cost = 0
+        while True:
+            dist = [INF] * len(graph)
+            prev = [-1] * len(graph)
+            dist[source] = 0
+            heap = [(0, source)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                for e in graph[u]:
+                    if cap[e] > 0:
+                        v = to[e]
+                        nd = d + cost[e] + potential[u] - potential[v]
+                        if nd < dist[v]:
+                            dist[v] = nd
+                            prev[v] = e
+                            heapq.heappush(heap, (nd, v))
+            if dist[sink] == INF:
+                return total_flow, total_cost
+            for v, d in enumerate(dist):
+                if d < INF:
+                    potential[v] += d
+
+            push, v = INF, sink
+            while v != source:
+                e = prev[v]
+                push = min(push, cap[e])
+                v = to[e ^ 1]
+            v = sink
+            while v != source:
+                e = prev[v]
+                cap[e] -= push
+                cap[e ^ 1] += push
+                v = to[e ^ 1]
+            total_flow += push
+            total_cost += push * (potential[sink] - potential[source])
+
+def assign_teachers(subject_hours: Dict[str, int], teachers: Sequence[str],
+                    qualifications: Optional[Dict[str, List[str]]] = None,
+                    max_hours: Optional[Dict[str, int]] = None,
+                    preferences: Optional[Dict[str, List[str]]] = None,
+                    split: Iterable[str] = (),
+                    extra_hours: int = 0, flexible: Sequence[str] = (),
+                    base_load: Optional[Dict[str, int]] = None) -> Assignment:
+    """
+    Assign every subject's weekly periods to teachers.
+
+    Args:
+        subject_hours: Weekly periods per subject; subjects with none are skipped.
+        teachers: Available teachers.
+        qualifications: Optional teacher -> subjects they may teach (default: anything).
+        max_hours: Optional teacher -> weekly period limit (default: unlimited).
+        preferences: Optional teacher -> subjects they would rather teach.
+        split: Subjects to share between teachers to even out loads. Any subject
+            is shared anyway when no qualified teacher has room for all of it.
+        extra_hours: Leftover periods to add, one each, to `flexible` subjects
+            of the least-loaded teachers.
+        flexible: Subjects that may take an extra period, in tie-break order.
+        base_load: Optional teacher -> periods already taught elsewhere (other
+            sections of a school); they count towards the load being evened out.
+
+    Returns:
+        Subject -> teacher -> periods; shared subjects list several teachers.
+
+    Raises:
+        TimetableError: If the staffing options name unknown teachers or subjects.
+        InfeasibleScheduleError: If qualified teachers lack the hours to cover a subject.
+    """
+    qualifications, max_hours, preferences = qualifications or {}, max_hours or {}, preferences or {}
+    for option in (qualifications, max_hours, preferences):
+        unknown = sorted(set(option) - set(teachers))
+        if unknown:
+            raise TimetableError(f"Unknown teacher(s) in staffing options: {', '.join(unknown)}")
+    split = set(split or ())
+    for listed in list(qualifications.values()) + list(preferences.values()) + [split]:
+        unknown = sorted(set(listed) - set(subject_hours))
+        if unknown:
+            raise TimetableError(f"Unknown subject(s) in staffing options: {', '.join(unknown)}")
+
+    hours = {s: h for s, h in subject_hours.items() if h > 0}
+    subjects = list(hours)
+
+    def qualified(subject: str, teacher: str) -> bool:
+        return teacher not in qualifications or subject in qualifications[teacher]
+
+    def preference_cost(subject: str, teacher: str) -> int:
+        return 0 if subject in preferences.get(teacher, ()) else PREFERENCE_WEIGHT
+
+    for subject in subjects:
+        if not any(qualified(subject, t) for t in teachers):
+            raise InfeasibleScheduleError(f"No teacher is qualified to teach {subject}")
+
+    # 1. Whole subjects: a balanced Hungarian assignment as a unit-capacity flow
+    whole = [s for s in subjects if s not in split]
+    assignment: Assignment = {}
+    base_load = base_load or {}
+    load = {t: base_load.get(t, 0) for t in teachers}
+    if whole:
+        unit = max(1, round(sum(hours[s] for s in whole) / len(whole)))
+        smallest = sorted(hours[s] for s in whole)
+        flow = MinCostFlow(len(whole) + len(teachers) + 2)
+        source, sink = 0, len(whole) + len(teachers) + 1
+        edges: Dict[Tuple[str, str], int] = {}
+        for i, subject in enumerate(whole, 1):
+            flow.add_edge(source, i, 1, 0)
+            for j, teacher in enumerate(teachers, len(whole) + 1):
+                if qualified(subject, teacher):
+                    edges[(subject, teacher)] = flow.add_edge(i, j, 1, preference_cost(subject, teacher) * hours[subject])
+        for j, teacher in enumerate(teachers, len(whole) + 1):
+            # The k-th subject costs (2k - 1) units: the flow then minimises the sum of squared loads
+            limit, slots, base = max_hours.get(teacher), 0, round(load[teacher] / unit)
+            while slots < len(whole) and (limit is None or sum(smallest[:slots + 1]) <= limit):
+                slots += 1
+                flow.add_edge(j, sink, 1, (2 * (base + slots) - 1) * unit * unit)
+        flow.solve(source, sink)
+        for (subject, teacher), edge in edges.items():
+            if flow.flow(edge):
+                assignment[subject] = {teacher: hours[subject]}
+                load[teacher] += hours[subject]
+
+    # Uneven subject sizes can still push a teacher past the limit; those subjects get shared instead
+    for teacher, limit in max_hours.items():
+        while load[teacher] - base_load.get(teacher, 0) > limit:
+            subject = max((s for s, t in assignment.items() if teacher in t), key=lambda s: (hours[s], s))
+            del assignment[subject]
+            load[teacher] -= hours[subject]
+
+    # 2. Leftover periods go to the least-loaded teachers with room
+    def extra_rank(subject: str) -> Tuple[int, int]:
+        # Whole subjects of teachers with room first, then shared ones, then teachers already at their limit
+        if subject not in assignment:
+            return 1, 0
+        teacher = next(iter(assignment[subject]))
+        return (2 if load[teacher] - base_load.get(teacher, 0) >= max_hours.get(teacher, INF) else 0), load[teacher]
+
+    candidates = [s for s in flexible if s in hours]
+    for _ in range(min(extra_hours, len(candidates))):
+        subject = min(candidates, key=extra_rank)
+        candidates.remove(subject)
+        if subject in assignment:
+            teacher = next(iter(assignment[subject]))
+            if load[teacher] - base_load.get(teacher, 0) >= max_hours.get(teacher, INF):
+                del assignment[subject]
+                load[teacher] -= hours[subject]
+            else:
+                assignment[subject][teacher] += 1
+                load[teacher] += 1
+        hours[subject] += 1
+
+    # 3. Shared subjects, hour by hour, topping up the least-loaded qualified teachers
+    shared = [s for s in subjects if s not in assignment]
+    if shared:
+        demand = sum(hours[s] for s in shared)
+        flow = MinCostFlow(len(shared) + len(teachers) + 2)
+        source, sink = 0, len(shared) + len(teachers) + 1
+        edges = {}
+        for i, subject in enumerate(shared, 1):
+            flow.add_edge(source, i, hours[subject], 0)
+            for j, teacher in enumerate(teachers, len(shared) + 1):
+                if qualified(subject, teacher):
+                    edges[(subject, teacher)] = flow.add_edge(i, j, hours[subject], preference_cost(subject, teacher))
+        for j, teacher in enumerate(teachers, len(shared) + 1):
+            taught = load[teacher] - base_load.get(teacher, 0)
+            room = demand if teacher not in max_hours else min(demand, max(0, max_hours[teacher] - taught))
+            for k in range(load[teacher] + 1, load[teacher] + room + 1):
+                flow.add_edge(j, sink, 1, 2 * k - 1)
+        placed, _ = flow.solve(source, sink)
+        for (subject, teacher), edge in edges.items():
+            if flow.flow(edge):
+                assignment.setdefault(subject, {})[teacher] = flow.flow(edge)
+                load[teacher] += flow.flow(edge)
+        if placed < demand:
+            short = [f"{s} ({sum(assignment.get(s, {}).values())} of {hours[s]} periods)"
+                     for s in shared if sum(assignment.get(s, {}).values()) < hours[s]]
+            raise InfeasibleScheduleError(f"Not enough qualified teacher hours for: {', '.join(short)}")
+
+    load = {t: load[t] - base_load.get(t, 0) for t in teachers}
+    logger.info(f"Assigned {len(assignment)} subjects, {sum(len(t) > 1 for t in assignment.values())} shared; "
+                f"loads {min(load.values(), default=0)}-{max(load.values(), default=0)}")
+    return {s: assignment[s] for s in subjects}
+
+def assignment_units(assignment: Assignment) -> Tuple[Dict[str, str], Dict[str, int], Dict[str, str]]:
+    """
+    Scheduling units for an assignment: a subject with one teacher keeps its
+    name, each share of a split subject becomes ``"<subject> [<teacher>]"``.
+
+    Returns:
+        Tuple of unit -> teacher, unit -> weekly periods and unit -> subject.
+    """
+    teacher_of: Dict[str, str] = {}
+    hours: Dict[str, int] = {}
+    subject_of: Dict[str, str] = {}
+    for subject, shares in assignment.items():
+        for teacher, count in shares.items():
+            unit = subject if len(shares) == 1 else f"{subject} [{teacher}]"
+            teacher_of[unit] = teacher
+            hours[unit] = count
+            subject_of[unit] = subject
+    return teacher_of, hours, subject_of
@@ -0,0 +1,207 @@
+"""
+Headless batch generation.
+
+Reads generation jobs from JSONL (one /generate body per line) or CSV (one
+row per job with name, subjects, teachers, periods_per_day and any other
+/generate field as a column), runs them on a process pool and streams one
+result per job to JSONL, or every timetable to CSV, as jobs finish. Nothing
+here imports Flask, so start-up stays fast:
+
+    python batch.py jobs.jsonl --output results.jsonl
+    python batch.py jobs.csv --format csv --output timetables.csv --workers 4
+
+A summary with throughput (jobs/sec) is printed to stderr at the end; the
+exit status is 1 when any job failed.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from exceptions import TimetableError
+from export import iter_csv, result_sources
+from scheduler import generate_scheduler_response, generate_school_response
+from utils import parse_generation_request
+
+logger = logging.getLogger(__name__)
+
+Job = Tuple[str, Dict[str, Any]]
+
+def _csv_value(value: str) -> Any:
+    """Cells holding JSON objects or lists (subject_hours, unavailable, rooms, ...) are decoded."""
+    text = value.strip()
+    if text[:1] in "{[":
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+    return text
+
+def read_jobs(stream: IO[str], fmt: str) -> Iterator[Job]:
+    """
+    Yield (name, body) per job. Names come from a "name" or "id" field and
+    default to the line number; malformed lines become jobs that fail with
+    their parse error, so one bad line never stops the batch.
+    """
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(stream), 1):
+            body = {k.strip(): _csv_value(v) for k, v in row.items() if k and v is not None and v.strip()}
+            yield str(body.pop("name", None) or body.pop("id", None) or f"job-{number}"), body
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            body = json.loads(line)
+        except ValueError as e:
+            body = {"_error": f"Invalid JSON: {e}"}
+        if not isinstance(body, dict):
+            body = {"_error": "Each line must be a JSON object"}
+        yield str(body.pop("name", None) or body.pop("id", None) or f"job-{number}"), body
+
+def run_job(name: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate one job; module-level so pool workers can pickle it. Failures are returned, not raised."""
+    start_time = time.perf_counter()
+    try:
+        if "_error" in body:
+            raise TimetableError(body["_error"])
+        spec = parse_generation_request(body)
+        if spec["sections"] is not None:
+            result = generate_school_response(spec["sections"], spec["periods_per_day"],
+                                              strategy=spec["options"]["strategy"],
+                                              facilities=spec["options"]["facilities"],
+                                              constraints=spec["options"]["constraints"],
+                                              seed=spec["options"]["seed"],
+                                              unavailable=spec["options"]["unavailable"])
+        else:
+            result = generate_scheduler_response(spec["subjects"], spec["teachers"], spec["periods_per_day"],
+                                                 **spec["options"])
+    except TimetableError as e:
+        return {"job": name, "status": "failed", "error": e.message,
+                "duration": round(time.perf_counter() - start_time, 6)}
+    except Exception as e:
+        logger.exception(f"Job {name} crashed")
+        return {"job": name, "status": "failed", "error": f"Generation failed: {e}",
+                "duration": round(time.perf_counter() - start_time, 6)}
+    result.setdefault("meta", {})["result_id"] = spec["key"]
+    return {"job": name, "status": "success", "duration": round(time.perf_counter() - start_time, 6),
+            "result": result}
+
+def run_batch(jobs: Iterable[Job], workers: int = 1, max_pending: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Run jobs and yield their records in completion order. At most
+    `max_pending` jobs (default: twice the workers) are in flight, so the
+    input is read lazily and memory stays flat for any batch size.
+    """
+    if workers <= 1:
+        for name, body in jobs:
+            yield run_job(name, body)
+        return
+
+    max_pending = max_pending or workers * 2
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: Dict[Future, str] = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                pending[executor.submit(run_job, *job)] = job[0]
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    yield {"job": name, "status": "failed", "error": f"Worker failed: {e}"}
+
+def write_jsonl(records: Iterable[Dict[str, Any]], out: IO[str]) -> None:
+    for record in records:
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+
+def write_csv(records: Iterable[Dict[str, Any]], out: IO[str]) -> None:
+    """Every session of every successful job, with a leading Timetable column naming the job (and section)."""
+    def sources():
+        for record in records:
+            if record["status"] != "success":
+                continue
+            result = record["result"]
+            if "sections" in result:
+                for section, timetable in result_sources(record["job"], result):
+                    yield f"{record['job']}/{section}", timetable
+            else:
+                yield from result_sources(record["job"], result)
+
+    for chunk in iter_csv(sources(), named=True):
+        out.write(chunk)
+        out.flush()
+
+class BatchStats:
+    """Counts records as they stream past on their way to the writer."""
+    def __init__(self):
+        self.succeeded = 0
+        self.failed: List[Tuple[str, str]] = []
+        self.durations: List[float] = []
+
+    def track(self, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for record in records:
+            if record["status"] == "success":
+                self.succeeded += 1
+            else:
+                self.failed.append((record["job"], record.get("error", "")))
+            if "duration" in record:
+                self.durations.append(record["duration"])
+            yield record
+
+    def summary(self, elapsed: float) -> str:
+        total = self.succeeded + len(self.failed)
+        ordered = sorted(self.durations)
+        p50 = ordered[len(ordered) // 2] if ordered else 0.0
+        return (f"{total} jobs ({self.succeeded} ok, {len(self.failed)} failed) in {elapsed:.2f}s: "
+                f"{total / elapsed if elapsed > 0 else 0.0:.1f} jobs/sec, p50 {p50 * 1000:.1f} ms per job")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate timetables for a batch of jobs without the web server")
+    parser.add_argument("input", help="JSONL or CSV file of jobs, or - for JSONL on stdin")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"], help="default: from the file extension")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl", help="output format")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--verbose", action="store_true", help="log scheduler progress")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    fmt = args.input_format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    source = sys.stdin if args.input == "-" else open(args.input, newline="")
+    out = sys.stdout if not args.output else open(args.output, "w", newline="")
+    stats = BatchStats()
+    start_time = time.perf_counter()
+    try:
+        records = stats.track(run_batch(read_jobs(source, fmt), workers=args.workers))
+        (write_csv if args.format == "csv" else write_jsonl)(records, out)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+    for name, error in stats.failed:
+        print(f"FAILED {name}: {error}", file=sys.stderr)
+    print(stats.summary(time.perf_counter() - start_time), file=sys.stderr)
+    return 1 if stats.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
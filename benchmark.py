@@ -0,0 +1,264 @@
+"""
+Benchmark suite for the scheduling engine.
+
+Runs seeded synthetic workloads from a small class up to the configured
+limits and whole-school sizes, and records latency percentiles, peak
+allocations (tracemalloc) and violation counts per strategy. Results are
+written as JSON and can be compared against a stored baseline:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --threshold 0.25
+
+The comparison exits with status 1 when any case regresses past the threshold.
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import MAX_SUBJECTS, MAX_TEACHERS, MAX_PERIODS, DEFAULT_PERIODS, STRATEGIES, SCHOOL_STRATEGIES
+from exceptions import TimetableError
+from scheduler import Scheduler, generate_school_response
+from utils import generate_csv
+
+# Relative slowdown (or memory growth) tolerated before a case counts as a regression
+DEFAULT_THRESHOLD = 0.25
+# Latencies under this many seconds are too noisy to compare
+NOISE_FLOOR = 0.001
+
+def _names(prefix: str, count: int) -> List[str]:
+    return [f"{prefix} {i + 1:02d}" for i in range(count)]
+
+def _unavailable(rng: random.Random, teachers: List[str], periods: int, blocked: int) -> Dict[str, List[Any]]:
+    """A few seeded [day, period] blocks spread over the teachers."""
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    unavailable: Dict[str, List[Any]] = {}
+    for _ in range(blocked):
+        teacher = rng.choice(teachers)
+        unavailable.setdefault(teacher, []).append([rng.choice(days), rng.randint(1, periods)])
+    return unavailable
+
+def class_workloads(seed: int) -> Dict[str, Dict[str, Any]]:
+    """Single-class inputs, from a typical class up to the validation limits."""
+    rng = random.Random(seed)
+    # Validation caps subjects at twice the teachers, so the limit case uses half as many teachers
+    limit_teachers = min(MAX_TEACHERS, max(1, MAX_SUBJECTS // 2))
+    workloads = {
+        "small": (6, 4, DEFAULT_PERIODS, 0),
+        "medium": (12, 8, 8, 4),
+        "limits": (MAX_SUBJECTS, limit_teachers, MAX_PERIODS, 8),
+    }
+    result = {}
+    for name, (n_subjects, n_teachers, periods, blocked) in workloads.items():
+        teachers = _names("Teacher", n_teachers)
+        result[name] = {
+            "subjects": _names("Subject", n_subjects),
+            "teachers": teachers,
+            "periods": periods,
+            "unavailable": _unavailable(rng, teachers, periods, blocked),
+        }
+    return result
+
+def school_workload(seed: int, n_sections: int, periods: int = DEFAULT_PERIODS) -> List[Tuple[str, List[str], List[str]]]:
+    """Sections drawing their teachers from a shared staff of two teachers per section."""
+    rng = random.Random(seed)
+    staff = _names("Teacher", max(4, n_sections * 2))
+    return [(f"Section {i + 1}", _names("Subject", 6), sorted(rng.sample(staff, 4))) for i in range(n_sections)]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def measure(run: Callable[[int], Any], repeat: int, violations: Optional[Callable[[Any], int]] = None) -> Dict[str, Any]:
+    """
+    Time `run(i)` for `repeat` seeded iterations, then repeat it once under tracemalloc.
+
+    Args:
+        run: Workload body; receives the iteration number to use as a seed.
+        repeat: Number of timed iterations.
+        violations: Optional function counting violations in a run's return value.
+
+    Returns:
+        Latency percentiles in seconds, peak allocation in bytes and violation counts.
+    """
+    latencies = []
+    counts = []
+    errors = 0
+    for i in range(repeat):
+        start = time.perf_counter()
+        try:
+            output = run(i)
+        except TimetableError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        if violations is not None:
+            counts.append(violations(output))
+
+    # Allocation tracking slows everything down, so it gets its own run
+    tracemalloc.start()
+    try:
+        run(repeat)
+    except TimetableError:
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    stats: Dict[str, Any] = {"runs": len(latencies), "errors": errors, "peak_bytes": peak}
+    if latencies:
+        stats.update({
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies),
+            "max": max(latencies),
+        })
+    if counts:
+        stats["violations_mean"] = sum(counts) / len(counts)
+        stats["violations_max"] = max(counts)
+    return stats
+
+def class_cases(seed: int, repeat: int, only: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Scheduler.generate per strategy, plus the optimizer, constraint check and CSV export stages."""
+    results = {}
+    wanted = lambda case: not only or only in case
+    for name, workload in class_workloads(seed).items():
+        def scheduler(i: int, optimizer: str = "annealing") -> Scheduler:
+            return Scheduler(workload["subjects"], workload["teachers"], workload["periods"],
+                             unavailable=workload["unavailable"], seed=seed + i, optimizer=optimizer)
+
+        for strategy in STRATEGIES:
+            if not wanted(f"generate/{strategy}/{name}"):
+                continue
+            results[f"generate/{strategy}/{name}"] = measure(
+                lambda i, strategy=strategy: scheduler(i).generate(strategy=strategy),
+                repeat, violations=lambda result: len(result.meta["violations"])
+            )
+
+        for optimizer in ("greedy", "annealing", "tabu"):
+            if not wanted(f"optimize/{optimizer}/{name}"):
+                continue
+            def optimize(i: int, optimizer: str = optimizer) -> int:
+                engine = scheduler(i, optimizer)
+                schedule = engine._optimize(engine._distribute_slots(engine._generate_pools()))
+                return len(engine.check_constraints(schedule, {}))
+            results[f"optimize/{optimizer}/{name}"] = measure(optimize, repeat, violations=lambda count: count)
+
+        engine = scheduler(0)
+        if wanted(f"check_constraints/{name}"):
+            schedule = engine._distribute_slots(engine._generate_pools())
+            results[f"check_constraints/{name}"] = measure(lambda i: engine.check_constraints(schedule, {}), repeat)
+        if wanted(f"generate_csv/{name}"):
+            timetable = engine.generate().timetable
+            results[f"generate_csv/{name}"] = measure(lambda i: generate_csv(timetable), repeat)
+    return results
+
+def school_cases(seed: int, repeat: int, sizes: List[int], only: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Whole-school generation at each section count."""
+    results = {}
+    for size in sizes:
+        sections = school_workload(seed, size)
+        for strategy in SCHOOL_STRATEGIES:
+            if only and only not in f"school/{strategy}/{size}":
+                continue
+            results[f"school/{strategy}/{size}"] = measure(
+                lambda i, strategy=strategy: generate_school_response(sections, DEFAULT_PERIODS, strategy=strategy),
+                repeat, violations=lambda result: len(result["conflicts"]) + sum(
+                    len(section["violations"]) for section in result["sections"].values()
+                )
+            )
+    return results
+
+def run_suite(seed: int = 0, repeat: int = 20, school_sizes: Optional[List[int]] = None,
+              only: Optional[str] = None) -> Dict[str, Any]:
+    """Run every case and return the JSON-ready report."""
+    school_sizes = school_sizes if school_sizes is not None else [10, 50, 200]
+    cases = class_cases(seed, repeat, only)
+    cases.update(school_cases(seed, max(1, repeat // 4), school_sizes, only))
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": cases,
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Compare two reports case by case.
+
+    Returns:
+        One message per regression: p50/p99 latency or peak memory more than
+        `threshold` above the baseline, or more violations than before.
+    """
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        stats = current["results"].get(name)
+        if stats is None:
+            continue
+        for metric in ("p50", "p99"):
+            if metric in base and metric in stats and base[metric] >= NOISE_FLOOR:
+                if stats[metric] > base[metric] * (1 + threshold):
+                    regressions.append(
+                        f"{name}: {metric} {stats[metric] * 1000:.2f}ms vs baseline {base[metric] * 1000:.2f}ms"
+                    )
+        if base.get("peak_bytes") and stats["peak_bytes"] > base["peak_bytes"] * (1 + threshold):
+            regressions.append(f"{name}: peak memory {stats['peak_bytes']} vs baseline {base['peak_bytes']} bytes")
+        if stats.get("violations_mean", 0) > base.get("violations_mean", 0) + 1e-9:
+            regressions.append(
+                f"{name}: {stats['violations_mean']:.2f} violations vs baseline {base.get('violations_mean', 0):.2f}"
+            )
+        if stats["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {stats['errors']} failed runs vs baseline {base.get('errors', 0)}")
+    return regressions
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"{'case':<40} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>10} {'viol':>6}")
+    for name, stats in report["results"].items():
+        p50 = f"{stats['p50'] * 1000:.2f}" if "p50" in stats else "-"
+        p99 = f"{stats['p99'] * 1000:.2f}" if "p99" in stats else "-"
+        violations = f"{stats['violations_mean']:.2f}" if "violations_mean" in stats else "-"
+        print(f"{name:<40} {p50:>9} {p99:>9} {stats['peak_bytes'] / 1024:>10.1f} {violations:>6}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the timetable scheduler")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per class case")
+    parser.add_argument("--school-sizes", type=int, nargs="*", default=[10, 50, 200])
+    parser.add_argument("--only", help="run cases whose name contains this text")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative regression, e.g. 0.25 for 25%%")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    report = run_suite(args.seed, args.repeat, args.school_sizes, args.only)
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Content-addressed cache for generated timetables.
+"""
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_PERSIST, DATABASE_PATH
+
+logger = logging.getLogger(__name__)
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """Canonical SHA-256 of a normalized request (sorted keys, no whitespace)."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    In-memory LRU with size and TTL limits, optionally written through to a
+    SQLite table so entries survive worker restarts.
+    """
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS,
+                 db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self.db_path is None:
+            return None
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS result_cache ('
+                'key TEXT PRIMARY KEY, created REAL NOT NULL, payload TEXT NOT NULL)'
+            )
+            self._db.commit()
+        return self._db
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached value, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+
+            value = self._load(key, now)
+            if value is None:
+                self.misses += 1
+                return None
+            self._store(key, value[0], value[1])
+            self.hits += 1
+            return copy.deepcopy(value[1])
+
+    def contains(self, key: str) -> bool:
+        """Whether a live entry exists, without copying it or touching the LRU order."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                return True
+            db = self._connection()
+            if db is None:
+                return False
+            try:
+                row = db.execute('SELECT created FROM result_cache WHERE key = ?', (key,)).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Cache read failed: {e}")
+                return False
+            return row is not None and now - row[0] <= self.ttl
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """Insert or refresh an entry, evicting the least recently used past the size limit."""
+        now = time.time()
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, now, value)
+            db = self._connection()
+            if db is not None:
+                try:
+                    db.execute('INSERT OR REPLACE INTO result_cache (key, created, payload) VALUES (?, ?, ?)',
+                               (key, now, json.dumps(value)))
+                    db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Cache write failed: {e}")
+
+    def _store(self, key: str, created: float, value: Dict[str, Any]) -> None:
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, key: str, now: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        db = self._connection()
+        if db is None:
+            return None
+        try:
+            row = db.execute('SELECT created, payload FROM result_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[0] > self.ttl:
+                db.execute('DELETE FROM result_cache WHERE key = ?', (key,))
+                db.commit()
+                return None
+            return row[0], json.loads(row[1])
+        except sqlite3.Error as e:
+            logger.error(f"Cache read failed: {e}")
+            return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "persistent": self.db_path is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+result_cache = ResultCache(db_path=DATABASE_PATH if CACHE_PERSIST else None)
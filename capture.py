@@ -0,0 +1,139 @@
+"""
+Opt-in capture of production generations for replay.
+
+Capture is off unless `CAPTURE_DIR` is set. Every generation a process
+runs (cache hits and coalesced followers are not generations) is then
+considered for ``<CAPTURE_DIR>/capture-<pid>.jsonl``, which rotates at
+`CAPTURE_MAX_BYTES`. Failures, results with violations and runs slower
+than `CAPTURE_SLOW_SECONDS` are always written; the rest are picked by
+`CAPTURE_SAMPLE_RATE`. A record holds the normalized inputs, the seed and
+local search stop point that reproduce the run, its stage timings and a
+digest of the timetables, which is everything `replay.py` needs to re-run
+it and compare.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Optional
+
+from config import CAPTURE_DIR, CAPTURE_SAMPLE_RATE, CAPTURE_SLOW_SECONDS, CAPTURE_MAX_BYTES, CAPTURE_BACKUPS
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def result_digest(result: Dict[str, Any]) -> str:
+    """Digest of the timetables of a class or school result; equal schedules give equal digests."""
+    if "sections" in result:
+        timetables = {name: data["timetable"] for name, data in result["sections"].items()}
+    else:
+        timetables = result["timetable"]
+    canonical = json.dumps(timetables, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+def result_violations(result: Dict[str, Any]) -> int:
+    """Hard violations of a class result, or conflicts and section violations of a school result."""
+    if "sections" in result:
+        return len(result.get("conflicts", [])) + sum(len(data["violations"]) for data in result["sections"].values())
+    return len(result["meta"]["violations"])
+
+def capture_record(spec: Dict[str, Any], duration: float, result: Optional[Dict[str, Any]] = None,
+                   error: Optional[str] = None) -> Dict[str, Any]:
+    """
+    The capture record of one generation.
+
+    Args:
+        spec: The parsed request, as from `parse_generation_request`.
+        duration: Generation time in seconds.
+        result: The result, when the generation succeeded.
+        error: The error message, when it failed.
+
+    Returns:
+        Dictionary with time (when the generation started), key, kind, input,
+        seed, search, duration and timings, plus digest, violations and
+        soft_penalty on success or error on failure.
+    """
+    meta = (result or {}).get("meta", {})
+    record = {
+        "time": round(time.time() - duration, 6),
+        "key": spec["key"],
+        "kind": "school" if spec["sections"] is not None else "class",
+        "input": {
+            "sections": spec["sections"],
+            "subjects": spec["subjects"],
+            "teachers": spec["teachers"],
+            "periods_per_day": spec["periods_per_day"],
+            "options": spec["options"]
+        },
+        # A failed run never reports the seed it drew, so only a requested one is known
+        "seed": meta.get("seed", spec["options"]["seed"]),
+        "search": meta.get("search"),
+        "duration": round(duration, 6),
+        "timings": meta.get("timings", {}),
+    }
+    if result is None:
+        record.update(status="failed", error=error)
+    else:
+        record.update(status="success", digest=result_digest(result), violations=result_violations(result),
+                      soft_penalty=meta.get("soft_penalty"))
+    return record
+
+class CaptureLog:
+    """Appends capture records to a size-rotated JSONL file of this process."""
+    def __init__(self, directory: Optional[str] = CAPTURE_DIR, sample_rate: float = CAPTURE_SAMPLE_RATE,
+                 slow_seconds: float = CAPTURE_SLOW_SECONDS, max_bytes: int = CAPTURE_MAX_BYTES,
+                 backups: int = CAPTURE_BACKUPS):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._handler: Optional[RotatingFileHandler] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _wanted(self, duration: float, result: Optional[Dict[str, Any]]) -> bool:
+        if result is None or result_violations(result):
+            return True
+        if self.slow_seconds > 0 and duration >= self.slow_seconds:
+            return True
+        return random.random() < self.sample_rate
+
+    def _file(self) -> RotatingFileHandler:
+        # Gunicorn forks workers after import, so each process opens its own file on first use
+        with self._lock:
+            if self._handler is None or self._pid != os.getpid():
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"capture-{os.getpid()}.jsonl")
+                self._handler = RotatingFileHandler(path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                                    encoding="utf-8", delay=True)
+                self._pid = os.getpid()
+            return self._handler
+
+    def record(self, spec: Dict[str, Any], duration: float, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> bool:
+        """
+        Capture one generation if capture is on and the run is picked. Write
+        errors go to the handler's error reporting, not the caller, so capture
+        never fails a generation.
+
+        Returns:
+            True when the record was handed to the log.
+        """
+        if self.directory is None or not self._wanted(duration, result):
+            return False
+        line = json.dumps(capture_record(spec, duration, result, error), separators=(",", ":"), default=str)
+        try:
+            handler = self._file()
+        except OSError as e:
+            logger.error(f"Could not open capture log: {e}")
+            return False
+        handler.handle(logging.makeLogRecord({"msg": line}))
+        metrics.inc("timetable_captures_total", status="success" if result is not None else "failed")
+        return True
+
+capture_log = CaptureLog()
@@ -7,6 +7,9 @@ import os
 PORT: int = int(os.getenv("PORT", 5000))
 DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
 APP_VERSION: str = "1.0.0"
+DATABASE_PATH: str = os.getenv("DATABASE_PATH", "scheduler.db")
+DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 4))
+RESPONSE_COMPRESSION_LEVEL: int = 6  # zlib level for gzip/deflate responses
 
 # Business Logic Constraints
 DEFAULT_PERIODS: int = 6
@@ -14,15 +17,83 @@ MIN_PERIODS: int = 1
 MAX_PERIODS: int = 10
 MAX_SUBJECTS: int = 20
 MAX_TEACHERS: int = 20
+MAX_SECTIONS: int = 500
+MAX_ROOMS: int = 200
+MAX_TERM_WEEKS: int = 52
 
 # Algorithm Config
 START_HOUR: int = 9  # 9 AM
 DEFAULT_DAYS: list = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
 BREAK_AFTER_PERIOD: int = 3  # Insert break after every 3 periods
+PERIOD_MINUTES: int = 50  # used for calendar export end times
+STRATEGIES: list = ["standard", "genetic", "csp"]
+SCHOOL_STRATEGIES: list = ["standard", "genetic"]  # csp lays out a whole class, so it cannot place against shared teachers
+OPTIMIZERS: list = ["greedy", "annealing", "tabu"]
+LOCAL_SEARCH_METHOD: str = "annealing"
+LOCAL_SEARCH_ITERATIONS: int = 6000
+LOCAL_SEARCH_TIME_BUDGET: float = 0.25  # seconds; best-so-far is returned when it runs out
+GENETIC_TIME_BUDGET: float = 0.25  # seconds; the best ordering so far is used when it runs out
+REPAIR_TIME_BUDGET: float = 0.05  # seconds per /repair search
+PREFERENCE_WEIGHT: int = 4  # assignment cost per period a teacher spends on a subject they did not prefer
+
+# Multi-start Generation
+GENERATION_WORKERS: int = int(os.getenv("GENERATION_WORKERS", os.cpu_count() or 1))
+MAX_RESTARTS: int = 32
+GENERATION_DEADLINE: float = float(os.getenv("GENERATION_DEADLINE", 10.0))  # seconds per request
+
+# Admission Control (per process)
+ADMISSION_MAX_ACTIVE: int = int(os.getenv("ADMISSION_MAX_ACTIVE", GENERATION_WORKERS))  # generations running at once
+ADMISSION_QUEUE_LIMIT: int = int(os.getenv("ADMISSION_QUEUE_LIMIT", 32))  # requests waiting for a slot before shedding
+ADMISSION_PER_CLIENT: int = int(os.getenv("ADMISSION_PER_CLIENT", 4))  # running + waiting requests per client
+ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 5.0))  # seconds before a waiter is shed
+CLIENT_ID_HEADER: str = os.getenv("CLIENT_ID_HEADER") or None  # e.g. X-Forwarded-For behind a proxy; else the peer address
+
+# Result Cache
+CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", 256))
+CACHE_TTL_SECONDS: float = float(os.getenv("CACHE_TTL_SECONDS", 3600))
+CACHE_PERSIST: bool = os.getenv("CACHE_PERSIST", "False").lower() == "true"
+ENCODED_CACHE_ENTRIES: int = int(os.getenv("ENCODED_CACHE_ENTRIES", 256))  # encoded response bodies kept by ETag
+
+# Background Jobs
+JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", 2))
+JOB_QUEUE_LIMIT: int = int(os.getenv("JOB_QUEUE_LIMIT", 64))  # queued + running jobs per process
+JOB_RETENTION_SECONDS: float = float(os.getenv("JOB_RETENTION_SECONDS", 3600))
+JOB_EVENT_KEEPALIVE: float = 15.0  # seconds between SSE keepalive comments
+
+# History Persistence
+HISTORY_BATCH_SIZE: int = 100  # rows per write-behind flush
+HISTORY_FLUSH_SECONDS: float = float(os.getenv("HISTORY_FLUSH_SECONDS", 1.0))
+HISTORY_QUEUE_LIMIT: int = 10000  # rows are dropped (and counted) past this
+WRITER_FLUSH_TIMEOUT: float = 10.0  # longest a flush waits for a write-behind thread to commit
+HISTORY_PAGE_SIZE: int = 50
+HISTORY_MAX_PAGE_SIZE: int = 500
+
+# Timetable Store
+TIMETABLE_PAGE_SIZE: int = 100  # slot rows per query page
+TIMETABLE_MAX_PAGE_SIZE: int = 1000
+TIMETABLE_WRITE_BATCH: int = 20  # results per write-behind batch
+TIMETABLE_WRITE_SECONDS: float = 0.5
+TIMETABLE_WRITE_QUEUE_LIMIT: int = 1000  # past this a result is written on the request path
+ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD") or None  # the admin dashboard is closed unless this is set
+
+# Metrics & Profiling
+METRICS_DIR: str = os.getenv("METRICS_DIR") or None  # shared by gunicorn workers so /metrics covers all of them
+METRICS_FLUSH_SECONDS: float = 1.0
+PROFILE_DIR: str = os.getenv("PROFILE_DIR") or None  # profiling is off unless this is set
+PROFILE_HEADER: str = "X-Profile"
+PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))  # fraction of requests profiled
+
+# Request Capture
+CAPTURE_DIR: str = os.getenv("CAPTURE_DIR") or None  # capture is off unless this is set
+CAPTURE_SAMPLE_RATE: float = float(os.getenv("CAPTURE_SAMPLE_RATE", 1.0))  # fraction of generations captured
+CAPTURE_SLOW_SECONDS: float = float(os.getenv("CAPTURE_SLOW_SECONDS", 0.0))  # slower ones are always captured (0: off)
+CAPTURE_MAX_BYTES: int = 10 * 1024 * 1024  # per file before it rotates
+CAPTURE_BACKUPS: int = 5  # rotated files kept per process
 
 
 # Constraints Defaults
 DEFAULT_MAX_CONSECUTIVE: int = 2
 DEFAULT_MAX_DAILY: int = 4
+CONSTRAINT_CACHE_SIZE: int = 128  # compiled constraint specs kept per process
 
 
@@ -0,0 +1,135 @@
+"""
+Declarative Constraint Specs.
+
+A /generate body may carry a "constraints" object such as:
+
+    {
+        "max_consecutive": 3,
+        "max_daily": 5,
+        "teachers": {"Smith": {"max_daily": 3}},
+        "subject_spread": {"Math": 1, "*": 2},
+        "forbidden": [{"subject": "PE", "period": 1}, {"teacher": "Lee", "day": "Friday"}],
+        "weights": {"subject_spread": 5}
+    }
+
+`compile_constraints` turns a spec into rule objects once: per-teacher
+limits become lookup dicts and forbidden slots become per-day period
+bitmasks, so the evaluators the optimizers score moves with never parse
+anything. Compiled specs are cached by content hash, so a repeated
+configuration skips compilation entirely. Every rule is hard unless
+`weights` gives it a soft penalty per violation.
+"""
+import hashlib
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import DEFAULT_DAYS, DEFAULT_MAX_CONSECUTIVE, DEFAULT_MAX_DAILY, MAX_PERIODS, CONSTRAINT_CACHE_SIZE
+from constraints import Constraint, MaxConsecutivePeriods, TeacherDailyLimit, SubjectSpread, ForbiddenSlots
+
+# Rules a spec can configure, by the name used in "weights"
+SPEC_RULES = ("max_consecutive", "max_daily", "subject_spread", "forbidden")
+
+ALL_PERIODS = (1 << MAX_PERIODS) - 1
+
+class CompiledConstraints:
+    """Ready-to-use rules for one spec; shared between schedulers, so treat it as read-only."""
+    def __init__(self, spec: Dict[str, Any], key: str):
+        self.key = key
+        self.max_consecutive: int = spec.get("max_consecutive", DEFAULT_MAX_CONSECUTIVE)
+        self.max_daily: int = spec.get("max_daily", DEFAULT_MAX_DAILY)
+        teachers = spec.get("teachers", {})
+        weights = spec.get("weights", {})
+
+        self.consecutive = MaxConsecutivePeriods(self.max_consecutive, {
+            t: limits["max_consecutive"] for t, limits in teachers.items() if "max_consecutive" in limits
+        })
+        self.daily = TeacherDailyLimit(self.max_daily, {
+            t: limits["max_daily"] for t, limits in teachers.items() if "max_daily" in limits
+        })
+        self.rules: List[Constraint] = [self.consecutive, self.daily]
+
+        self.spread: Optional[SubjectSpread] = None
+        spread = dict(spec.get("subject_spread", {}))
+        if spread:
+            self.spread = SubjectSpread(spread, default=spread.pop("*", None))
+            self.rules.append(self.spread)
+
+        self.forbidden: Optional[ForbiddenSlots] = None
+        if spec.get("forbidden"):
+            self.forbidden = ForbiddenSlots(*_forbidden_masks(spec["forbidden"]))
+            self.rules.append(self.forbidden)
+
+        for rule in self.rules:
+            rule.weight = weights.get(rule.name)
+
+    def limits(self, teacher: str, unlimited: Optional[int] = None) -> Dict[str, int]:
+        """
+        Daily and consecutive limits for `teacher`. With `unlimited` set, soft
+        limits are replaced by it, for solvers that only enforce hard rules.
+        """
+        return {
+            "max_daily": unlimited if unlimited is not None and not self.daily.hard else self.daily.limit(teacher),
+            "max_consecutive": (unlimited if unlimited is not None and not self.consecutive.hard
+                                else self.consecutive.limit(teacher)),
+        }
+
+    def blocked_slots(self, teachers: List[str], days: List[str], periods: int) -> Set[Tuple[str, str, int]]:
+        """Hard forbidden teacher slots as (teacher, day, period) triples, periods 1-based."""
+        if self.forbidden is None or not self.forbidden.hard:
+            return set()
+        return _slots(self.forbidden.teacher_masks, teachers, days, periods)
+
+    def subject_blocked_slots(self, subjects: List[str], days: List[str], periods: int) -> Set[Tuple[str, str, int]]:
+        """Hard forbidden subject slots as (subject, day, period) triples, periods 1-based."""
+        if self.forbidden is None or not self.forbidden.hard:
+            return set()
+        return _slots(self.forbidden.subject_masks, subjects, days, periods)
+
+    def spread_limits(self, subjects: List[str]) -> Dict[str, int]:
+        """Hard per-day limits for the `subjects` that have one."""
+        if self.spread is None or not self.spread.hard:
+            return {}
+        return {s: self.spread.limit(s) for s in subjects if self.spread.limit(s) is not None}
+
+def _slots(masks: Dict[str, Dict[str, int]], names: List[str], days: List[str],
+           periods: int) -> Set[Tuple[str, str, int]]:
+    return {
+        (name, day, p)
+        for name in names
+        for day, mask in masks.get(name, {}).items() if day in days
+        for p in range(1, periods + 1) if mask >> (p - 1) & 1
+    }
+
+def _forbidden_masks(entries: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, int]], Dict[str, Dict[str, int]]]:
+    """Subject and teacher period bitmasks per day; a missing day means every day, a missing period the whole day."""
+    masks: Dict[str, Dict[str, Dict[str, int]]] = {"subject": {}, "teacher": {}}
+    for entry in entries:
+        bits = ALL_PERIODS if entry.get("period") is None else 1 << (entry["period"] - 1)
+        days = [entry["day"]] if entry.get("day") else DEFAULT_DAYS
+        for kind in ("subject", "teacher"):
+            if entry.get(kind):
+                by_day = masks[kind].setdefault(entry[kind], {})
+                for day in days:
+                    by_day[day] = by_day.get(day, 0) | bits
+    return masks["subject"], masks["teacher"]
+
+@lru_cache(maxsize=CONSTRAINT_CACHE_SIZE)
+def _compile(canonical: str) -> CompiledConstraints:
+    return CompiledConstraints(json.loads(canonical), hashlib.sha256(canonical.encode("utf-8")).hexdigest())
+
+def compile_constraints(spec: Optional[Dict[str, Any]] = None) -> CompiledConstraints:
+    """
+    Compile a normalized spec (see `utils.extract_constraint_options`).
+
+    Args:
+        spec: The spec; None or empty gives the default limits, all hard.
+
+    Returns:
+        The compiled rules, from the cache when the same spec was seen before.
+    """
+    return _compile(json.dumps(spec or {}, sort_keys=True, separators=(",", ":")))
+
+def compile_cache_info() -> Dict[str, int]:
+    info = _compile.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
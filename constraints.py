@@ -1,45 +1,248 @@
 """
 Constraint Rules Engine.
+
+Each rule can validate a finished schedule, and can also hand out an
+incremental evaluator that tracks the rule's penalty while an optimizer
+moves and swaps sessions.
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from models import ClassSession
 
+class ConstraintEvaluator:
+    """
+    Incremental penalty tracker for one rule over a days x slots grid.
+
+    The penalty equals the number of violations `validate` would report.
+    Subclasses keep their own counters and implement `_remove`/`_add`,
+    which return the penalty change of taking a cell out of or putting it
+    back into the grid. Moves and swaps are built from those two hooks, so
+    scoring a candidate costs O(1) counter updates rather than a rescan.
+    """
+    def __init__(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]):
+        self.days = list(schedule.keys())
+        self.subjects: List[List[Optional[str]]] = []
+        self.teachers: List[List[Optional[str]]] = []
+        for day in self.days:
+            # Slot `i` is period `i + 1`; free periods, including those that close the day, are None
+            width = max([meta.get('periods_per_day', 0)] + [s.period for s in schedule[day]])
+            subjects: List[Optional[str]] = [None] * width
+            teachers: List[Optional[str]] = [None] * width
+            for s in schedule[day]:
+                if s.type == 'Lecture':
+                    subjects[s.period - 1], teachers[s.period - 1] = s.subject, s.teacher
+            self.subjects.append(subjects)
+            self.teachers.append(teachers)
+        self.meta = meta
+        self.penalty = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        """Rebuild counters from the grid and set `penalty`."""
+        self.penalty = 0
+        for d, row in enumerate(self.teachers):
+            for i in range(len(row)):
+                self.penalty += self._add(d, i)
+
+    def _remove(self, d: int, i: int) -> int:
+        raise NotImplementedError
+
+    def _add(self, d: int, i: int) -> int:
+        raise NotImplementedError
+
+    def apply_move(self, d: int, i: int, subject: Optional[str], teacher: Optional[str]) -> int:
+        """Put (subject, teacher) into slot `i` of day `d`; returns the penalty change."""
+        delta = self._remove(d, i)
+        self.subjects[d][i], self.teachers[d][i] = subject, teacher
+        delta += self._add(d, i)
+        self.penalty += delta
+        return delta
+
+    def delta_move(self, d: int, i: int, subject: Optional[str], teacher: Optional[str]) -> int:
+        """Penalty change of `apply_move` without keeping it."""
+        old = (self.subjects[d][i], self.teachers[d][i])
+        delta = self.apply_move(d, i, subject, teacher)
+        self.apply_move(d, i, *old)
+        return delta
+
+    def apply_swap(self, d1: int, i1: int, d2: int, i2: int) -> int:
+        """Swap two slots (any days); returns the penalty change."""
+        first = (self.subjects[d1][i1], self.teachers[d1][i1])
+        second = (self.subjects[d2][i2], self.teachers[d2][i2])
+        delta = self.apply_move(d1, i1, *second)
+        delta += self.apply_move(d2, i2, *first)
+        return delta
+
+    def delta_swap(self, d1: int, i1: int, d2: int, i2: int) -> int:
+        """Penalty change of `apply_swap` without keeping it."""
+        delta = self.apply_swap(d1, i1, d2, i2)
+        self.apply_swap(d1, i1, d2, i2)
+        return delta
+
+class CombinedEvaluator:
+    """Weighted sum of several evaluators so a search loop can score moves against all rules at once."""
+    def __init__(self, evaluators: List[ConstraintEvaluator], weights: Optional[List[int]] = None):
+        self.evaluators = evaluators
+        self.weighted = list(zip(evaluators, weights or [1] * len(evaluators)))
+
+    @property
+    def penalty(self) -> int:
+        return sum(e.penalty * w for e, w in self.weighted)
+
+    def apply_move(self, d: int, i: int, subject: Optional[str], teacher: Optional[str]) -> int:
+        return sum(e.apply_move(d, i, subject, teacher) * w for e, w in self.weighted)
+
+    def delta_move(self, d: int, i: int, subject: Optional[str], teacher: Optional[str]) -> int:
+        return sum(e.delta_move(d, i, subject, teacher) * w for e, w in self.weighted)
+
+    def apply_swap(self, d1: int, i1: int, d2: int, i2: int) -> int:
+        return sum(e.apply_swap(d1, i1, d2, i2) * w for e, w in self.weighted)
+
+    def delta_swap(self, d1: int, i1: int, d2: int, i2: int) -> int:
+        return sum(e.delta_swap(d1, i1, d2, i2) * w for e, w in self.weighted)
+
 class Constraint(ABC):
+    # Key used for weights in a constraint spec and for soft-violation reports
+    name: str = ""
+    # Soft penalty per violation; None makes the rule hard
+    weight: Optional[int] = None
+
+    @property
+    def hard(self) -> bool:
+        return self.weight is None
+
     @abstractmethod
     def validate(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> List[str]:
         """Return list of violation messages."""
         pass
 
+    def evaluator(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> ConstraintEvaluator:
+        """Return an incremental evaluator seeded with `schedule`."""
+        return _RescanEvaluator(self, schedule, meta)
+
+class _RescanEvaluator(ConstraintEvaluator):
+    """Fallback for rules without counters: rescans the affected day with `validate`."""
+    def __init__(self, rule: Constraint, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]):
+        self.rule = rule
+        super().__init__(schedule, meta)
+
+    def _day_penalty(self, d: int) -> int:
+        sessions = [
+            ClassSession(period=i + 1, subject=subject, teacher=teacher)
+            for i, (subject, teacher) in enumerate(zip(self.subjects[d], self.teachers[d]))
+            if teacher is not None
+        ]
+        return len(self.rule.validate({self.days[d]: sessions}, self.meta))
+
+    def _reset(self) -> None:
+        self.penalty = sum(self._day_penalty(d) for d in range(len(self.days)))
+
+    def _remove(self, d: int, i: int) -> int:
+        return -self._day_penalty(d)
+
+    def _add(self, d: int, i: int) -> int:
+        return self._day_penalty(d)
+
+def _run_violations(length: int, max_periods: int) -> int:
+    """Violations `MaxConsecutivePeriods` reports for one run: the counter resets after each."""
+    return length // (max_periods + 1)
+
 class MaxConsecutivePeriods(Constraint):
     """Rule: Teachers should not have too many consecutive periods."""
-    def __init__(self, max_periods: int = 2):
+    name = "max_consecutive"
+
+    def __init__(self, max_periods: int = 2, per_teacher: Optional[Dict[str, int]] = None):
         self.max_periods = max_periods
+        self.per_teacher = per_teacher or {}
+
+    def limit(self, teacher: Optional[str]) -> int:
+        return self.per_teacher.get(teacher, self.max_periods)
 
     def validate(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> List[str]:
         violations = []
         for day, sessions in schedule.items():
             # Sort by period to be sure
-            sessions.sort(key=lambda x: x.period)
+            sessions = sorted(sessions, key=lambda x: x.period)
             
             for teacher in meta.get('teachers', []):
+                limit = self.limit(teacher)
                 consecutive = 0
+                previous = None
                 for session in sessions:
+                    # A free period between two sessions ends the run
+                    if previous is not None and session.period != previous + 1:
+                        consecutive = 0
+                    previous = session.period
                     if session.type == 'Lecture' and session.teacher == teacher:
                         consecutive += 1
                     else:
                         consecutive = 0
                     
-                    if consecutive > self.max_periods:
-                        violations.append(f"{teacher} exceeds {self.max_periods} consecutive periods on {day}")
+                    if consecutive > limit:
+                        violations.append(f"{teacher} exceeds {limit} consecutive periods on {day}")
                         # Reset to avoid spamming violations for the same sequence
                         consecutive = 0 
         return violations
 
+    def evaluator(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> ConstraintEvaluator:
+        return ConsecutiveEvaluator(self, schedule, meta)
+
+class ConsecutiveEvaluator(ConstraintEvaluator):
+    """
+    Run-length state for `MaxConsecutivePeriods`.
+    A change at one slot only splits or merges the run through that slot, so
+    the cost is bounded by the run length, never by days or teachers.
+    """
+    def __init__(self, rule: MaxConsecutivePeriods, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]):
+        self.limits = {teacher: rule.limit(teacher) for teacher in meta.get('teachers', [])}
+        self.tracked = set(self.limits)
+        super().__init__(schedule, meta)
+
+    def _reset(self) -> None:
+        self.penalty = 0
+        for row in self.teachers:
+            run, previous = 0, None
+            for teacher in row + [None]:
+                if teacher is not None and teacher == previous:
+                    run += 1
+                else:
+                    if previous in self.tracked:
+                        self.penalty += _run_violations(run, self.limits[previous])
+                    run = 1
+                previous = teacher
+
+    def _neighbour_runs(self, d: int, i: int, teacher: str) -> Tuple[int, int]:
+        row = self.teachers[d]
+        left = 0
+        while i - left - 1 >= 0 and row[i - left - 1] == teacher:
+            left += 1
+        right = 0
+        while i + right + 1 < len(row) and row[i + right + 1] == teacher:
+            right += 1
+        return left, right
+
+    def _remove(self, d: int, i: int) -> int:
+        teacher = self.teachers[d][i]
+        if teacher not in self.tracked:
+            return 0
+        left, right = self._neighbour_runs(d, i, teacher)
+        limit = self.limits[teacher]
+        return (_run_violations(left, limit) + _run_violations(right, limit)
+                - _run_violations(left + right + 1, limit))
+
+    def _add(self, d: int, i: int) -> int:
+        return -self._remove(d, i)
+
 class TeacherDailyLimit(Constraint):
     """Rule: Teachers should not exceed max daily sessions."""
-    def __init__(self, max_daily: int = 4):
+    name = "max_daily"
+
+    def __init__(self, max_daily: int = 4, per_teacher: Optional[Dict[str, int]] = None):
         self.max_daily = max_daily
+        self.per_teacher = per_teacher or {}
+
+    def limit(self, teacher: Optional[str]) -> int:
+        return self.per_teacher.get(teacher, self.max_daily)
 
     def validate(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> List[str]:
         violations = []
@@ -52,6 +255,217 @@ class TeacherDailyLimit(Constraint):
                     teacher_daily_count[session.teacher] += 1
             
             for teacher, count in teacher_daily_count.items():
-                if count > self.max_daily:
-                    violations.append(f"{teacher} has {count} classes on {day} (Max: {self.max_daily})")
+                if count > self.limit(teacher):
+                    violations.append(f"{teacher} has {count} classes on {day} (Max: {self.limit(teacher)})")
+        return violations
+
+    def evaluator(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> ConstraintEvaluator:
+        return DailyLimitEvaluator(self, schedule, meta)
+
+class DailyLimitEvaluator(ConstraintEvaluator):
+    """Per-teacher, per-day counters for `TeacherDailyLimit`."""
+    def __init__(self, rule: TeacherDailyLimit, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]):
+        self.limit = rule.limit
+        self.counts: List[Dict[str, int]] = [{} for _ in schedule]
+        super().__init__(schedule, meta)
+
+    def _remove(self, d: int, i: int) -> int:
+        teacher = self.teachers[d][i]
+        if teacher is None:
+            return 0
+        count = self.counts[d][teacher]
+        self.counts[d][teacher] = count - 1
+        return -1 if count == self.limit(teacher) + 1 else 0
+
+    def _add(self, d: int, i: int) -> int:
+        teacher = self.teachers[d][i]
+        if teacher is None:
+            return 0
+        count = self.counts[d].get(teacher, 0) + 1
+        self.counts[d][teacher] = count
+        return 1 if count == self.limit(teacher) + 1 else 0
+
+class TeacherAvailability(Constraint):
+    """Rule: Teachers must not be scheduled in slots they marked unavailable."""
+    name = "availability"
+
+    def validate(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> List[str]:
+        violations = []
+        blocked = meta.get('unavailable', set())
+        for day, sessions in schedule.items():
+            for session in sessions:
+                if session.type == 'Lecture' and (session.teacher, day, session.period) in blocked:
+                    violations.append(f"{session.teacher} is unavailable on {day} period {session.period}")
+        return violations
+
+    def evaluator(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> ConstraintEvaluator:
+        return AvailabilityEvaluator(schedule, meta)
+
+class AvailabilityEvaluator(ConstraintEvaluator):
+    """Set lookup per slot for `TeacherAvailability`; slot `i` is period `i + 1`."""
+    def _blocked(self, d: int, i: int) -> int:
+        teacher = self.teachers[d][i]
+        return int(teacher is not None and (teacher, self.days[d], i + 1) in self.meta.get('unavailable', ()))
+
+    def _remove(self, d: int, i: int) -> int:
+        return -self._blocked(d, i)
+
+    def _add(self, d: int, i: int) -> int:
+        return self._blocked(d, i)
+
+class RoomConflict(Constraint):
+    """
+    Rule: Sessions that need a room type get a room no other class holds at that time.
+    Reads the shared `RoomOccupancy` in ``meta['rooms']``; the class's own bookings
+    are found under ``meta['section']``.
+    """
+    name = "rooms"
+
+    def validate(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> List[str]:
+        violations = []
+        for day, sessions in schedule.items():
+            for session in sessions:
+                room_type = _missing_room(meta, session.subject, day, session.period) if session.type == 'Lecture' else None
+                if room_type is not None:
+                    violations.append(f"No free {room_type} for {session.subject} on {day} period {session.period}")
+        return violations
+
+    def evaluator(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> ConstraintEvaluator:
+        return RoomEvaluator(schedule, meta)
+
+def _missing_room(meta: Dict[str, Any], subject: Optional[str], day: str, period: int) -> Optional[str]:
+    """The room type `subject` needs at day/period if the class neither holds one nor could book one."""
+    room_type = meta.get('room_types', {}).get(subject)
+    rooms = meta.get('rooms')
+    if room_type is None or rooms is None:
+        return None
+    held = rooms.held_by(meta.get('section', ''), day, period)
+    if held is not None and rooms.rooms[held].type == room_type:
+        return None
+    if rooms.has_free(room_type, day, period, meta.get('class_size', 0)):
+        return None
+    return room_type
+
+class RoomEvaluator(ConstraintEvaluator):
+    """Bitset lookup per slot for `RoomConflict`; slot `i` is period `i + 1`."""
+    def _blocked(self, d: int, i: int) -> int:
+        return int(_missing_room(self.meta, self.subjects[d][i], self.days[d], i + 1) is not None)
+
+    def _remove(self, d: int, i: int) -> int:
+        return -self._blocked(d, i)
+
+    def _add(self, d: int, i: int) -> int:
+        return self._blocked(d, i)
+
+def _subject_of(meta: Dict[str, Any], unit: Optional[str]) -> Optional[str]:
+    """Subject a scheduling unit belongs to; each share of a split subject is its own unit."""
+    return meta.get('subject_of', {}).get(unit, unit)
+
+class SubjectSpread(Constraint):
+    """Rule: A subject is taught at most a set number of periods per day."""
+    name = "subject_spread"
+
+    def __init__(self, max_per_day: Dict[str, int], default: Optional[int] = None):
+        """
+        Args:
+            max_per_day: Subject -> periods allowed per day.
+            default: Limit for subjects not listed (None leaves them unlimited).
+        """
+        self.max_per_day = max_per_day
+        self.default = default
+
+    def limit(self, subject: Optional[str]) -> Optional[int]:
+        return self.max_per_day.get(subject, self.default)
+
+    def validate(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> List[str]:
+        violations = []
+        for day, sessions in schedule.items():
+            counts: Dict[str, int] = {}
+            for session in sessions:
+                if session.type == 'Lecture':
+                    subject = _subject_of(meta, session.subject)
+                    counts[subject] = counts.get(subject, 0) + 1
+            for subject, count in counts.items():
+                limit = self.limit(subject)
+                if limit is not None and count > limit:
+                    violations.extend([f"{subject} has {count} periods on {day} (Max: {limit})"] * (count - limit))
         return violations
+
+    def evaluator(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> ConstraintEvaluator:
+        return SpreadEvaluator(self, schedule, meta)
+
+class SpreadEvaluator(ConstraintEvaluator):
+    """Per-subject, per-day counters for `SubjectSpread`; every period over the limit is one violation."""
+    def __init__(self, rule: SubjectSpread, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]):
+        self.limit = rule.limit
+        self.counts: List[Dict[str, int]] = [{} for _ in schedule]
+        super().__init__(schedule, meta)
+
+    def _remove(self, d: int, i: int) -> int:
+        subject = _subject_of(self.meta, self.subjects[d][i])
+        limit = None if subject is None else self.limit(subject)
+        if limit is None:
+            return 0
+        count = self.counts[d][subject]
+        self.counts[d][subject] = count - 1
+        return -1 if count > limit else 0
+
+    def _add(self, d: int, i: int) -> int:
+        subject = _subject_of(self.meta, self.subjects[d][i])
+        limit = None if subject is None else self.limit(subject)
+        if limit is None:
+            return 0
+        count = self.counts[d].get(subject, 0) + 1
+        self.counts[d][subject] = count
+        return 1 if count > limit else 0
+
+class ForbiddenSlots(Constraint):
+    """
+    Rule: Subjects and teachers stay out of the slots they are barred from.
+    Slots are held as one period bitmask per day (bit ``p - 1`` for period `p`),
+    so every check is a shift and a mask.
+    """
+    name = "forbidden"
+
+    def __init__(self, subject_masks: Dict[str, Dict[str, int]], teacher_masks: Dict[str, Dict[str, int]]):
+        """
+        Args:
+            subject_masks: Subject -> day -> forbidden period bits.
+            teacher_masks: Teacher -> day -> forbidden period bits.
+        """
+        self.subject_masks = subject_masks
+        self.teacher_masks = teacher_masks
+
+    def blocked(self, subject: Optional[str], teacher: Optional[str], day: str, period: int) -> bool:
+        bit = 1 << (period - 1)
+        return bool((self.subject_masks.get(subject, {}).get(day, 0) | self.teacher_masks.get(teacher, {}).get(day, 0)) & bit)
+
+    def validate(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> List[str]:
+        violations = []
+        for day, sessions in schedule.items():
+            for session in sessions:
+                subject = _subject_of(meta, session.subject)
+                if session.type == 'Lecture' and self.blocked(subject, session.teacher, day, session.period):
+                    violations.append(f"{subject} ({session.teacher}) is not allowed on {day} period {session.period}")
+        return violations
+
+    def evaluator(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]) -> ConstraintEvaluator:
+        return ForbiddenEvaluator(self, schedule, meta)
+
+class ForbiddenEvaluator(ConstraintEvaluator):
+    """Bitmask lookup per slot for `ForbiddenSlots`; slot `i` is period `i + 1`."""
+    def __init__(self, rule: ForbiddenSlots, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]):
+        self.rule = rule
+        super().__init__(schedule, meta)
+
+    def _blocked(self, d: int, i: int) -> int:
+        teacher = self.teachers[d][i]
+        if teacher is None:
+            return 0
+        return int(self.rule.blocked(_subject_of(self.meta, self.subjects[d][i]), teacher, self.days[d], i + 1))
+
+    def _remove(self, d: int, i: int) -> int:
+        return -self._blocked(d, i)
+
+    def _add(self, d: int, i: int) -> int:
+        return self._blocked(d, i)
@@ -0,0 +1,450 @@
+"""
+Constraint Satisfaction Strategy.
+
+Backtracking search over the (day, period) grid with bitmask domains,
+forward checking and MRV/degree variable ordering. Either returns a grid
+that satisfies every hard rule or proves that none exists.
+
+Most hard rules (daily limit, consecutive limit, unavailability) are rules
+about teachers, so the search assigns teachers to slots and subjects are
+dealt into each teacher's slots afterwards. This removes the symmetry
+between subjects that share a teacher, which would otherwise multiply the
+work needed to prove an input infeasible.
+
+The subject rules (per-day spread, forbidden subject slots) are enforced
+while dealing; a complete assignment that cannot be dealt is a dead end
+and the search backtracks past it. They also narrow the teacher search:
+a teacher is kept out of slots none of their subjects may take, and no
+teacher gets more periods a day than their subjects' spreads add up to.
+
+When the subjects need fewer periods than the week has, the spare slots
+go to a pseudo-teacher with no limits and come back as free periods.
+Like the other strategies' grids, free periods only ever close a day:
+the rules and evaluators read a day's sessions as one unbroken run.
+"""
+import logging
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable
+
+from config import DEFAULT_MAX_CONSECUTIVE, DEFAULT_MAX_DAILY
+from exceptions import InfeasibleScheduleError, GenerationTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Safety net for pathological inputs; real inputs finish far below this
+DEFAULT_MAX_NODES = 200000
+
+def _bits(mask: int):
+    """Yield the indices of the set bits in `mask`."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def _max_flow(capacity: List[List[int]], source: int, sink: int) -> int:
+    """Augmenting-path max flow on a small dense graph."""
+    n = len(capacity)
+    flow = 0
+    while True:
+        parent = [-1] * n
+        parent[source] = source
+        queue = [source]
+        for u in queue:
+            for v in range(n):
+                if parent[v] < 0 and capacity[u][v] > 0:
+                    parent[v] = u
+                    queue.append(v)
+        if parent[sink] < 0:
+            return flow
+        push = None
+        v = sink
+        while v != source:
+            u = parent[v]
+            push = capacity[u][v] if push is None else min(push, capacity[u][v])
+            v = u
+        v = sink
+        while v != source:
+            u = parent[v]
+            capacity[u][v] -= push
+            capacity[v][u] += push
+            v = u
+        flow += push
+
+class CSPSolver:
+    """
+    Slot-filling solver for one class timetable.
+    Variables are slots, values are teachers and every domain is an int
+    bitmask over teacher indices.
+    """
+    def __init__(self, subject_hours: Dict[str, int], subject_teacher_map: Dict[str, str],
+                 days: List[str], periods_per_day: int,
+                 unavailable: Optional[Set[Tuple[str, str, int]]] = None,
+                 max_daily: int = DEFAULT_MAX_DAILY, max_consecutive: int = DEFAULT_MAX_CONSECUTIVE,
+                 max_nodes: int = DEFAULT_MAX_NODES,
+                 teacher_limits: Optional[Dict[str, Dict[str, int]]] = None,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 subject_of: Optional[Dict[str, str]] = None,
+                 subject_daily: Optional[Dict[str, int]] = None,
+                 subject_blocked: Optional[Set[Tuple[str, str, int]]] = None):
+        """
+        Args:
+            subject_hours: Required weekly periods per subject.
+            subject_teacher_map: Subject to teacher assignment.
+            days: Day names, in order.
+            periods_per_day: Number of periods in a day.
+            unavailable: Blocked (teacher, day, period) slots, periods 1-based.
+            max_daily: Hard daily limit per teacher.
+            max_consecutive: Hard consecutive-periods limit per teacher.
+            max_nodes: Search node limit before giving up.
+            teacher_limits: Optional teacher -> {"max_daily", "max_consecutive"} overrides.
+            progress: Optional callback receiving the node count every 256 nodes.
+            subject_of: Unit -> subject for the shares of a split subject; other units are their own subject.
+            subject_daily: Hard subject -> periods-per-day limits.
+            subject_blocked: Forbidden (subject, day, period) slots, periods 1-based.
+        """
+        self.subject_hours = {s: h for s, h in subject_hours.items() if h > 0}
+        self.subject_teacher_map = subject_teacher_map
+        self.teachers: List[Optional[str]] = sorted({subject_teacher_map[s] for s in self.subject_hours})
+        self.hours = [0] * len(self.teachers)
+        for subject, hours in self.subject_hours.items():
+            self.hours[self.teachers.index(subject_teacher_map[subject])] += hours
+
+        self.days = days
+        self.periods = periods_per_day
+        self.n_slots = len(days) * periods_per_day
+        teacher_limits = teacher_limits or {}
+        self.max_daily = [teacher_limits.get(t, {}).get("max_daily", max_daily) for t in self.teachers]
+        self.max_consecutive = [teacher_limits.get(t, {}).get("max_consecutive", max_consecutive)
+                                for t in self.teachers]
+
+        subject_of = subject_of or {}
+        self.subject_of = {unit: subject_of.get(unit, unit) for unit in self.subject_hours}
+        self.subject_daily = subject_daily or {}
+        self.units: List[List[str]] = [sorted(u for u in self.subject_hours if subject_teacher_map[u] == t)
+                                       for t in self.teachers]
+        for t, units in enumerate(self.units):
+            # A teacher can teach no more in a day than their subjects' spreads allow between them
+            limits = [self.subject_daily.get(s) for s in {self.subject_of[u] for u in units}]
+            if None not in limits:
+                self.max_daily[t] = min(self.max_daily[t], sum(limits))
+        # Subject -> bitmask over slots the subject may not take
+        self.subject_masks: Dict[str, int] = {}
+        for subject, day, period in subject_blocked or ():
+            if day in days and 1 <= period <= periods_per_day:
+                slot = days.index(day) * periods_per_day + period - 1
+                self.subject_masks[subject] = self.subject_masks.get(subject, 0) | 1 << slot
+
+        # Spare slots belong to a pseudo-teacher (None) who is never blocked or limited
+        self.free: Optional[int] = None
+        spare = self.n_slots - sum(self.hours)
+        if spare > 0:
+            self.free = len(self.teachers)
+            self.teachers.append(None)
+            self.units.append([])
+            self.hours.append(spare)
+            self.max_daily.append(periods_per_day)
+            self.max_consecutive.append(periods_per_day)
+        self.max_nodes = max_nodes
+        self.unavailable = unavailable or set()
+        self.progress = progress
+
+    def _initial_domains(self) -> List[int]:
+        full = (1 << len(self.teachers)) - 1
+        domains = [full] * self.n_slots
+        for teacher, day, period in self.unavailable:
+            if teacher in self.teachers and day in self.days and 1 <= period <= self.periods:
+                slot = self.days.index(day) * self.periods + period - 1
+                domains[slot] &= ~(1 << self.teachers.index(teacher))
+        for t, units in enumerate(self.units):
+            if units:
+                # Slots that none of the teacher's subjects may take
+                barred = ~0
+                for unit in units:
+                    barred &= self._barred(unit)
+                for slot in _bits(barred):
+                    domains[slot] &= ~(1 << t)
+        return domains
+
+    def _barred(self, unit: str) -> int:
+        """Bitmask of the slots `unit` may not take."""
+        return self.subject_masks.get(self.subject_of[unit], 0)
+
+    def _precheck(self) -> None:
+        """Pigeonhole and Hall's-condition bounds that rule out whole inputs before any search."""
+        total = sum(self.hours)
+        if total > self.n_slots:
+            raise InfeasibleScheduleError(
+                f"Subject hours add up to {total} but the week has {self.n_slots} slots"
+            )
+        for t, teacher in enumerate(self.teachers):
+            capacity = sum(self.capacity[t])
+            if self.hours[t] > capacity:
+                raise InfeasibleScheduleError(
+                    f"{teacher} needs {self.hours[t]} periods but can teach at most {capacity} per week"
+                )
+        for subject in sorted(set(self.subject_of.values())):
+            needed = sum(h for unit, h in self.subject_hours.items() if self.subject_of[unit] == subject)
+            limit = self.subject_daily.get(subject, self.periods)
+            mask = self.subject_masks.get(subject, 0)
+            room = sum(
+                min(limit, sum(1 for p in range(self.periods) if not mask >> (d * self.periods + p) & 1))
+                for d in range(len(self.days))
+            )
+            if needed > room:
+                raise InfeasibleScheduleError(
+                    f"{subject} needs {needed} periods but its rules allow at most {room} per week"
+                )
+
+        # Teachers -> days transportation problem: every slot of every day must be covered
+        n_teachers, n_days = len(self.teachers), len(self.days)
+        source, sink = n_teachers + n_days, n_teachers + n_days + 1
+        graph = [[0] * (sink + 1) for _ in range(sink + 1)]
+        for t in range(n_teachers):
+            graph[source][t] = self.hours[t]
+            for d in range(n_days):
+                graph[t][n_teachers + d] = self.capacity[t][d]
+        for d in range(n_days):
+            graph[n_teachers + d][sink] = self.periods
+        if _max_flow(graph, source, sink) < total:
+            raise InfeasibleScheduleError("Teacher availability cannot cover every period of the week")
+
+    def solve(self) -> List[Optional[str]]:
+        """
+        Find a complete assignment.
+
+        Returns:
+            Subjects for every slot in day-major order, None for a free period.
+
+        Raises:
+            InfeasibleScheduleError: If no assignment satisfies the hard rules.
+            GenerationTimeoutError: If the node limit is hit first.
+        """
+        self.domains = self._initial_domains()
+        self.assigned: List[int] = [-1] * self.n_slots
+        self.day_count = [[0] * len(self.days) for _ in self.teachers]
+        self.capacity = [[self._day_capacity(t, d) for d in range(len(self.days))]
+                         for t in range(len(self.teachers))]
+        self._precheck()
+
+        self.remaining = self.hours[:]
+        self.trail: List[Tuple[int, int]] = []
+        self.capacity_trail: List[Tuple[int, int, int]] = []
+        self.nodes = 0
+
+        self.grid: List[Optional[str]] = []
+        if not self._search():
+            raise InfeasibleScheduleError("No timetable satisfies the hard constraints")
+        logger.info(f"CSP solved in {self.nodes} nodes")
+        return self.grid
+
+    def _count_node(self) -> None:
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise GenerationTimeoutError("CSP search limit reached")
+        if self.progress is not None and self.nodes % 256 == 0:
+            self.progress({"stage": "csp", "iteration": self.nodes})
+
+    def _search(self) -> bool:
+        slot = self._select_slot()
+        if slot is None:
+            return self._deal_subjects()
+        self._count_node()
+
+        for t in self._order_values(slot):
+            mark = (len(self.trail), len(self.capacity_trail))
+            if self._assign(slot, t) and self._search():
+                return True
+            self._unassign(slot, t, mark)
+        return False
+
+    def _select_slot(self) -> Optional[int]:
+        """MRV, then degree: most unassigned slots sharing the day, then lowest index."""
+        best, best_key = None, None
+        unassigned_per_day = [0] * len(self.days)
+        for slot, t in enumerate(self.assigned):
+            if t < 0:
+                unassigned_per_day[slot // self.periods] += 1
+        for slot, t in enumerate(self.assigned):
+            if t >= 0:
+                continue
+            key = (bin(self.domains[slot]).count("1"), -unassigned_per_day[slot // self.periods])
+            if best_key is None or key < best_key:
+                best, best_key = slot, key
+        return best
+
+    def _order_values(self, slot: int) -> List[int]:
+        """Teachers with the least slack (remaining need vs. remaining capacity) first."""
+        return sorted(
+            _bits(self.domains[slot]),
+            key=lambda t: (-self.remaining[t] / max(sum(self.capacity[t]), 1), t)
+        )
+
+    def _restrict(self, slot: int, remove: int) -> bool:
+        """Remove values from an unassigned slot's domain; False on wipe-out."""
+        mask = self.domains[slot]
+        if self.assigned[slot] >= 0 or not mask & remove:
+            return True
+        self.trail.append((slot, mask))
+        self.domains[slot] = mask & ~remove
+        return self.domains[slot] != 0
+
+    def _run_through(self, d: int, p: int, t: int) -> int:
+        """Length of the run of teacher `t` that would cover period `p` of day `d`."""
+        base = d * self.periods
+        length = 1
+        q = p - 1
+        while q >= 0 and self.assigned[base + q] == t:
+            length += 1
+            q -= 1
+        q = p + 1
+        while q < self.periods and self.assigned[base + q] == t:
+            length += 1
+            q += 1
+        return length
+
+    def _assign(self, slot: int, t: int) -> bool:
+        """Assign and forward-check; the caller undoes via `_unassign` on failure."""
+        d, p = divmod(slot, self.periods)
+        self.assigned[slot] = t
+        self.remaining[t] -= 1
+        self.day_count[t][d] += 1
+        base = d * self.periods
+        bit = 1 << t
+
+        if self.remaining[t] == 0:
+            for other in range(self.n_slots):
+                if not self._restrict(other, bit):
+                    return False
+        if self.day_count[t][d] == self.max_daily[t]:
+            for q in range(self.periods):
+                if not self._restrict(base + q, bit):
+                    return False
+
+        if self.free is not None:
+            # A free period must be followed by free periods, a lesson preceded by lessons
+            if t == self.free:
+                for q in range(p + 1, self.periods):
+                    if not self._restrict(base + q, ~bit):
+                        return False
+            else:
+                for q in range(p):
+                    if not self._restrict(base + q, 1 << self.free):
+                        return False
+
+        # Only the free slots just outside the new run can become over-long
+        left = p
+        while left > 0 and self.assigned[base + left - 1] == t:
+            left -= 1
+        right = p
+        while right < self.periods - 1 and self.assigned[base + right + 1] == t:
+            right += 1
+        for q in (left - 1, right + 1):
+            if 0 <= q < self.periods and self.assigned[base + q] < 0:
+                if self._run_through(d, q, t) > self.max_consecutive[t]:
+                    if not self._restrict(base + q, bit):
+                        return False
+
+        # Only day `d` changed, so only its capacities need refreshing
+        for other in range(len(self.teachers)):
+            cap = self._day_capacity(other, d)
+            if cap != self.capacity[other][d]:
+                self.capacity_trail.append((other, d, self.capacity[other][d]))
+                self.capacity[other][d] = cap
+
+        return self._counts_ok(d)
+
+    def _counts_ok(self, d: int) -> bool:
+        """Every teacher must still have room for its hours and day `d` must still be fillable."""
+        for t, need in enumerate(self.remaining):
+            if need > sum(self.capacity[t]):
+                return False
+        open_slots = sum(1 for q in range(self.periods) if self.assigned[d * self.periods + q] < 0)
+        fill = sum(min(self.capacity[t][d], self.remaining[t]) for t in range(len(self.teachers)))
+        return fill >= open_slots
+
+    def _day_capacity(self, t: int, d: int) -> int:
+        """
+        Most extra periods teacher `t` can still take on day `d` without
+        exceeding the daily or consecutive limit, by a DP over the run length.
+        """
+        bit = 1 << t
+        base = d * self.periods
+        limit = self.max_consecutive[t]
+        # best[r]: max periods placed so far when the current run of `t` has length r
+        best = [0] + [-1] * limit
+        for q in range(self.periods):
+            assigned = self.assigned[base + q]
+            new = [-1] * (limit + 1)
+            if assigned == t:
+                for r in range(limit):
+                    new[r + 1] = best[r]
+            else:
+                new[0] = max(best)
+                if assigned < 0 and self.domains[base + q] & bit:
+                    for r in range(limit):
+                        if best[r] >= 0:
+                            new[r + 1] = max(new[r + 1], best[r] + 1)
+            best = new
+        return max(0, min(max(best), self.max_daily[t] - self.day_count[t][d]))
+
+    def _unassign(self, slot: int, t: int, mark: Tuple[int, int]) -> None:
+        while len(self.trail) > mark[0]:
+            other, mask = self.trail.pop()
+            self.domains[other] = mask
+        while len(self.capacity_trail) > mark[1]:
+            other, d, cap = self.capacity_trail.pop()
+            self.capacity[other][d] = cap
+        self.assigned[slot] = -1
+        self.remaining[t] += 1
+        self.day_count[t][slot // self.periods] -= 1
+
+    def _deal_subjects(self) -> bool:
+        """
+        Fill each teacher's slots with their subjects, avoiding back-to-back
+        repeats where the subject rules allow; spare slots stay free. Sets
+        `grid` and returns True, or False if the assignment cannot be dealt.
+        """
+        self.left = dict(self.subject_hours)
+        self.day_subjects: Dict[Tuple[str, int], int] = {}
+        # Slots from the current one on that each unit may still take
+        self.room = {
+            unit: sum(1 for slot, t in enumerate(self.assigned)
+                      if t == self.teachers.index(self.subject_teacher_map[unit]) and not self._barred(unit) >> slot & 1)
+            for unit in self.left
+        }
+        self.grid = [None] * self.n_slots
+        return all(self.left[unit] <= self.room[unit] for unit in self.left) and self._deal(0)
+
+    def _deal(self, slot: int) -> bool:
+        while slot < self.n_slots and self.assigned[slot] == self.free:
+            slot += 1
+        if slot == self.n_slots:
+            return True
+        t = self.assigned[slot]
+        d = slot // self.periods
+        takers = [unit for unit in self.units[t] if not self._barred(unit) >> slot & 1]
+        for unit in takers:
+            self.room[unit] -= 1
+
+        previous = self.grid[slot - 1] if slot % self.periods else None
+        options = [
+            unit for unit in takers if self.left[unit] > 0
+            and self.day_subjects.get((self.subject_of[unit], d), 0)
+            < self.subject_daily.get(self.subject_of[unit], self.periods)
+        ]
+        options.sort(key=lambda unit: (unit != previous, self.left[unit]), reverse=True)
+        for unit in options:
+            key = (self.subject_of[unit], d)
+            self.left[unit] -= 1
+            self.day_subjects[key] = self.day_subjects.get(key, 0) + 1
+            self.grid[slot] = unit
+            # Every unit of the teacher must still fit in the slots left to it
+            if all(self.left[u] <= self.room[u] for u in self.units[t]) and self._deal(slot + 1):
+                return True
+            self.left[unit] += 1
+            self.day_subjects[key] -= 1
+            self._count_node()
+
+        self.grid[slot] = None
+        for unit in takers:
+            self.room[unit] += 1
+        return False
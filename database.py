@@ -1,24 +1,117 @@
 """
 Database connection manager.
+
+SQLite runs in WAL mode so history writes never block readers. Every
+process keeps a small pool of connections, and history rows (like stored
+timetables, see store.py) go through a write-behind queue that a
+background thread flushes in batches, so requests never wait on a commit.
 """
+import atexit
+import logging
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
 from flask import g
 
-DATABASE = 'scheduler.db'
+from config import (
+    DATABASE_PATH, DB_POOL_SIZE, HISTORY_BATCH_SIZE, HISTORY_FLUSH_SECONDS, HISTORY_QUEUE_LIMIT,
+    WRITER_FLUSH_TIMEOUT
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DATABASE = DATABASE_PATH
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+# Columns added after the first release, by table; older databases get them on startup
+ADDED_COLUMNS = {"history": {"strategy": "TEXT", "result_id": "TEXT"}, "timetables": {"digest": "TEXT"}}
+
+HISTORY_FIELDS = ("timestamp", "subjects", "teachers", "periods", "duration", "status", "strategy", "result_id")
+
+def _connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+class ConnectionPool:
+    """
+    Fixed-size pool of connections for one process. A forked child starts
+    its own pool instead of sharing the parent's file handles.
+    """
+    def __init__(self, path: str = DATABASE, size: int = DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._pid = os.getpid()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self.__init__(self.path, self.size)
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return _connect(self.path)
+        return self._idle.get()
+
+    def release(self, db: sqlite3.Connection) -> None:
+        if self._pid != os.getpid():
+            db.close()
+            return
+        if db.in_transaction:
+            db.rollback()
+        self._idle.put(db)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        db = self.acquire()
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+pool = ConnectionPool()
+
+def init_db(path: Optional[str] = None) -> None:
+    """Apply schema.sql (idempotent) and add any newer columns."""
+    db = _connect(path or DATABASE)
+    try:
+        with open(SCHEMA_PATH) as f:
+            db.executescript(f.read())
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row["name"] for row in db.execute(f"PRAGMA table_info({table})")}
+            for column, kind in columns.items():
+                if column not in existing:
+                    db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        db.commit()
+    finally:
+        db.close()
 
 def get_db():
     """Get the current database connection."""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = g._database = pool.acquire()
     return db
 
 def close_connection(exception):
-    """Close the database connection at end of request."""
-    db = getattr(g, '_database', None)
+    """Return the request's connection to the pool at end of request."""
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        pool.release(db)
 
 def query_db(query, args=(), one=False):
     """Execute a query and return results."""
@@ -27,6 +120,232 @@ def query_db(query, args=(), one=False):
     cur.close()
     return (rv[0] if rv else None) if one else rv
 
+class _Flush:
+    """Queue marker: the writer thread commits the batch it holds, then sets `done`."""
+    __slots__ = ("done",)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+class WriteBehind:
+    """
+    Write-behind queue drained by a daemon thread, in batches of up to
+    `batch_size` items every `flush_interval` seconds. `flush` goes through
+    the same thread, so items it has already taken off the queue are
+    committed too. Subclasses write a batch in `_write` and decide in
+    `_overflow` what happens to an item the full queue turns away.
+    """
+    name = "writer"
+
+    def __init__(self, batch_size: int, flush_interval: float, queue_limit: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_limit)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def put(self, item: Any) -> None:
+        """Queue an item without blocking."""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._overflow(item)
+
+    def flush(self, timeout: float = WRITER_FLUSH_TIMEOUT) -> bool:
+        """
+        Commit every item queued so far and wait for it.
+
+        Returns:
+            True once they are written, False if the writer did not finish within `timeout`.
+        """
+        if not self._running():
+            # No thread in this process holds a batch, so the queue is everything
+            items = []
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(items)
+            return True
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"{self.name} queue stayed full; flush gave up")
+            return False
+        if not marker.done.wait(timeout):
+            logger.warning(f"{self.name} did not finish within {timeout}s")
+            return False
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _overflow(self, item: Any) -> None:
+        raise NotImplementedError
+
+    def _write(self, items: List[Any]) -> int:
+        raise NotImplementedError
+
+    def _running(self) -> bool:
+        # A forked worker inherits the object but not the thread
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def _ensure_thread(self) -> None:
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            items, marker = [], None
+            deadline = time.monotonic() + self.flush_interval
+            while len(items) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if isinstance(item, _Flush):
+                    marker = item
+                    break
+                items.append(item)
+            if items:
+                self._write(items)
+            if marker is not None:
+                marker.done.set()
+
+class HistoryWriter(WriteBehind):
+    """
+    Write-behind queue for history rows. `record` never blocks: rows are
+    written with one executemany per batch, and dropped (and counted) when
+    the queue is full.
+    """
+    name = "history-writer"
+
+    def __init__(self, connections: ConnectionPool = pool, batch_size: int = HISTORY_BATCH_SIZE,
+                 flush_interval: float = HISTORY_FLUSH_SECONDS, queue_limit: int = HISTORY_QUEUE_LIMIT):
+        super().__init__(batch_size, flush_interval, queue_limit)
+        self.connections = connections
+        self.dropped = 0
+
+    def record(self, subjects: int, teachers: int, periods: int, duration: float, status: str,
+               strategy: Optional[str] = None, result_id: Optional[str] = None) -> None:
+        self.put((time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()), str(subjects), str(teachers), periods,
+                  duration, status, strategy, result_id))
+
+    def _overflow(self, row: Tuple[Any, ...]) -> None:
+        self.dropped += 1
+        metrics.inc("timetable_db_writes_total", result="dropped")
+        logger.warning("History queue full, dropping row")
+
+    def _write(self, rows: List[Tuple[Any, ...]]) -> int:
+        if not rows:
+            return 0
+        try:
+            with metrics.timer("timetable_db_write_duration_seconds"), self.connections.connection() as db:
+                db.executemany(
+                    f'INSERT INTO history ({", ".join(HISTORY_FIELDS)}) VALUES ({", ".join("?" * len(HISTORY_FIELDS))})',
+                    rows
+                )
+                db.commit()
+        except sqlite3.Error as e:
+            metrics.inc("timetable_db_writes_total", len(rows), result="error")
+            logger.error(f"History write of {len(rows)} rows failed: {e}")
+            return 0
+        metrics.inc("timetable_db_writes_total", len(rows), result="ok")
+        return len(rows)
+
+history_writer = HistoryWriter()
+
+def history_page(limit: int, before: Optional[int] = None, filters: Optional[Dict[str, Any]] = None
+                 ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    One page of history, newest first, using keyset pagination on the id.
+
+    Args:
+        limit: Page size.
+        before: Cursor from the previous page; only rows with a smaller id are returned.
+        filters: Optional status, strategy, subjects, teachers, periods, since and until.
+
+    Returns:
+        Tuple of the rows and the cursor for the next page (None on the last page).
+    """
+    clauses, args = _history_filters(filters or {})
+    if before is not None:
+        clauses.append("id < ?")
+        args.append(before)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = query_db(f"SELECT * FROM history {where} ORDER BY id DESC LIMIT ?", args + [limit + 1])
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = items[-1]["id"] if len(rows) > limit else None
+    return items, next_cursor
+
+def history_stats(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Request count and p50/p95/max duration per input size (subjects, teachers, periods)."""
+    clauses, args = _history_filters(filters or {})
+    clauses.append("duration IS NOT NULL")
+    rows = query_db(
+        f"SELECT subjects, teachers, periods, duration FROM history WHERE {' AND '.join(clauses)} "
+        "ORDER BY subjects, teachers, periods, duration",
+        args
+    )
+    groups: Dict[Tuple[Any, ...], List[float]] = {}
+    for row in rows:
+        groups.setdefault((row["subjects"], row["teachers"], row["periods"]), []).append(row["duration"])
+
+    stats = []
+    for (subjects, teachers, periods), durations in groups.items():
+        stats.append({
+            "subjects": int(subjects),
+            "teachers": int(teachers),
+            "periods": periods,
+            "count": len(durations),
+            "p50": _nearest_rank(durations, 50),
+            "p95": _nearest_rank(durations, 95),
+            "max": durations[-1],
+        })
+    stats.sort(key=lambda s: (s["subjects"], s["teachers"], s["periods"]))
+    return stats
+
+def _nearest_rank(ordered: List[float], pct: float) -> float:
+    rank = max(0, min(len(ordered) - 1, -(-len(ordered) * pct // 100) - 1))
+    return ordered[int(rank)]
+
+def _history_filters(filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    clauses: List[str] = []
+    args: List[Any] = []
+    for column in ("status", "strategy"):
+        if filters.get(column) is not None:
+            clauses.append(f"{column} = ?")
+            args.append(filters[column])
+    for column in ("subjects", "teachers"):
+        if filters.get(column) is not None:
+            clauses.append(f"{column} = ?")
+            args.append(str(filters[column]))
+    if filters.get("periods") is not None:
+        clauses.append("periods = ?")
+        args.append(filters["periods"])
+    if filters.get("since"):
+        clauses.append("timestamp >= ?")
+        args.append(filters["since"])
+    if filters.get("until"):
+        clauses.append("timestamp < ?")
+        args.append(filters["until"])
+    return clauses, args
+
 def init_app(app):
-    """Register database teardown context."""
+    """Create the schema and register database teardown context."""
+    init_db()
     app.teardown_appcontext(close_connection)
+    atexit.register(history_writer.flush)
@@ -0,0 +1,165 @@
+"""
+Compact Response Encoding.
+
+The JSON result repeats every subject, teacher and room name in every slot.
+The compact encoding sends each distinct string once, in a ``strings``
+table, and each timetable as days x periods matrices of indexes into it
+(-1 for a free period), one matrix per field:
+
+    {
+        "encoding": "compact",
+        "strings": ["Math", "Smith", ...],
+        "days": [...], "time_slots": [...],
+        "timetable": {"subject": [[0, 2, ...], ...], "teacher": [[1, 3, ...], ...]},
+        "subject_teacher_map": [[0, 1], ...],
+        "meta": {...}
+    }
+
+A school result carries one such timetable per entry of "sections". Every
+other field is passed through as is. `decode_compact` restores the usual
+shape. Encoded (and compressed) bodies of versioned results are kept by
+their ETag, so a repeat fetch skips encoding altogether.
+"""
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config import RESPONSE_COMPRESSION_LEVEL, ENCODED_CACHE_ENTRIES
+
+COMPACT_MEDIA_TYPE = "application/vnd.timetable.compact+json"
+
+# Slot fields stored as matrices, in order; "period" is the column index
+SLOT_FIELDS = ("subject", "teacher", "room")
+
+# Content codings we can produce, in order of preference, with their zlib window bits
+CODINGS = {"gzip": 31, "deflate": 15}
+
+def _encode_timetable(timetable: Dict[str, List[Dict[str, Any]]], days: List[str], periods: int,
+                      strings: Dict[str, int]) -> Dict[str, List[List[int]]]:
+    """Index matrices of one timetable; `strings` maps each string to its index and grows as new ones appear."""
+    # setdefault interns in one C call; a new string's index is the table size before it was added
+    intern = strings.setdefault
+    subjects, teachers, rooms = [], [], []
+    has_rooms = False
+    for day in days:
+        subject_row, teacher_row, room_row = [-1] * periods, [-1] * periods, [-1] * periods
+        for session in timetable.get(day, ()):
+            p = session["period"] - 1
+            subject_row[p] = intern(session["subject"], len(strings))
+            if session.get("teacher") is not None:
+                teacher_row[p] = intern(session["teacher"], len(strings))
+            if session.get("room") is not None:
+                room_row[p] = intern(session["room"], len(strings))
+                has_rooms = True
+        subjects.append(subject_row)
+        teachers.append(teacher_row)
+        rooms.append(room_row)
+    # Rooms are left out unless a slot has one
+    return {"subject": subjects, "teacher": teachers, **({"room": rooms} if has_rooms else {})}
+
+def _decode_timetable(matrices: Dict[str, List[List[int]]], days: List[str],
+                      strings: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    timetable: Dict[str, List[Dict[str, Any]]] = {}
+    for d, day in enumerate(days):
+        sessions = []
+        for p, subject in enumerate(matrices["subject"][d]):
+            if subject < 0:
+                continue
+            session: Dict[str, Any] = {"period": p + 1}
+            for field in SLOT_FIELDS:
+                if field in matrices and matrices[field][d][p] >= 0:
+                    session[field] = strings[matrices[field][d][p]]
+            sessions.append(session)
+        timetable[day] = sessions
+    return timetable
+
+def encode_compact(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Encode a class or school result compactly.
+
+    Args:
+        result: A /generate result.
+
+    Returns:
+        The compact payload; fields other than the timetables pass through unchanged.
+    """
+    strings: Dict[str, int] = {}
+    days = result["days"]
+    periods = len(result["time_slots"])
+    payload = dict(result, encoding="compact")
+
+    def section(data: Dict[str, Any]) -> Dict[str, Any]:
+        encoded = dict(data, timetable=_encode_timetable(data["timetable"], days, periods, strings))
+        if "subject_teacher_map" in data:
+            encoded["subject_teacher_map"] = [[strings.setdefault(s, len(strings)), strings.setdefault(t, len(strings))]
+                                              for s, t in data["subject_teacher_map"].items()]
+        return encoded
+
+    if "sections" in result:
+        payload["sections"] = {name: section(data) for name, data in result["sections"].items()}
+    else:
+        payload.update(section(result))
+    payload["strings"] = list(strings)
+    return payload
+
+def decode_compact(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """The usual result shape of a compact payload."""
+    strings = payload["strings"]
+    days = payload["days"]
+
+    def section(data: Dict[str, Any]) -> Dict[str, Any]:
+        decoded = dict(data, timetable=_decode_timetable(data["timetable"], days, strings))
+        if "subject_teacher_map" in data:
+            decoded["subject_teacher_map"] = {strings[s]: strings[t] for s, t in data["subject_teacher_map"]}
+        return decoded
+
+    result = {k: v for k, v in payload.items() if k not in ("encoding", "strings")}
+    if "sections" in payload:
+        result["sections"] = {name: section(data) for name, data in payload["sections"].items()}
+    else:
+        result.update(section(result))
+    return result
+
+def negotiate_coding(accept_encoding: Any) -> Optional[str]:
+    """The preferred coding the client accepts (a werkzeug Accept of Accept-Encoding), or None for identity."""
+    accepted = [(accept_encoding[coding], -rank) for rank, coding in enumerate(CODINGS) if accept_encoding[coding] > 0]
+    if not accepted:
+        return None
+    return list(CODINGS)[-max(accepted)[1]]
+
+def compress(body: bytes, coding: Optional[str]) -> bytes:
+    """`body` in the given content coding ("gzip", "deflate" or None)."""
+    if coding is None:
+        return body
+    compressor = zlib.compressobj(RESPONSE_COMPRESSION_LEVEL, zlib.DEFLATED, CODINGS[coding])
+    return compressor.compress(body) + compressor.flush()
+
+def encode_body(data: Dict[str, Any], compact: bool, coding: Optional[str]) -> bytes:
+    """Response bytes of `data` as JSON or compact JSON, in the given content coding."""
+    return compress(json.dumps(encode_compact(data) if compact else data, separators=(",", ":")).encode("utf-8"),
+                    coding)
+
+class BodyCache:
+    """LRU of encoded response bodies by strong ETag; a tag names one exact body, so entries never go stale."""
+    def __init__(self, max_entries: int = ENCODED_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._bodies: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._bodies.get(etag)
+            if body is not None:
+                self._bodies.move_to_end(etag)
+            return body
+
+    def put(self, etag: str, body: bytes) -> None:
+        with self._lock:
+            self._bodies[etag] = body
+            self._bodies.move_to_end(etag)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+encoded_bodies = BodyCache()
@@ -2,6 +2,7 @@
 Custom exceptions for the application.
 """
 from http import HTTPStatus
+from typing import Any, Dict, Optional
 
 class TimetableError(Exception):
     """
@@ -13,6 +14,31 @@ class TimetableError(Exception):
         self.message = message
         self.status_code = status_code
 
+class ValidationError(TimetableError):
+    """Raised when a request field is malformed or out of range."""
+    pass
+
 class GenerationTimeoutError(TimetableError):
     """Raised when generation takes too long."""
     pass
+
+class InfeasibleScheduleError(TimetableError):
+    """
+    Raised when the hard constraints provably cannot be satisfied.
+    `conflict` optionally names the smallest conflicting set of inputs.
+    """
+    def __init__(self, message: str, status_code: int = HTTPStatus.UNPROCESSABLE_ENTITY,
+                 conflict: Optional[Dict[str, Any]] = None):
+        super().__init__(message, status_code)
+        self.conflict = conflict or {}
+
+class OverloadedError(TimetableError):
+    """Raised when a request is shed under load; `retry_after` is a hint in seconds."""
+    def __init__(self, message: str, retry_after: int = 1, status_code: int = HTTPStatus.TOO_MANY_REQUESTS):
+        super().__init__(message, status_code)
+        self.retry_after = retry_after
+
+class GenerationCancelledError(TimetableError):
+    """Raised inside a generation run when its job has been cancelled."""
+    def __init__(self, message: str = "Generation was cancelled", status_code: int = HTTPStatus.CONFLICT):
+        super().__init__(message, status_code)
@@ -0,0 +1,169 @@
+"""
+Streaming timetable export.
+
+Every format is a generator of text chunks, so a response can start as soon
+as the first row is ready and memory stays flat however many timetables are
+exported. Sources are ``(name, timetable)`` pairs where a timetable is the
+JSON shape ``{day: [{"period", "subject", "teacher"}]}``.
+"""
+import csv
+import datetime
+import io
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import START_HOUR, PERIOD_MINUTES, APP_VERSION
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "ical": ("text/calendar", "ics"),
+}
+
+# Rows are grouped into chunks of roughly this many bytes before being sent
+CHUNK_SIZE = 16 * 1024
+
+Source = Tuple[str, Dict[str, List[Dict[str, Any]]]]
+
+def _chunked(pieces: Iterable[str], size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Group small pieces into chunks of about `size` characters; the first piece goes out on its own."""
+    pieces = iter(pieces)
+    for piece in pieces:
+        yield piece
+        break
+    buffer: List[str] = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+def iter_csv(sources: Iterable[Source], named: bool = False) -> Iterator[str]:
+    """
+    CSV rows; with `named` a leading Timetable column tells the timetables apart.
+    """
+    line = io.StringIO()
+    writer = csv.writer(line)
+
+    def row(values: List[Any]) -> str:
+        line.seek(0)
+        line.truncate()
+        writer.writerow(values)
+        return line.getvalue()
+
+    def rows() -> Iterator[str]:
+        headers = ["Day", "Period", "Subject", "Teacher"]
+        yield row(["Timetable"] + headers if named else headers)
+        for name, timetable in sources:
+            prefix = [name] if named else []
+            for day, sessions in timetable.items():
+                for session in sessions:
+                    yield row(prefix + [day, session['period'], session['subject'], session['teacher']])
+
+    return _chunked(rows())
+
+def iter_ndjson(sources: Iterable[Source]) -> Iterator[str]:
+    """One JSON object per session."""
+    def rows() -> Iterator[str]:
+        for name, timetable in sources:
+            for day, sessions in timetable.items():
+                for session in sessions:
+                    yield json.dumps({
+                        "timetable": name,
+                        "day": day,
+                        "period": session["period"],
+                        "subject": session["subject"],
+                        "teacher": session["teacher"]
+                    }) + "\n"
+
+    return _chunked(rows())
+
+def _ical_escape(text: str) -> str:
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n"))
+
+def _week_start(week_of: Optional[datetime.date]) -> datetime.date:
+    """Monday of the week containing `week_of` (default: the coming Monday)."""
+    if week_of is None:
+        today = datetime.date.today()
+        return today + datetime.timedelta(days=(7 - today.weekday()) % 7)
+    return week_of - datetime.timedelta(days=week_of.weekday())
+
+def iter_ical(sources: Iterable[Source], teacher: Optional[str] = None,
+              week_of: Optional[datetime.date] = None) -> Iterator[str]:
+    """
+    One VCALENDAR of weekly recurring events, one per session; with `teacher`
+    only that teacher's sessions are included, giving a per-teacher feed.
+    Period `n` starts at `START_HOUR + n - 1` o'clock, matching the scheduler's time slots.
+    """
+    monday = _week_start(week_of)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    weekday_codes = {day: code for day, code in zip(
+        ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+        ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+    )}
+    day_offsets = {day: i for i, day in enumerate(weekday_codes)}
+    title = f"{teacher} timetable" if teacher else "Timetable"
+
+    def lines() -> Iterator[str]:
+        yield "BEGIN:VCALENDAR\r\n"
+        yield f"PRODID:-//Smart Timetable Generator//{APP_VERSION}//EN\r\n"
+        yield "VERSION:2.0\r\n"
+        yield "CALSCALE:GREGORIAN\r\n"
+        yield f"X-WR-CALNAME:{_ical_escape(title)}\r\n"
+        for name, timetable in sources:
+            for day, sessions in timetable.items():
+                if day not in day_offsets:
+                    continue
+                date = monday + datetime.timedelta(days=day_offsets[day])
+                for session in sessions:
+                    if teacher is not None and session["teacher"] != teacher:
+                        continue
+                    start = datetime.datetime.combine(date, datetime.time(START_HOUR)) + \
+                        datetime.timedelta(hours=int(session["period"]) - 1)
+                    end = start + datetime.timedelta(minutes=PERIOD_MINUTES)
+                    uid = f"{name}-{day}-{session['period']}-{session['teacher']}".replace(" ", "_")
+                    yield "BEGIN:VEVENT\r\n"
+                    yield f"UID:{_ical_escape(uid)}@timetable\r\n"
+                    yield f"DTSTAMP:{stamp}\r\n"
+                    yield f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}\r\n"
+                    yield f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}\r\n"
+                    yield f"RRULE:FREQ=WEEKLY;BYDAY={weekday_codes[day]}\r\n"
+                    yield f"SUMMARY:{_ical_escape(session['subject'])}" + (f" ({_ical_escape(name)})" if name else "") + "\r\n"
+                    yield f"DESCRIPTION:{_ical_escape(session['teacher'])}\r\n"
+                    yield "END:VEVENT\r\n"
+        yield "END:VCALENDAR\r\n"
+
+    return _chunked(lines())
+
+def gzip_stream(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+    """Compress text chunks on the fly into one gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(fmt: str, sources: Iterable[Source], named: bool = False, teacher: Optional[str] = None,
+                  week_of: Optional[datetime.date] = None, compress: bool = False) -> Iterator[Any]:
+    """Chunks of `sources` in format `fmt`, gzip-compressed when `compress` is set."""
+    if fmt == "csv":
+        chunks = iter_csv(sources, named=named)
+    elif fmt == "ndjson":
+        chunks = iter_ndjson(sources)
+    else:
+        chunks = iter_ical(sources, teacher=teacher, week_of=week_of)
+    return gzip_stream(chunks) if compress else chunks
+
+def result_sources(name: str, result: Dict[str, Any]) -> Iterator[Source]:
+    """Timetables inside a generation result: one for a class, one per section for a school."""
+    if "sections" in result:
+        for section, data in result["sections"].items():
+            yield section, data["timetable"]
+    elif "timetable" in result:
+        yield name, result["timetable"]
@@ -0,0 +1,225 @@
+"""
+Feasibility Pre-check.
+
+Necessary conditions for a timetable to exist, checked before any solver
+runs: pigeonhole bounds on weekly, daily and per-slot capacity, and Hall's
+condition on the subject -> teacher graph (and, for a school, on the
+section -> teacher graph) via a max-flow min cut. Capacities account for
+the hard daily and consecutive limits, unavailability, forbidden slots and
+weekly maximums. A failing check raises `InfeasibleScheduleError` carrying
+the smallest conflicting set found, so the caller can point at exactly
+which subjects, teachers, days or sections to fix.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from config import DEFAULT_DAYS
+from assignment import MinCostFlow
+from constraint_spec import CompiledConstraints, compile_constraints
+from exceptions import InfeasibleScheduleError
+from models import blocked_slots
+
+logger = logging.getLogger(__name__)
+
+def _day_capacity(free: int, periods: int, max_daily: int, max_consecutive: int) -> int:
+    """Most periods one teacher can take in a day: every run of free periods loses one in each `max_consecutive + 1`."""
+    total = run = 0
+    for p in range(periods + 1):
+        if p < periods and free >> p & 1:
+            run += 1
+        else:
+            total += run - run // (max_consecutive + 1)
+            run = 0
+    return min(total, max_daily)
+
+def _free_masks(teachers: Sequence[str], days: List[str], periods: int,
+                blocked: Set[Tuple[str, str, int]]) -> Dict[str, List[int]]:
+    """Teacher -> per-day bitmask of periods they can teach (bit ``p - 1`` for period `p`)."""
+    full = (1 << periods) - 1
+    masks = {teacher: [full] * len(days) for teacher in teachers}
+    for teacher, day, period in blocked:
+        if teacher in masks and day in days and 1 <= period <= periods:
+            masks[teacher][days.index(day)] &= ~(1 << (period - 1))
+    return masks
+
+def daily_capacity(teachers: Sequence[str], days: List[str], periods: int, blocked: Set[Tuple[str, str, int]],
+                   compiled: CompiledConstraints) -> Dict[str, List[int]]:
+    """Teacher -> most periods they can take on each day under the hard limits, outside the `blocked` slots."""
+    free = _free_masks(teachers, days, periods, blocked)
+    capacity = {}
+    for teacher in teachers:
+        limits = compiled.limits(teacher, unlimited=periods)
+        capacity[teacher] = [_day_capacity(mask, periods, limits["max_daily"], limits["max_consecutive"])
+                             for mask in free[teacher]]
+    return capacity
+
+def _hall_violator(demand: Dict[str, int], neighbours: Dict[str, List[str]],
+                   capacity: Dict[str, int]) -> Optional[List[str]]:
+    """
+    A smallest-found set X with demand(X) > capacity(N(X)), or None when
+    every demand can be routed. The min cut of a max flow yields a
+    violating set; it is then shrunk while it still violates, so no member
+    can be dropped.
+    """
+    left = [x for x in demand if demand[x] > 0]
+    right = sorted({y for x in left for y in neighbours[x]})
+    index = {y: i for i, y in enumerate(right, len(left) + 1)}
+    source, sink = 0, len(left) + len(right) + 1
+    flow = MinCostFlow(sink + 1)
+    for i, x in enumerate(left, 1):
+        flow.add_edge(source, i, demand[x], 0)
+        for y in neighbours[x]:
+            flow.add_edge(i, index[y], demand[x], 0)
+    for y in right:
+        flow.add_edge(index[y], sink, capacity[y], 0)
+    routed, _ = flow.solve(source, sink)
+    if routed >= sum(demand[x] for x in left):
+        return None
+
+    # Source side of the min cut: nodes still reachable in the residual graph
+    reached = {source}
+    queue = [source]
+    for u in queue:
+        for e in flow.graph[u]:
+            if flow.cap[e] > 0 and flow.to[e] not in reached:
+                reached.add(flow.to[e])
+                queue.append(flow.to[e])
+    violator = [x for i, x in enumerate(left, 1) if i in reached]
+
+    def violates(xs: List[str]) -> bool:
+        return sum(demand[x] for x in xs) > sum(capacity[y] for y in {y for x in xs for y in neighbours[x]})
+
+    for x in sorted(violator, key=lambda x: demand[x]):
+        smaller = [other for other in violator if other != x]
+        if smaller and violates(smaller):
+            violator = smaller
+    return violator
+
+def _conflict(message: str, required: int, available: int, **members: List[str]) -> InfeasibleScheduleError:
+    conflict: Dict[str, Any] = {k: sorted(v) for k, v in members.items() if v}
+    conflict.update(required=required, available=available)
+    logger.info(f"Pre-check rejected input: {message}")
+    return InfeasibleScheduleError(message, conflict=conflict)
+
+def check_feasibility(subjects: List[str], teachers: List[str], periods_per_day: int,
+                      subject_hours: Optional[Dict[str, int]] = None,
+                      unavailable: Optional[Dict[str, List[Any]]] = None,
+                      staffing: Optional[Dict[str, Any]] = None,
+                      facilities: Optional[Dict[str, Any]] = None,
+                      constraints: Optional[Dict[str, Any]] = None, **_: Any) -> None:
+    """
+    Reject a single-class request that no timetable can satisfy.
+
+    Args:
+        subjects: Subjects to schedule.
+        teachers: Available teachers.
+        periods_per_day: Number of periods in a day.
+        subject_hours: Optional weekly periods per subject; the rest share the remaining slots.
+        unavailable: Optional teacher -> blocked days or [day, period] pairs.
+        staffing: Optional qualifications and max_hours.
+        facilities: Optional rooms, subject_rooms and class_size.
+        constraints: Optional constraint spec; only its hard rules limit capacity.
+        **_: Other generation options, ignored.
+
+    Raises:
+        InfeasibleScheduleError: With ``conflict`` holding the smallest conflicting set.
+    """
+    days = list(DEFAULT_DAYS)
+    slots = len(days) * periods_per_day
+    compiled = compile_constraints(constraints)
+    staffing, facilities = staffing or {}, facilities or {}
+
+    # Weekly periods per subject, split the way `Scheduler` splits them (leftovers aside)
+    explicit = {s: h for s, h in (subject_hours or {}).items() if s in subjects}
+    if sum(explicit.values()) > slots:
+        raise _conflict(f"Subject hours add up to {sum(explicit.values())} but the week has {slots} slots",
+                        sum(explicit.values()), slots, subjects=list(explicit))
+    others = [s for s in subjects if s not in explicit]
+    hours = dict(explicit)
+    for subject in others:
+        hours[subject] = (slots - sum(explicit.values())) // len(others)
+    demand = slots if others else sum(explicit.values())
+
+    # Per-teacher capacity under the hard limits, per day and per week
+    blocked = blocked_slots(unavailable or {}, periods_per_day) | compiled.blocked_slots(teachers, days,
+                                                                                          periods_per_day)
+    free = _free_masks(teachers, days, periods_per_day, blocked)
+    daily = daily_capacity(teachers, days, periods_per_day, blocked, compiled)
+    weekly = {teacher: min(sum(daily[teacher]), staffing.get("max_hours", {}).get(teacher, slots))
+              for teacher in teachers}
+
+    # Pigeonhole: every slot, every day and the whole week need enough teacher periods
+    if demand == slots:
+        for d, day in enumerate(days):
+            for p in range(periods_per_day):
+                if not any(free[t][d] >> p & 1 for t in teachers):
+                    raise _conflict(f"No teacher is available on {day} period {p + 1}", 1, 0,
+                                    teachers=teachers, days=[day])
+            available = sum(daily[t][d] for t in teachers)
+            if available < periods_per_day:
+                raise _conflict(f"Teachers can cover at most {available} of the {periods_per_day} periods on {day}",
+                                periods_per_day, available, teachers=teachers, days=[day])
+    if sum(weekly.values()) < demand:
+        raise _conflict(f"Teachers can cover at most {sum(weekly.values())} of the {demand} periods in the week",
+                        demand, sum(weekly.values()), teachers=teachers)
+
+    # Hall's condition: every group of subjects needs enough hours from the teachers qualified for it
+    qualifications = staffing.get("qualifications", {})
+    qualified = {s: [t for t in teachers if t not in qualifications or s in qualifications[t]] for s in subjects}
+    violator = _hall_violator(hours, qualified, weekly)
+    if violator is not None:
+        group = sorted({t for s in violator for t in qualified[s]})
+        required, available = sum(hours[s] for s in violator), sum(weekly[t] for t in group)
+        if group:
+            message = f"{', '.join(sorted(violator))} need {required} periods but {', '.join(group)} can cover at most {available}"
+        else:
+            message = f"No teacher is qualified to teach {', '.join(sorted(violator))}"
+        raise _conflict(message, required, available, subjects=violator, teachers=group)
+
+    # Rooms: a subject needing a room type needs at least one room of that type large enough
+    class_size = int(facilities.get("class_size") or 0)
+    for subject, room_type in (facilities.get("subject_rooms") or {}).items():
+        if subject not in subjects or not hours.get(subject):
+            continue
+        rooms = [r for r in facilities.get("rooms", []) if r["type"] == room_type]
+        if not any(r.get("capacity") is None or r["capacity"] >= class_size for r in rooms):
+            raise _conflict(f"No {room_type} holds a class of {class_size} for {subject}", class_size,
+                            max((r["capacity"] for r in rooms), default=0), subjects=[subject], rooms=[room_type])
+
+def check_school_feasibility(sections: List[Tuple[str, List[str], List[str]]], periods_per_day: int,
+                             unavailable: Optional[Dict[str, List[Any]]] = None,
+                             facilities: Optional[Dict[str, Any]] = None,
+                             constraints: Optional[Dict[str, Any]] = None, **_: Any) -> None:
+    """
+    Reject a school request that no timetable can satisfy: every section on
+    its own, then Hall's condition for sections sharing teachers, who can
+    be in only one section per period.
+
+    Raises:
+        InfeasibleScheduleError: With ``conflict`` holding the smallest conflicting set.
+    """
+    facilities = facilities or {}
+    sizes = facilities.get("section_sizes") or {}
+    for name, subjects, teachers in sections:
+        try:
+            check_feasibility(subjects, teachers, periods_per_day, unavailable=unavailable, constraints=constraints,
+                              facilities=dict(facilities, class_size=sizes.get(name, facilities.get("class_size"))))
+        except InfeasibleScheduleError as e:
+            e.conflict["sections"] = [name]
+            raise InfeasibleScheduleError(f"{name}: {e.message}", conflict=e.conflict)
+
+    days = list(DEFAULT_DAYS)
+    slots = len(days) * periods_per_day
+    all_teachers = sorted({t for _, _, teachers in sections for t in teachers})
+    blocked = compile_constraints(constraints).blocked_slots(all_teachers, days, periods_per_day)
+    blocked |= blocked_slots(unavailable or {}, periods_per_day)
+    capacity = {t: sum(bin(mask).count("1") for mask in masks)
+                for t, masks in _free_masks(all_teachers, days, periods_per_day, blocked).items()}
+    violator = _hall_violator({name: slots for name, _, _ in sections},
+                              {name: teachers for name, _, teachers in sections}, capacity)
+    if violator is not None:
+        group = sorted({t for name, _, teachers in sections if name in violator for t in teachers})
+        required, available = slots * len(violator), sum(capacity[t] for t in group)
+        raise _conflict(f"Sections {', '.join(sorted(violator))} need {required} periods but their shared teachers "
+                        f"({', '.join(group)}) can cover at most {available}",
+                        required, available, sections=violator, teachers=group)
@@ -1,31 +1,272 @@
 """
 Genetic Algorithm Optimization Strategy.
+
+Individuals are permutations of the slot pool, stored together as one
+``(population, slots)`` integer matrix so that selection, crossover, mutation
+and fitness all run as batched NumPy operations over the whole population.
 """
-import random
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional, Callable, Sequence, Union
+
+import numpy as np
+
+from config import DEFAULT_MAX_CONSECUTIVE, DEFAULT_MAX_DAILY
+from models import TimetableGrid
+
+# Hard rule violations dominate the soft adjacent-duplicate penalty
+VIOLATION_WEIGHT = 10
+DUPLICATE_WEIGHT = 1
 
 class GeneticOptimizer:
-    def __init__(self, population_size=50, generations=100):
+    def __init__(self, population_size=50, generations=100, mutation_rate=0.3,
+                 tournament_size=3, elite_size=2, max_consecutive=DEFAULT_MAX_CONSECUTIVE,
+                 max_daily=DEFAULT_MAX_DAILY, time_budget: Optional[float] = None,
+                 seed: Optional[int] = None, teacher_limits: Optional[Dict[str, Dict[str, int]]] = None,
+                 stop_at: Optional[int] = None):
         """
         Initialize the genetic optimizer.
         Args:
             population_size: Size of population.
             generations: Number of generations to evolve.
+            mutation_rate: Probability that a child receives a swap mutation.
+            tournament_size: Number of individuals competing per selection.
+            elite_size: Best individuals copied unchanged into the next generation.
+            max_consecutive: Limit used for the consecutive-periods rule.
+            max_daily: Limit used for the teacher daily rule.
+            time_budget: Optional wall-clock limit in seconds.
+            seed: Seed for reproducible runs.
+            teacher_limits: Optional teacher -> {"max_daily", "max_consecutive"} overrides.
+            stop_at: Generation at which to stop as if out of time, for replaying a
+                recorded run that was; use with no time budget.
         """
-        self.population_size = population_size
+        self.population_size = max(2, population_size)
         self.generations = generations
+        self.mutation_rate = mutation_rate
+        self.tournament_size = max(1, tournament_size)
+        self.elite_size = min(elite_size, self.population_size - 1)
+        self.max_consecutive = max_consecutive
+        self.max_daily = max_daily
+        self.time_budget = time_budget
+        self.teacher_limits = teacher_limits or {}
+        self.rng = np.random.default_rng(seed)
+        self.stop_at = stop_at
+        self.stats: Dict[str, Any] = {}
 
-    def optimize(self, initial_pool: List[str]) -> List[str]:
+    def optimize(self, initial_pool: List[str], subject_teacher_map: Dict[str, str],
+                 periods_per_day: int, progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 n_days: Optional[int] = None) -> List[str]:
         """
-        Placeholder for genetic optimization logic.
-        Refines the order of subjects in the pool to minimize soft constraint violations.
+        Refine the order of subjects in the pool to minimize constraint violations.
+
+        Args:
+            initial_pool: Flat list of subjects, one per slot, in day-major order.
+            subject_teacher_map: Subject to teacher assignment.
+            periods_per_day: Number of periods in a day.
+            progress: Optional callback receiving the best penalty after each generation.
+            n_days: Days the pool is spread over, as `TimetableGrid.from_lessons` lays it
+                out; None scores it packed into full days from the first.
+
+        Returns:
+            The best ordering of the pool found.
         """
-        # For this version, we simple shuffle as a baseline 'mutation'
-        # Real GA would involve: fitness function, crossover, selection
-        best_pool = initial_pool[:]
-        random.shuffle(best_pool)
-        return best_pool
-
-def calculate_fitness(schedule: Dict[str, Any]) -> float:
-    """Mock fitness calculation."""
-    return random.uniform(0.8, 1.0)
+        n_slots = len(initial_pool)
+        if n_slots < 2 or periods_per_day < 1:
+            return initial_pool[:]
+
+        start_time = time.time()
+        day_lengths = None if n_days is None else TimetableGrid.day_lengths(n_slots, n_days, periods_per_day)
+        subjects = sorted(set(initial_pool))
+        subject_index = {s: i for i, s in enumerate(subjects)}
+        teachers = sorted(set(subject_teacher_map[s] for s in subjects))
+        teacher_index = {t: i for i, t in enumerate(teachers)}
+
+        # Genes are positions in the sorted pool, so every individual is a
+        # plain permutation and crossover never has to reconcile duplicates.
+        genes = np.array(sorted(subject_index[s] for s in initial_pool), dtype=np.int16)
+        subject_teacher = np.array([teacher_index[subject_teacher_map[s]] for s in subjects], dtype=np.int16)
+        n_teachers = len(teachers)
+        # Per-teacher limits broadcast against the teacher axis of the fitness arrays
+        max_consecutive = np.array([self.teacher_limits.get(t, {}).get("max_consecutive", self.max_consecutive)
+                                    for t in teachers], dtype=np.int32)
+        max_daily = np.array([self.teacher_limits.get(t, {}).get("max_daily", self.max_daily) for t in teachers],
+                             dtype=np.int32)
+
+        # Seed with the incoming order so the result is never worse than it
+        seed_perm = np.argsort(np.array([subject_index[s] for s in initial_pool]), kind="stable")
+        seed_genes = np.empty(n_slots, dtype=np.int32)
+        seed_genes[seed_perm] = np.arange(n_slots)
+        population = np.array(
+            [self.rng.permutation(n_slots) for _ in range(self.population_size - 1)] + [seed_genes],
+            dtype=np.int32
+        )
+
+        fitness = population_fitness(genes[population], subject_teacher, n_teachers, periods_per_day,
+                                     max_consecutive, max_daily, day_lengths)
+        best_idx = int(np.argmin(fitness))
+        best, best_fitness = population[best_idx].copy(), fitness[best_idx]
+
+        generation, timed_out = 0, False
+        for generation in range(self.generations):
+            if progress is not None:
+                progress({"stage": "genetic", "iteration": generation, "best_cost": int(best_fitness)})
+            if best_fitness == 0:
+                break
+            if self._out_of_time(start_time, generation):
+                timed_out = True
+                break
+
+            order = np.argsort(fitness, kind="stable")
+            elites = population[order[:self.elite_size]]
+            n_children = self.population_size - self.elite_size
+
+            parents_a = population[self._tournament(fitness, n_children)]
+            parents_b = population[self._tournament(fitness, n_children)]
+            children = self._order_crossover(parents_a, parents_b)
+            self._swap_mutation(children)
+
+            population = np.concatenate([elites, children])
+            fitness = population_fitness(genes[population], subject_teacher, n_teachers, periods_per_day,
+                                         max_consecutive, max_daily, day_lengths)
+            gen_best = int(np.argmin(fitness))
+            if fitness[gen_best] < best_fitness:
+                best, best_fitness = population[gen_best].copy(), fitness[gen_best]
+
+        self.stats = {"generations": generation, "timed_out": timed_out, "best_cost": int(best_fitness)}
+        return [subjects[i] for i in genes[best]]
+
+    def _out_of_time(self, start_time: float, generation: int) -> bool:
+        if self.stop_at is not None:
+            return generation >= self.stop_at
+        return self.time_budget is not None and time.time() - start_time > self.time_budget
+
+    def _tournament(self, fitness: np.ndarray, count: int) -> np.ndarray:
+        """Pick `count` parent indices by tournament selection."""
+        contestants = self.rng.integers(0, len(fitness), size=(count, self.tournament_size))
+        winners = np.argmin(fitness[contestants], axis=1)
+        return contestants[np.arange(count), winners]
+
+    def _order_crossover(self, parents_a: np.ndarray, parents_b: np.ndarray) -> np.ndarray:
+        """
+        Order crossover (OX) for the whole batch.
+        Each child keeps a random segment of parent A in place and fills the
+        remaining positions with the other genes in the order they appear in parent B.
+        """
+        count, n = parents_a.shape
+        rows = np.arange(count)[:, None]
+        bounds = np.sort(self.rng.integers(0, n + 1, size=(count, 2)), axis=1)
+        positions = np.arange(n)[None, :]
+        segment = (positions >= bounds[:, :1]) & (positions < bounds[:, 1:])
+
+        in_segment = np.zeros((count, n), dtype=bool)
+        in_segment[np.nonzero(segment)[0], parents_a[segment]] = True
+        kept = ~in_segment[rows, parents_b]
+
+        # Stable sorts put the free positions and parent B's remaining genes
+        # first, in order; the segment part is then overwritten from parent A.
+        free_positions = np.argsort(segment, axis=1, kind="stable")
+        fill_genes = parents_b[rows, np.argsort(~kept, axis=1, kind="stable")]
+
+        children = np.empty_like(parents_a)
+        children[rows, free_positions] = fill_genes
+        children[segment] = parents_a[segment]
+        return children
+
+    def _swap_mutation(self, children: np.ndarray) -> None:
+        """Swap two random genes in a fraction of the children, in place."""
+        count, n = children.shape
+        mutants = np.nonzero(self.rng.random(count) < self.mutation_rate)[0]
+        if len(mutants) == 0:
+            return
+        i = self.rng.integers(0, n, size=len(mutants))
+        j = self.rng.integers(0, n, size=len(mutants))
+        children[mutants, i], children[mutants, j] = children[mutants, j], children[mutants, i]
+
+def population_fitness(subject_matrix: np.ndarray, subject_teacher: np.ndarray, n_teachers: int,
+                       periods_per_day: int, max_consecutive: Union[int, np.ndarray] = DEFAULT_MAX_CONSECUTIVE,
+                       max_daily: Union[int, np.ndarray] = DEFAULT_MAX_DAILY,
+                       day_lengths: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Score every individual in one batched pass (lower is better).
+
+    Mirrors `MaxConsecutivePeriods` and `TeacherDailyLimit` exactly and adds
+    a smaller penalty for the same subject in adjacent periods.
+
+    Args:
+        subject_matrix: ``(population, slots)`` subject indices in day-major order.
+        subject_teacher: Teacher index for every subject index.
+        n_teachers: Number of distinct teachers.
+        periods_per_day: Number of periods in a day.
+        max_consecutive: Consecutive-periods limit, or one per teacher index.
+        max_daily: Daily limit, or one per teacher index.
+        day_lengths: Slots taken from the front of each day, in order; by default
+            the slots fill whole days from the first.
+
+    Returns:
+        Array of penalties, one per individual.
+    """
+    pop, n_slots = subject_matrix.shape
+    if day_lengths is not None:
+        subjects = np.full((pop, len(day_lengths), periods_per_day), -1, dtype=np.int32)
+        positions = np.concatenate([d * periods_per_day + np.arange(length) for d, length in enumerate(day_lengths)])
+        subjects.reshape(pop, -1)[:, positions] = subject_matrix[:, :len(positions)]
+    else:
+        full_days = n_slots // periods_per_day
+        cells = full_days * periods_per_day
+        subjects = np.full((pop, full_days + 1, periods_per_day), -1, dtype=np.int32)
+        subjects.reshape(pop, -1)[:, :n_slots] = subject_matrix
+        if cells == n_slots:
+            subjects = subjects[:, :full_days]
+    teachers = np.where(subjects >= 0, subject_teacher[np.maximum(subjects, 0)], -1)
+
+    # Adjacent duplicates within a day
+    duplicates = ((subjects[:, :, 1:] == subjects[:, :, :-1]) & (subjects[:, :, 1:] >= 0)).sum(axis=(1, 2))
+
+    # Daily limit: one violation per (day, teacher) over the limit
+    daily = np.zeros((pop, teachers.shape[1], n_teachers + 1), dtype=np.int32)
+    pop_idx, day_idx, _ = np.indices(teachers.shape)
+    np.add.at(daily, (pop_idx, day_idx, teachers + 1), 1)
+    daily_violations = (daily[:, :, 1:] > max_daily).sum(axis=(1, 2))
+
+    # Consecutive runs, with the counter reset after each reported violation
+    run_limit = np.broadcast_to(np.asarray(max_consecutive, dtype=np.int32), (n_teachers,))
+    run = np.zeros(teachers.shape[:2], dtype=np.int32)
+    consecutive_violations = np.zeros(pop, dtype=np.int32)
+    for p in range(periods_per_day):
+        current = teachers[:, :, p]
+        if p == 0:
+            run = np.where(current >= 0, 1, 0)
+        else:
+            run = np.where(current < 0, 0, np.where(current == teachers[:, :, p - 1], run + 1, 1))
+        over = run > run_limit[np.maximum(current, 0)]
+        consecutive_violations += over.sum(axis=1)
+        run = np.where(over, 0, run)
+
+    return (daily_violations + consecutive_violations) * VIOLATION_WEIGHT + duplicates * DUPLICATE_WEIGHT
+
+def calculate_fitness(schedule: Dict[str, Any], max_consecutive: int = DEFAULT_MAX_CONSECUTIVE,
+                      max_daily: int = DEFAULT_MAX_DAILY) -> float:
+    """
+    Fitness of a serialized timetable ``{day: [{"subject", "teacher", ...}]}``.
+    Returns a value in (0, 1], where 1.0 means no penalties at all.
+    """
+    days = list(schedule.values())
+    periods = max((len(sessions) for sessions in days), default=0)
+    if periods == 0:
+        return 1.0
+
+    subjects = sorted({s["subject"] for sessions in days for s in sessions})
+    teachers = sorted({s["teacher"] for sessions in days for s in sessions})
+    subject_index = {s: i for i, s in enumerate(subjects)}
+    teacher_index = {t: i for i, t in enumerate(teachers)}
+    subject_teacher = np.zeros(len(subjects), dtype=np.int32)
+
+    matrix = np.full((1, len(days) * periods), -1, dtype=np.int32)
+    for d, sessions in enumerate(days):
+        for p, session in enumerate(sessions):
+            idx = subject_index[session["subject"]]
+            subject_teacher[idx] = teacher_index[session["teacher"]]
+            matrix[0, d * periods + p] = idx
+
+    penalty = population_fitness(matrix, subject_teacher, len(teachers), periods,
+                                 max_consecutive, max_daily)[0]
+    return 1.0 / (1.0 + float(penalty))
@@ -0,0 +1,194 @@
+"""
+Background generation jobs.
+
+Jobs run on a small thread pool so long generations do not hold a web
+worker. Each job keeps its latest progress snapshot and a version counter;
+pollers read the snapshot and event streams wait on a condition for the
+version to change. Jobs live in process memory, so a job can only be read
+through the worker process that accepted it.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from config import JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_RETENTION_SECONDS
+from exceptions import TimetableError, GenerationCancelledError
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+class Job:
+    """State of one submitted generation."""
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = QUEUED
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self.cancel_requested = False
+        self.version = 0
+        self.future = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def snapshot(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": dict(self.progress),
+            "cancel_requested": self.cancel_requested,
+        }
+        if self.error is not None:
+            data["error"] = self.error
+        if include_result and self.result is not None:
+            data["result"] = self.result
+        return data
+
+class JobManager:
+    """Bounded pool of generation jobs with progress, polling and cancellation."""
+    def __init__(self, workers: int = JOB_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT,
+                 retention: float = JOB_RETENTION_SECONDS):
+        self.queue_limit = queue_limit
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._changed = threading.Condition()
+
+    def submit(self, task: Callable[[Callable[[Dict[str, Any]], None]], Dict[str, Any]]) -> Job:
+        """
+        Queue `task(progress)` and return its job at once.
+
+        Raises:
+            TimetableError: 503 when the queue is already full.
+        """
+        with self._changed:
+            self._purge()
+            active = sum(1 for job in self._jobs.values() if not job.done)
+            if active >= self.queue_limit:
+                raise TimetableError("Job queue is full, try again later",
+                                     status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._run, job, task)
+        logger.info(f"Queued job {job.id} ({active + 1} active)")
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._changed:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise TimetableError(f"Job '{job_id}' not found", status_code=HTTPStatus.NOT_FOUND)
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a queued job outright, or ask a running one to stop at its next progress report."""
+        job = self.get(job_id)
+        with self._changed:
+            if job.done:
+                return job
+            job.cancel_requested = True
+            if job.status == QUEUED and job.future.cancel():
+                self._finish(job, CANCELLED)
+        return job
+
+    def events(self, job_id: str, keepalive: float) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Yield a snapshot on every change until the job finishes, and None
+        whenever `keepalive` seconds pass without one.
+        """
+        job = self.get(job_id)
+        seen = -1
+        while True:
+            with self._changed:
+                if job.version == seen:
+                    self._changed.wait_for(lambda: job.version != seen, timeout=keepalive)
+                if job.version == seen:
+                    snapshot = None
+                else:
+                    seen = job.version
+                    snapshot = job.snapshot()
+            yield snapshot
+            if snapshot is not None and snapshot["status"] in FINISHED_STATES:
+                return
+
+    def stats(self) -> Dict[str, int]:
+        with self._changed:
+            counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED_STATES}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def _run(self, job: Job, task: Callable[[Callable[[Dict[str, Any]], None]], Dict[str, Any]]) -> None:
+        with self._changed:
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+                return
+            job.status = RUNNING
+            job.started = time.time()
+            self._touch(job)
+
+        def progress(update: Dict[str, Any]) -> None:
+            with self._changed:
+                if job.cancel_requested:
+                    raise GenerationCancelledError()
+                job.progress.update(update)
+                self._touch(job)
+
+        try:
+            result = task(progress)
+        except GenerationCancelledError:
+            with self._changed:
+                self._finish(job, CANCELLED)
+            logger.info(f"Job {job.id} cancelled")
+        except TimetableError as e:
+            with self._changed:
+                job.error, job.status_code = e.message, int(e.status_code)
+                self._finish(job, FAILED)
+        except Exception as e:
+            logger.exception(f"Job {job.id} crashed")
+            with self._changed:
+                job.error, job.status_code = f"Generation failed: {e}", int(HTTPStatus.INTERNAL_SERVER_ERROR)
+                self._finish(job, FAILED)
+        else:
+            with self._changed:
+                job.result = result
+                self._finish(job, SUCCEEDED)
+            logger.info(f"Job {job.id} finished in {job.finished - job.started:.4f}s")
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished = time.time()
+        self._touch(job)
+        metrics.inc("timetable_jobs_total", status=status)
+
+    def _touch(self, job: Job) -> None:
+        job.version += 1
+        self._changed.notify_all()
+
+    def _purge(self) -> None:
+        """Forget finished jobs past the retention window."""
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.done and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+job_manager = JobManager()
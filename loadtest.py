@@ -0,0 +1,397 @@
+"""
+End-to-end load testing.
+
+Drives the whole request path (validation, scheduler, SQLite history and
+store, JSON) with concurrent clients and reports throughput, latency
+percentiles, error, shed and timeout rates and SQLite write-lock
+contention. Everything runs locally: in process through the Flask test
+client (the default), against a gunicorn started for the run, or against
+a server you started yourself:
+
+    python loadtest.py --concurrency 8 --duration 30
+    python loadtest.py --gunicorn 4 --concurrency 32 --mix generate=6,validate=3,export=1
+    python loadtest.py --url http://127.0.0.1:8000 --requests 500 --database scheduler.db
+
+In process the app uses DATABASE_PATH as it would when serving, so point it
+at a scratch file to keep the run out of a real database; a gunicorn run
+gets a fresh temporary database unless --database is given.
+
+Inputs are the benchmark workloads (small, medium, limits), picked by
+--sizes weights, each with --distinct variants so some requests hit the
+result cache and others generate. The exit status is 1 when the error or
+timeout rate passes --max-error-rate.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from benchmark import class_workloads, percentile
+
+ENDPOINTS = ("generate", "validate", "export")
+EXPORT_FORMATS = ("csv", "ndjson", "ical")
+
+# /metrics series whose change over the run is reported
+METRIC_PREFIXES = ("timetable_db_writes_total", "timetable_db_write_duration_seconds_sum",
+                   "timetable_db_write_duration_seconds_count", "timetable_cache_requests_total",
+                   "timetable_admission_total")
+
+# A lock probe waiting longer than this counts as contended
+CONTENDED_SECONDS = 0.001
+
+Transport = Callable[[str, str, Optional[Dict[str, Any]]], Tuple[int, bytes]]
+
+def parse_weights(text: str, choices: Tuple[str, ...]) -> Dict[str, float]:
+    """Parse "a=3,b=1" into weights, rejecting names outside `choices`."""
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in choices:
+            raise ValueError(f"Unknown name '{name}'; choose from {', '.join(choices)}")
+        weights[name] = float(weight or 1)
+    if not any(w > 0 for w in weights.values()):
+        raise ValueError("At least one weight must be positive")
+    return weights
+
+def request_bodies(seed: int, distinct: int) -> Dict[str, List[Dict[str, Any]]]:
+    """/generate bodies per workload size; variants differ by seed, so each has its own cache entry."""
+    bodies = {}
+    for name, workload in class_workloads(seed).items():
+        bodies[name] = [{
+            "subjects": ",".join(workload["subjects"]),
+            "teachers": ",".join(workload["teachers"]),
+            "periods_per_day": workload["periods"],
+            "unavailable": workload["unavailable"],
+            "seed": seed + i,
+        } for i in range(distinct)]
+    return bodies
+
+def client_transport() -> Transport:
+    """In-process transport: one Flask test client per thread."""
+    # Imported here so HTTP runs never load the app into this process
+    from app import app
+
+    local = threading.local()
+
+    def send(method: str, path: str, body: Optional[Dict[str, Any]]) -> Tuple[int, bytes]:
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        response = local.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+    return send
+
+def http_transport(base_url: str, timeout: float) -> Transport:
+    """Plain HTTP transport; socket timeouts raise `TimeoutError`."""
+    def send(method: str, path: str, body: Optional[Dict[str, Any]]) -> Tuple[int, bytes]:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(base_url.rstrip("/") + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, socket.timeout):
+                raise TimeoutError(str(e.reason))
+            raise
+    return send
+
+def start_gunicorn(workers: int, database: str, workdir: str) -> Tuple[subprocess.Popen, str]:
+    """Start gunicorn on a free local port, logging to `workdir`, and wait until /health answers."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    metrics_dir = os.path.join(workdir, "metrics")
+    os.makedirs(metrics_dir, exist_ok=True)
+    env = dict(os.environ, DATABASE_PATH=database, METRICS_DIR=metrics_dir)
+    with open(os.path.join(workdir, "gunicorn.log"), "ab") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "app:app"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}; see {workdir}/gunicorn.log")
+        try:
+            urllib.request.urlopen(base_url + "/health", timeout=1).close()
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not come up within 30s")
+
+class LockProbe:
+    """
+    Samples SQLite write-lock contention: every `interval` it times how long
+    BEGIN IMMEDIATE waits for the write lock, i.e. what any writer would wait.
+    """
+    def __init__(self, path: str, interval: float = 0.01):
+        self.path = path
+        self.interval = interval
+        self.waits: List[float] = []
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="lock-probe", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        self._thread.join()
+        contended = [w for w in self.waits if w > CONTENDED_SECONDS]
+        stats: Dict[str, Any] = {"probes": len(self.waits), "failures": self.failures,
+                                 "contended": len(contended),
+                                 "contended_rate": round(len(contended) / len(self.waits), 4) if self.waits else 0.0}
+        if self.waits:
+            stats.update(wait_p50=percentile(self.waits, 50), wait_p99=percentile(self.waits, 99),
+                         wait_max=max(self.waits))
+        return stats
+
+    def _loop(self) -> None:
+        db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        try:
+            while not self._stop.wait(self.interval):
+                start = time.perf_counter()
+                try:
+                    db.execute("BEGIN IMMEDIATE")
+                    self.waits.append(time.perf_counter() - start)
+                    db.execute("ROLLBACK")
+                except sqlite3.OperationalError:
+                    self.failures += 1
+        finally:
+            db.close()
+
+def scrape_metrics(send: Transport) -> Dict[str, float]:
+    """The /metrics series in METRIC_PREFIXES, by series name with labels."""
+    try:
+        status, body = send("GET", "/metrics", None)
+    except (OSError, TimeoutError):
+        return {}
+    if status != 200:
+        return {}
+    values = {}
+    for line in body.decode("utf-8").splitlines():
+        if line.startswith(METRIC_PREFIXES):
+            series, _, value = line.rpartition(" ")
+            values[series] = float(value)
+    return values
+
+class Recorder:
+    """Thread-safe log of (endpoint, outcome, seconds) per request."""
+    def __init__(self):
+        self.samples: List[Tuple[str, str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, outcome: str, seconds: float) -> None:
+        with self._lock:
+            self.samples.append((endpoint, outcome, seconds))
+
+def _outcome(status: int) -> str:
+    if status == 429:
+        return "shed"
+    if status >= 500:
+        return "error"
+    return "rejected" if status >= 400 else "ok"
+
+def run_load(send: Transport, concurrency: int, mix: Dict[str, float], sizes: Dict[str, float],
+             bodies: Dict[str, List[Dict[str, Any]]], duration: float, total: Optional[int],
+             timeout: float, seed: int) -> Tuple[Recorder, float]:
+    """
+    Run `concurrency` client threads until `duration` passes or `total` requests are sent.
+
+    Returns:
+        The recorder and the wall-clock seconds the run took.
+    """
+    recorder = Recorder()
+    timetables: Deque[Dict[str, Any]] = deque(maxlen=32)
+    sent = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < deadline:
+            with lock:
+                if total is not None and sent[0] >= total:
+                    return
+                sent[0] += 1
+            endpoint = rng.choices(list(mix), weights=list(mix.values()))[0]
+            body = rng.choice(bodies[rng.choices(list(sizes), weights=list(sizes.values()))[0]])
+            if endpoint == "export" and not timetables:
+                endpoint = "generate"
+            if endpoint == "export":
+                method, path = "POST", f"/export?format={rng.choice(EXPORT_FORMATS)}"
+                body = {"timetable": rng.choice(list(timetables))}
+            else:
+                method, path = "POST", f"/{endpoint}"
+
+            start = time.perf_counter()
+            try:
+                status, payload = send(method, path, body)
+                outcome = _outcome(status)
+            except TimeoutError:
+                status, outcome = 0, "timeout"
+            except Exception as e:
+                logging.debug(f"{endpoint} failed: {e}")
+                status, outcome = 0, "error"
+            seconds = time.perf_counter() - start
+            # The test client cannot be interrupted, so slow requests count as timeouts afterwards
+            if outcome == "ok" and seconds > timeout:
+                outcome = "timeout"
+            recorder.add(endpoint, outcome, seconds)
+            if endpoint == "generate" and status == 200:
+                timetables.append(json.loads(payload)["timetable"])
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - start
+
+def summarize(samples: List[Tuple[str, str, float]], elapsed: float) -> Dict[str, Any]:
+    """Throughput, outcome rates and latency percentiles for a set of samples."""
+    outcomes: Dict[str, int] = {}
+    for _, outcome, _ in samples:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    stats: Dict[str, Any] = {
+        "requests": len(samples),
+        "throughput": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "error_rate": round(outcomes.get("error", 0) / len(samples), 4) if samples else 0.0,
+        "timeout_rate": round(outcomes.get("timeout", 0) / len(samples), 4) if samples else 0.0,
+        "shed_rate": round(outcomes.get("shed", 0) / len(samples), 4) if samples else 0.0,
+    }
+    latencies = [seconds for _, outcome, seconds in samples if outcome in ("ok", "rejected")]
+    if latencies:
+        stats.update({
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies),
+        })
+    return stats
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"{'endpoint':<12} {'reqs':>7} {'req/s':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+          f"{'err':>7} {'timeout':>8} {'shed':>7}")
+    for name, stats in list(report["endpoints"].items()) + [("all", report["overall"])]:
+        cells = [f"{stats[p] * 1000:.2f}" if p in stats else "-" for p in ("p50", "p90", "p99")]
+        print(f"{name:<12} {stats['requests']:>7} {stats['throughput']:>8.2f} {cells[0]:>9} {cells[1]:>9} "
+              f"{cells[2]:>9} {stats['error_rate']:>7.2%} {stats['timeout_rate']:>8.2%} {stats['shed_rate']:>7.2%}")
+    probe = report["sqlite"].get("lock_probe")
+    if probe and probe["probes"]:
+        print(f"sqlite write lock: {probe['contended_rate']:.2%} of {probe['probes']} probes waited "
+              f"(p99 {probe['wait_p99'] * 1000:.2f}ms, max {probe['wait_max'] * 1000:.2f}ms)")
+    for series, delta in sorted(report["sqlite"].get("metrics", {}).items()):
+        print(f"{series} +{delta:g}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the timetable API end to end")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="test a running server instead of the in-process app")
+    target.add_argument("--gunicorn", type=int, metavar="WORKERS", help="start a local gunicorn with this many workers")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--mix", default="generate=6,validate=3,export=1", help="endpoint weights")
+    parser.add_argument("--sizes", default="small=6,medium=3,limits=1", help="workload size weights")
+    parser.add_argument("--distinct", type=int, default=20, help="input variants per size; fewer means more cache hits")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a request counts as timed out")
+    parser.add_argument("--database", help="SQLite file the server uses (gunicorn default: a fresh temporary one)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--max-error-rate", type=float, default=0.01,
+                        help="exit with status 1 when errors plus timeouts pass this fraction")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_weights(args.mix, ENDPOINTS)
+        sizes = parse_weights(args.sizes, tuple(class_workloads(args.seed)))
+    except ValueError as e:
+        parser.error(str(e))
+
+    logging.disable(logging.INFO)
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    database = args.database
+    server = None
+    if args.gunicorn:
+        database = database or os.path.join(workdir, "loadtest.db")
+        server, base_url = start_gunicorn(args.gunicorn, database, workdir)
+        send = http_transport(base_url, args.timeout)
+        target_name = f"gunicorn x{args.gunicorn}"
+    elif args.url:
+        send = http_transport(args.url, args.timeout)
+        target_name = args.url
+    else:
+        from config import DATABASE_PATH
+        database = DATABASE_PATH
+        send = client_transport()
+        target_name = "test client"
+
+    try:
+        before = scrape_metrics(send)
+        probe = LockProbe(database) if database and os.path.exists(database) else None
+        if probe is not None:
+            probe.start()
+        recorder, elapsed = run_load(send, args.concurrency, mix, sizes, request_bodies(args.seed, args.distinct),
+                                     args.duration, args.requests, args.timeout, args.seed)
+        probe_stats = probe.stop() if probe is not None else None
+        # Let the history write-behind queue and the metrics files catch up before the final scrape
+        time.sleep(1.5)
+        after = scrape_metrics(send)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "target": target_name,
+            "concurrency": args.concurrency,
+            "elapsed": round(elapsed, 3),
+            "mix": mix,
+            "sizes": sizes,
+            "distinct": args.distinct,
+            "seed": args.seed,
+        },
+        "overall": summarize(recorder.samples, elapsed),
+        "endpoints": {
+            endpoint: summarize([s for s in recorder.samples if s[0] == endpoint], elapsed)
+            for endpoint in ENDPOINTS if any(s[0] == endpoint for s in recorder.samples)
+        },
+        "sqlite": {
+            "lock_probe": probe_stats,
+            "metrics": {series: after[series] - before.get(series, 0) for series in after
+                        if after[series] != before.get(series, 0)},
+        },
+    }
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    overall = report["overall"]
+    return 1 if overall["error_rate"] + overall["timeout_rate"] > args.max_error_rate else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Local Search Optimization Stage.
+
+Simulated annealing and tabu search over cross-day swap moves, scored
+incrementally through the constraint evaluators. A swap with a free period
+moves the lesson there.
+"""
+import math
+import random
+import time
+import logging
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+from constraints import Constraint, ConstraintEvaluator, CombinedEvaluator
+from models import ClassSession, TimetableGrid
+
+logger = logging.getLogger(__name__)
+
+# Objective weights: rule violations dominate the soft terms
+HARD_WEIGHT = 100
+DUPLICATE_WEIGHT = 3
+BALANCE_WEIGHT = 1
+
+PROGRESS_EVERY = 256
+
+class AdjacentDuplicateEvaluator(ConstraintEvaluator):
+    """Soft term: the same subject in back-to-back periods of a day."""
+    def _pairs(self, d: int, i: int) -> int:
+        row = self.subjects[d]
+        subject = row[i]
+        if subject is None:
+            return 0
+        return int(i > 0 and row[i - 1] == subject) + int(i + 1 < len(row) and row[i + 1] == subject)
+
+    def _remove(self, d: int, i: int) -> int:
+        return -self._pairs(d, i)
+
+    def _add(self, d: int, i: int) -> int:
+        return self._pairs(d, i)
+
+    def _reset(self) -> None:
+        self.penalty = sum(
+            1 for row in self.subjects for a, b in zip(row, row[1:]) if a is not None and a == b
+        )
+
+class DailyBalanceEvaluator(ConstraintEvaluator):
+    """Soft term: sum of squared per-day teacher loads, lowest when each teacher's week is spread evenly."""
+    def __init__(self, schedule: Dict[str, List[ClassSession]], meta: Dict[str, Any]):
+        self.counts: List[Dict[str, int]] = [{} for _ in schedule]
+        super().__init__(schedule, meta)
+
+    def _remove(self, d: int, i: int) -> int:
+        teacher = self.teachers[d][i]
+        if teacher is None:
+            return 0
+        count = self.counts[d][teacher]
+        self.counts[d][teacher] = count - 1
+        return -(2 * count - 1)
+
+    def _add(self, d: int, i: int) -> int:
+        teacher = self.teachers[d][i]
+        if teacher is None:
+            return 0
+        count = self.counts[d].get(teacher, 0) + 1
+        self.counts[d][teacher] = count
+        return 2 * count - 1
+
+    def lower_bound(self) -> int:
+        """
+        Smallest penalty the grid can reach: every teacher's periods spread
+        as evenly as they divide over the days that have periods, with no day
+        taking more than it has. Swaps keep weekly loads and the grid's shape,
+        so the bound holds for the whole search.
+        """
+        loads: Dict[str, int] = {}
+        for row in self.teachers:
+            for teacher in row:
+                if teacher is not None:
+                    loads[teacher] = loads.get(teacher, 0) + 1
+        lengths = sorted(len(row) for row in self.teachers if row)
+        bound = 0
+        for load in loads.values():
+            # Fill the shortest days while they are below an even share, then spread the rest
+            days = len(lengths)
+            for length in lengths:
+                if length > load // days:
+                    break
+                bound += length ** 2
+                load -= length
+                days -= 1
+            if days:
+                share, extra = divmod(load, days)
+                bound += extra * (share + 1) ** 2 + (days - extra) * share ** 2
+        return bound
+
+class LocalSearchOptimizer:
+    """
+    Improves a complete timetable by swapping sessions, possibly across days.
+    Runs until the iteration or time budget is spent and always returns the
+    best timetable seen, so running out of time never loses work.
+    """
+    def __init__(self, method: str = "annealing", iterations: int = 6000,
+                 time_budget: Optional[float] = 0.25, seed: Optional[int] = None,
+                 start_temperature: float = 10.0, end_temperature: float = 0.1,
+                 tabu_tenure: int = 15, tabu_samples: int = 24, patience: int = 3000,
+                 stop_at: Optional[int] = None):
+        """
+        Args:
+            method: "annealing" or "tabu".
+            iterations: Maximum number of moves to evaluate.
+            time_budget: Wall-clock limit in seconds (None for no limit).
+            seed: Seed for reproducible runs.
+            start_temperature: Initial annealing temperature.
+            end_temperature: Final annealing temperature.
+            tabu_tenure: Iterations a swapped slot stays tabu.
+            tabu_samples: Candidate swaps sampled per tabu iteration.
+            patience: Stop after this many iterations without a new best.
+            stop_at: Iteration at which to stop as if out of time, for replaying a
+                recorded run that was; use with no time budget.
+        """
+        if method not in ("annealing", "tabu"):
+            raise ValueError(f"Unknown local search method '{method}'")
+        self.method = method
+        self.iterations = iterations
+        self.time_budget = time_budget
+        self.random = random.Random(seed)
+        self.start_temperature = start_temperature
+        self.end_temperature = end_temperature
+        self.tabu_tenure = tabu_tenure
+        self.tabu_samples = tabu_samples
+        self.patience = patience
+        self.stop_at = stop_at
+        self.stats: Dict[str, Any] = {}
+
+    def optimize(self, timetable: TimetableGrid, rules: List[Constraint],
+                 meta: Dict[str, Any], progress: Optional[Callable[[Dict[str, Any]], None]] = None
+                 ) -> TimetableGrid:
+        """
+        Args:
+            timetable: Schedule to improve; it is not modified.
+            rules: Constraint rules; hard ones are weighted well above the soft terms,
+                soft ones by their own `weight`.
+            meta: Rule metadata (teachers, unavailable, ...).
+            progress: Optional callback receiving the best cost every `PROGRESS_EVERY` iterations.
+
+        Returns:
+            A new grid holding the best schedule found.
+        """
+        sessions = timetable.sessions()
+        # Full-width rows, so the free periods at the end of a day can be searched as well
+        meta = dict(meta, periods_per_day=timetable.periods_per_day)
+        evaluators = [rule.evaluator(sessions, meta) for rule in rules]
+        weights = [HARD_WEIGHT if rule.hard else rule.weight for rule in rules]
+        balance = DailyBalanceEvaluator(sessions, meta)
+        evaluators += [AdjacentDuplicateEvaluator(sessions, meta), balance]
+        weights += [DUPLICATE_WEIGHT, BALANCE_WEIGHT]
+        evaluator = CombinedEvaluator(evaluators, weights)
+        grid = evaluators[0]
+        # Every term but the balance can reach 0, so no violations and even loads is the best possible cost
+        target = BALANCE_WEIGHT * balance.lower_bound()
+
+        # Free periods are slots too: swapping a lesson into one moves it, so a day can grow or shrink
+        slots = [(d, i) for d, row in enumerate(grid.subjects) for i in range(len(row))]
+        if len(slots) < 2 or all(subject is None for row in grid.subjects for subject in row):
+            return timetable
+
+        self.progress = progress
+        start_time = time.time()
+        if self.method == "annealing":
+            best_rows, best_cost, iterations, timed_out = self._anneal(evaluator, grid, slots, start_time, target)
+        else:
+            best_rows, best_cost, iterations, timed_out = self._tabu(evaluator, grid, slots, start_time, target)
+
+        self.stats = {
+            "method": self.method,
+            "iterations": iterations,
+            "best_cost": best_cost,
+            "timed_out": timed_out,
+            "duration": time.time() - start_time,
+        }
+        logger.info(f"Local search ({self.method}) finished after {iterations} iterations, cost {best_cost}")
+
+        best = timetable.copy()
+        for d, row in enumerate(best_rows[0]):
+            for i, subject in enumerate(row):
+                best.set(d, i, subject)
+        return best
+
+    def _out_of_time(self, start_time: float, iteration: int, every: int = 128) -> bool:
+        if self.stop_at is not None:
+            return iteration >= self.stop_at
+        # Reading the clock every move would cost more than the move itself
+        return (self.time_budget is not None and iteration % every == 0
+                and time.time() - start_time > self.time_budget)
+
+    def _stalled(self, iteration: int, best_iteration: int) -> bool:
+        return iteration - best_iteration > self.patience
+
+    def _report(self, iteration: int, best_cost: int) -> None:
+        if self.progress is not None and iteration % PROGRESS_EVERY == 0:
+            self.progress({"stage": self.method, "iteration": iteration, "best_cost": best_cost})
+
+    def _random_swap(self, grid: ConstraintEvaluator, slots: List[Tuple[int, int]]) -> Optional[Tuple[int, int, int, int]]:
+        (d1, i1), (d2, i2) = self.random.sample(slots, 2)
+        if grid.subjects[d1][i1] == grid.subjects[d2][i2]:
+            return None
+        return d1, i1, d2, i2
+
+    @staticmethod
+    def _snapshot(grid: ConstraintEvaluator) -> Tuple[List[List[Optional[str]]], List[List[Optional[str]]]]:
+        return [row[:] for row in grid.subjects], [row[:] for row in grid.teachers]
+
+    def _anneal(self, evaluator: CombinedEvaluator, grid: ConstraintEvaluator,
+                slots: List[Tuple[int, int]], start_time: float, target: int):
+        cost = evaluator.penalty
+        best_cost, best_rows = cost, self._snapshot(grid)
+        ratio = self.end_temperature / self.start_temperature
+        iteration = best_iteration = 0
+        for iteration in range(1, self.iterations + 1):
+            if self._out_of_time(start_time, iteration):
+                return best_rows, best_cost, iteration, True
+            self._report(iteration, best_cost)
+            if best_cost <= target or self._stalled(iteration, best_iteration):
+                break
+            move = self._random_swap(grid, slots)
+            if move is None:
+                continue
+            temperature = self.start_temperature * ratio ** (iteration / self.iterations)
+            # Apply first and undo on rejection: accepted moves cost one swap instead of three
+            delta = evaluator.apply_swap(*move)
+            if delta > 0 and self.random.random() >= math.exp(-delta / temperature):
+                evaluator.apply_swap(*move)
+            else:
+                cost += delta
+                if cost < best_cost:
+                    best_cost, best_rows, best_iteration = cost, self._snapshot(grid), iteration
+        return best_rows, best_cost, iteration, False
+
+    def _tabu(self, evaluator: CombinedEvaluator, grid: ConstraintEvaluator,
+              slots: List[Tuple[int, int]], start_time: float, target: int):
+        cost = evaluator.penalty
+        best_cost, best_rows = cost, self._snapshot(grid)
+        tabu_until: Dict[Tuple[int, int], int] = {}
+        # Each move makes two slots tabu, so on a small grid a long tenure would freeze most of it
+        tenure = min(self.tabu_tenure, max(1, len(slots) // 4))
+        iteration = best_iteration = 0
+        for iteration in range(1, self.iterations + 1):
+            if self._out_of_time(start_time, iteration, every=4):
+                return best_rows, best_cost, iteration, True
+            self._report(iteration, best_cost)
+            if best_cost <= target or self._stalled(iteration, best_iteration):
+                break
+            chosen, chosen_delta = None, None
+            for _ in range(self.tabu_samples):
+                move = self._random_swap(grid, slots)
+                if move is None:
+                    continue
+                delta = evaluator.delta_swap(*move)
+                is_tabu = (tabu_until.get(move[:2], 0) > iteration or tabu_until.get(move[2:], 0) > iteration)
+                # Aspiration: a tabu move is fine if it beats the best so far
+                if is_tabu and cost + delta >= best_cost:
+                    continue
+                if chosen_delta is None or delta < chosen_delta:
+                    chosen, chosen_delta = move, delta
+            if chosen is None:
+                continue
+            evaluator.apply_swap(*chosen)
+            cost += chosen_delta
+            tabu_until[chosen[:2]] = tabu_until[chosen[2:]] = iteration + tenure
+            if cost < best_cost:
+                best_cost, best_rows, best_iteration = cost, self._snapshot(grid), iteration
+        return best_rows, best_cost, iteration, False
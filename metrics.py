@@ -0,0 +1,221 @@
+"""
+Process metrics in the Prometheus text format.
+
+Every process keeps its own counters, gauges and histograms. When
+`METRICS_DIR` is set, each process also writes a snapshot of them to
+``<METRICS_DIR>/<pid>-<start ms>.json`` (at most once per `flush_interval`),
+and `render` merges every snapshot in the directory. That way a scrape that
+lands on any gunicorn worker reports totals for all of them. Snapshots of
+exited workers are kept so counters never go backwards, but their gauges are
+left out: a gauge is a current value, and an exited worker has none. The
+start time in the name keeps a worker that reuses a pid from overwriting
+its predecessor's counters.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import METRICS_DIR, METRICS_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a cache hit up to the generation deadline
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                                      1.0, 2.5, 5.0, 10.0)
+
+METRICS: Dict[str, Tuple[str, str]] = {
+    "timetable_http_request_duration_seconds": ("histogram", "HTTP request latency by endpoint and status."),
+    "timetable_stage_duration_seconds": ("histogram", "Scheduler time per generation stage."),
+    "timetable_generation_duration_seconds": ("histogram", "End-to-end generation time, cache lookups included."),
+    "timetable_db_write_duration_seconds": ("histogram", "Time per SQLite write (history batches, stored timetables)."),
+    "timetable_cache_requests_total": ("counter", "Result cache lookups by outcome."),
+    "timetable_admission_total": ("counter", "Generation admission decisions by outcome."),
+    "timetable_db_writes_total": ("counter", "SQLite writes (history rows, stored timetables) by outcome."),
+    "timetable_jobs_total": ("counter", "Finished background jobs by final status."),
+    "timetable_jobs": ("gauge", "Background jobs currently held, by status."),
+    "timetable_profiles_total": ("counter", "Requests profiled with cProfile."),
+    "timetable_captures_total": ("counter", "Generations written to the capture log, by status."),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and fixed-bucket histograms for one process."""
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = METRICS_FLUSH_SECONDS,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = buckets
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        # (name, labels) -> [bucket counts..., sum, count]
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._pid: Optional[int] = None
+        self._started = 0.0
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self.maybe_flush()
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+        self.maybe_flush()
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+        self.maybe_flush()
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """Observe the wall-clock time of the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _identity(self) -> Tuple[int, float]:
+        """This process's pid and start time, restamped in a forked child."""
+        if self._pid != os.getpid():
+            self._pid, self._started = os.getpid(), time.time()
+        return self._pid, self._started
+
+    def snapshot(self) -> Dict[str, Any]:
+        pid, started = self._identity()
+        with self._lock:
+            return {
+                "pid": pid,
+                "started": started,
+                "buckets": list(self.buckets),
+                "counters": [[n, list(l), v] for (n, l), v in self._counters.items()],
+                "gauges": [[n, list(l), v] for (n, l), v in self._gauges.items()],
+                "histograms": [[n, list(l), list(v)] for (n, l), v in self._histograms.items()],
+            }
+
+    def maybe_flush(self) -> None:
+        if self.directory is not None and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write this process's snapshot atomically so readers never see a partial file."""
+        if self.directory is None:
+            return
+        self._last_flush = time.time()
+        path = os.path.join(self.directory, self._filename())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.error(f"Metrics flush failed: {e}")
+
+    def _filename(self) -> str:
+        pid, started = self._identity()
+        return f"{pid}-{int(started * 1000)}.json"
+
+    def _snapshots(self) -> List[Dict[str, Any]]:
+        """This process's live snapshot plus every other process's last flush."""
+        snapshots = [self.snapshot()]
+        if self.directory is None or not os.path.isdir(self.directory):
+            return snapshots
+        own = self._filename()
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json") or filename == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics file {filename}: {e}")
+        return snapshots
+
+    def render(self) -> str:
+        """Merged Prometheus text exposition; counters, gauges and histograms are summed across processes."""
+        self.flush()
+        scalars: Dict[Tuple[str, Labels], float] = {}
+        histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        snapshots = self._snapshots()
+        # Only the latest process to hold a pid can still be running under it
+        latest: Dict[int, float] = {}
+        for snapshot in snapshots:
+            if "pid" in snapshot:
+                latest[snapshot["pid"]] = max(latest.get(snapshot["pid"], 0.0), snapshot["started"])
+        for index, snapshot in enumerate(snapshots):
+            if snapshot.get("buckets") != list(self.buckets):
+                continue
+            live = index == 0 or ("pid" in snapshot and snapshot["started"] == latest[snapshot["pid"]]
+                                  and _running(snapshot["pid"]))
+            for name, labels, value in snapshot["counters"] + (snapshot["gauges"] if live else []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                scalars[key] = scalars.get(key, 0) + value
+            for name, labels, values in snapshot["histograms"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    merged[i] += value
+
+        lines: List[str] = []
+        names = sorted({name for name, _ in scalars} | {name for name, _ in histograms})
+        for name in names:
+            kind, help_text = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (series, labels), value in sorted(scalars.items()):
+                if series == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for (series, labels), values in sorted(histograms.items()):
+                if series != name:
+                    continue
+                for bound, count in zip(self.buckets, values):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {int(count)}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {int(values[-1])}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {int(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+def _running(pid: int) -> bool:
+    """Whether a process with this pid exists; signal 0 only checks, it delivers nothing."""
+    if os.name != "posix":
+        # On Windows signal 0 is CTRL_C_EVENT; gunicorn workers, the only other writers, are POSIX-only anyway
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+metrics = MetricsRegistry(directory=METRICS_DIR)
@@ -1,9 +1,12 @@
 """
 Data models for the timetable scheduler.
 """
+import sys
+from array import array
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Iterator, Sequence, Set, Tuple
 
 class DayOfWeek(str, Enum):
     """Enumeration of days of the week."""
@@ -15,6 +18,21 @@ class DayOfWeek(str, Enum):
     SATURDAY = "Saturday"
     SUNDAY = "Sunday"
 
+def blocked_slots(unavailable: Dict[str, List[Any]], periods_per_day: int) -> Set[Tuple[str, str, int]]:
+    """
+    Expand unavailability entries, as validated by `utils.extract_unavailable`,
+    into (teacher, day, period) triples: a day blocks every period of it.
+    """
+    blocked = set()
+    for teacher, entries in unavailable.items():
+        for entry in entries:
+            if isinstance(entry, str):
+                blocked.update((teacher, entry, p) for p in range(1, periods_per_day + 1))
+            else:
+                day, period = entry
+                blocked.add((teacher, day, int(period)))
+    return blocked
+
 class SessionType(str, Enum):
     """Type of session."""
     LECTURE = "Lecture"
@@ -27,6 +45,144 @@ class ClassSession:
     subject: str
     teacher: str
     type: SessionType = SessionType.LECTURE
+    room: Optional[str] = None
+
+    def __str__(self) -> str:
+        return f"{self.subject} ({self.teacher})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "period": self.period,
+            "subject": self.subject,
+            "teacher": self.teacher,
+            "type": self.type.value
+        }
+        if self.room is not None:
+            data["room"] = self.room
+        return data
+
+@dataclass(frozen=True)
+class Room:
+    """A bookable room. Subjects can require a room type; capacity None means any class fits."""
+    name: str
+    type: str = "classroom"
+    capacity: Optional[int] = None
+
+class RoomOccupancy:
+    """
+    Room bookings held as bitsets.
+
+    Each room keeps one int per day with bit ``p - 1`` set when period `p`
+    is booked. Each room type keeps, per day and period, an int with bit `i`
+    set when the type's `i`-th room is booked. Rooms of a type are ordered by
+    capacity, so "free rooms of type T at day/period" is one mask operation
+    and the lowest free bit is the smallest room that fits.
+    """
+    def __init__(self, rooms: Sequence[Room], days: Sequence[str], periods_per_day: int):
+        self.rooms: Dict[str, Room] = {room.name: room for room in rooms}
+        self.day_index = {day: d for d, day in enumerate(days)}
+        self.periods_per_day = periods_per_day
+        self.by_type: Dict[str, List[Room]] = {}
+        for room in sorted(rooms, key=lambda r: (r.capacity is None, r.capacity or 0, r.name)):
+            self.by_type.setdefault(room.type, []).append(room)
+        self._bit = {room.name: i for typed in self.by_type.values() for i, room in enumerate(typed)}
+        self.schedule: Dict[str, List[int]] = {name: [0] * len(days) for name in self.rooms}
+        self._booked: Dict[str, List[List[int]]] = {
+            room_type: [[0] * periods_per_day for _ in days] for room_type in self.by_type
+        }
+        self._owners: Dict[Tuple[str, int, int], str] = {}
+        self._held: Dict[Tuple[str, int, int], str] = {}
+        self._fit: Dict[Tuple[str, int], int] = {}
+
+    def fit_mask(self, room_type: str, size: int = 0) -> int:
+        """Rooms of `room_type` with room for `size` students."""
+        key = (room_type, size)
+        mask = self._fit.get(key)
+        if mask is None:
+            mask = 0
+            for i, room in enumerate(self.by_type.get(room_type, [])):
+                if room.capacity is None or room.capacity >= size:
+                    mask |= 1 << i
+            self._fit[key] = mask
+        return mask
+
+    def free_mask(self, room_type: str, day: str, period: int, size: int = 0) -> int:
+        booked = self._booked.get(room_type)
+        if booked is None:
+            return 0
+        return self.fit_mask(room_type, size) & ~booked[self.day_index[day]][period - 1]
+
+    def has_free(self, room_type: str, day: str, period: int, size: int = 0) -> bool:
+        return self.free_mask(room_type, day, period, size) != 0
+
+    def first_free(self, room_type: str, day: str, period: int, size: int = 0) -> Optional[str]:
+        """Smallest free room of `room_type` that fits `size`, if any."""
+        mask = self.free_mask(room_type, day, period, size)
+        if not mask:
+            return None
+        return self.by_type[room_type][(mask & -mask).bit_length() - 1].name
+
+    def free_rooms(self, room_type: str, day: str, period: int, size: int = 0) -> List[str]:
+        mask = self.free_mask(room_type, day, period, size)
+        return [room.name for i, room in enumerate(self.by_type.get(room_type, [])) if mask >> i & 1]
+
+    def is_free(self, room: str, day: str, period: int) -> bool:
+        return not self.schedule[room][self.day_index[day]] >> (period - 1) & 1
+
+    def owner(self, room: str, day: str, period: int) -> Optional[str]:
+        return self._owners.get((room, self.day_index[day], period))
+
+    def held_by(self, owner: str, day: str, period: int) -> Optional[str]:
+        """Room `owner` holds at day/period, if any."""
+        return self._held.get((owner, self.day_index[day], period))
+
+    def book(self, room: str, day: str, period: int, owner: str) -> bool:
+        """Book `room` for `owner`; returns False, changing nothing, if it is taken."""
+        d = self.day_index[day]
+        if self.schedule[room][d] >> (period - 1) & 1:
+            return False
+        self.schedule[room][d] |= 1 << (period - 1)
+        self._booked[self.rooms[room].type][d][period - 1] |= 1 << self._bit[room]
+        self._owners[(room, d, period)] = owner
+        self._held[(owner, d, period)] = room
+        return True
+
+    def release(self, room: str, day: str, period: int) -> None:
+        d = self.day_index[day]
+        if not self.schedule[room][d] >> (period - 1) & 1:
+            return
+        self.schedule[room][d] &= ~(1 << (period - 1))
+        self._booked[self.rooms[room].type][d][period - 1] &= ~(1 << self._bit[room])
+        owner = self._owners.pop((room, d, period))
+        self._held.pop((owner, d, period), None)
+
+    def usage(self) -> Dict[str, int]:
+        """Booked periods per room over the week."""
+        return {room: sum(bin(bits).count("1") for bits in days) for room, days in self.schedule.items()}
+
+class SessionView:
+    """
+    Read-only `ClassSession` look-alike for one cell of a `TimetableGrid`.
+    Period, subject and teacher are derived from the grid, so a view never goes stale after a swap.
+    """
+    __slots__ = ("grid", "index")
+    type = SessionType.LECTURE
+
+    def __init__(self, grid: "TimetableGrid", index: int):
+        self.grid = grid
+        self.index = index
+
+    @property
+    def period(self) -> int:
+        return self.index % self.grid.periods_per_day + 1
+
+    @property
+    def subject(self) -> str:
+        return self.grid.tables.pairs[self.grid.cells[self.index]][0]
+
+    @property
+    def teacher(self) -> str:
+        return self.grid.tables.pairs[self.grid.cells[self.index]][1]
 
     def __str__(self) -> str:
         return f"{self.subject} ({self.teacher})"
@@ -39,6 +195,164 @@ class ClassSession:
             "type": self.type.value
         }
 
+class _GridTables:
+    """Interned subject/teacher tables shared by every grid built from the same assignment."""
+    __slots__ = ("subjects", "teachers", "subject_ids", "subject_teacher", "pairs")
+
+    def __init__(self, subject_teacher_map: Dict[str, str]):
+        self.subjects = [sys.intern(s) for s in sorted(subject_teacher_map)]
+        self.teachers = [sys.intern(t) for t in sorted(set(subject_teacher_map.values()))]
+        self.subject_ids = {s: i for i, s in enumerate(self.subjects)}
+        teacher_ids = {t: i for i, t in enumerate(self.teachers)}
+        self.subject_teacher = array("h", (teacher_ids[subject_teacher_map[s]] for s in self.subjects))
+        self.pairs = [(s, self.teachers[t]) for s, t in zip(self.subjects, self.subject_teacher)]
+
+@lru_cache(maxsize=1024)
+def _tables(assignment: Tuple[Tuple[str, str], ...]) -> _GridTables:
+    return _GridTables(dict(assignment))
+
+class TimetableGrid:
+    """
+    Compact days x periods timetable: one small integer per cell indexing an
+    interned subject table, with each subject's teacher held in a parallel
+    table. Grids with the same subject -> teacher assignment share one set of
+    tables, so each grid costs little more than its cell array. Teacher load
+    and per-day counts are derived on demand rather than stored, and
+    `sessions()` hands out `SessionView`s for code written against
+    ``Dict[str, List[ClassSession]]``.
+    """
+    __slots__ = ("days", "periods_per_day", "tables", "cells")
+    EMPTY = -1
+
+    def __init__(self, days: Sequence[str], periods_per_day: int, subject_teacher_map: Dict[str, str]):
+        self.days = days if isinstance(days, list) else list(days)
+        self.periods_per_day = periods_per_day
+        self.tables = _tables(tuple(sorted(subject_teacher_map.items())))
+        self.cells = array("h", [self.EMPTY]) * (len(self.days) * periods_per_day)
+
+    @property
+    def subjects(self) -> List[str]:
+        return self.tables.subjects
+
+    @property
+    def teachers(self) -> List[str]:
+        return self.tables.teachers
+
+    @property
+    def subject_teacher(self) -> array:
+        return self.tables.subject_teacher
+
+    @classmethod
+    def from_pool(cls, days: Sequence[str], periods_per_day: int, pool: Sequence[Optional[str]],
+                  subject_teacher_map: Dict[str, str]) -> "TimetableGrid":
+        """Fill the grid in day-major order; None entries and cells past the end of `pool` stay empty."""
+        grid = cls(days, periods_per_day, subject_teacher_map)
+        ids = grid.tables.subject_ids
+        n = min(len(pool), len(grid.cells))
+        grid.cells[:n] = array("h", [cls.EMPTY if s is None else ids[s] for s in pool[:n]])
+        return grid
+
+    @staticmethod
+    def day_lengths(lessons: int, n_days: int, periods_per_day: int) -> List[int]:
+        """Lessons per day for `lessons` spread as evenly as they divide; earlier days take the remainder."""
+        if n_days <= 0:
+            return []
+        share, extra = divmod(lessons, n_days)
+        return [min(periods_per_day, share + (d < extra)) for d in range(n_days)]
+
+    @classmethod
+    def from_lessons(cls, days: Sequence[str], periods_per_day: int, lessons: Sequence[str],
+                     subject_teacher_map: Dict[str, str]) -> "TimetableGrid":
+        """
+        Deal `lessons` out in order over `day_lengths` days, so a week the
+        lessons do not fill keeps its free periods at the end of every day
+        rather than as empty days at the end of the week.
+        """
+        grid = cls(days, periods_per_day, subject_teacher_map)
+        ids = grid.tables.subject_ids
+        start = 0
+        for d, length in enumerate(cls.day_lengths(len(lessons), len(grid.days), periods_per_day)):
+            base = d * periods_per_day
+            grid.cells[base:base + length] = array("h", [ids[s] for s in lessons[start:start + length]])
+            start += length
+        return grid
+
+    def copy(self) -> "TimetableGrid":
+        grid = TimetableGrid.__new__(TimetableGrid)
+        grid.days, grid.periods_per_day, grid.tables = self.days, self.periods_per_day, self.tables
+        grid.cells = array("h", self.cells)
+        return grid
+
+    def index(self, d: int, p: int) -> int:
+        """Cell index of day `d`, zero-based period `p`."""
+        return d * self.periods_per_day + p
+
+    def subject_at(self, d: int, p: int) -> Optional[str]:
+        cell = self.cells[d * self.periods_per_day + p]
+        return None if cell == self.EMPTY else self.tables.subjects[cell]
+
+    def teacher_at(self, d: int, p: int) -> Optional[str]:
+        cell = self.cells[d * self.periods_per_day + p]
+        return None if cell == self.EMPTY else self.tables.pairs[cell][1]
+
+    def set(self, d: int, p: int, subject: Optional[str]) -> None:
+        self.cells[d * self.periods_per_day + p] = self.EMPTY if subject is None else self.tables.subject_ids[subject]
+
+    def swap(self, d1: int, p1: int, d2: int, p2: int) -> None:
+        i, j = d1 * self.periods_per_day + p1, d2 * self.periods_per_day + p2
+        self.cells[i], self.cells[j] = self.cells[j], self.cells[i]
+
+    def rows(self) -> Iterator[array]:
+        """Subject ids per day."""
+        for d in range(len(self.days)):
+            yield self.cells[d * self.periods_per_day:(d + 1) * self.periods_per_day]
+
+    def sessions(self) -> Dict[str, List[SessionView]]:
+        """Filled cells as ``{day: [SessionView]}``, ordered by period."""
+        empty = self.EMPTY
+        return {
+            day: [SessionView(self, i) for i in range(d * self.periods_per_day, (d + 1) * self.periods_per_day)
+                  if self.cells[i] != empty]
+            for d, day in enumerate(self.days)
+        }
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        """JSON form ``{day: [{"period", "subject", "teacher"}]}``, built straight from the tables."""
+        pairs, cells, periods = self.tables.pairs, self.cells, self.periods_per_day
+        result = {}
+        for d, day in enumerate(self.days):
+            base = d * periods
+            sessions = []
+            for p in range(periods):
+                cell = cells[base + p]
+                if cell >= 0:
+                    subject, teacher = pairs[cell]
+                    sessions.append({"period": p + 1, "subject": subject, "teacher": teacher})
+            result[day] = sessions
+        return result
+
+    def teacher_load(self) -> Dict[str, int]:
+        """Booked periods per teacher over the week."""
+        per_subject = [0] * len(self.tables.subjects)
+        for cell in self.cells:
+            if cell >= 0:
+                per_subject[cell] += 1
+        load: Dict[str, int] = {}
+        for (_, teacher), count in zip(self.tables.pairs, per_subject):
+            if count:
+                load[teacher] = load.get(teacher, 0) + count
+        return load
+
+    def day_counts(self, d: int) -> Dict[str, int]:
+        """Periods per teacher on day `d`."""
+        pairs = self.tables.pairs
+        counts: Dict[str, int] = {}
+        for cell in self.cells[d * self.periods_per_day:(d + 1) * self.periods_per_day]:
+            if cell >= 0:
+                teacher = pairs[cell][1]
+                counts[teacher] = counts.get(teacher, 0) + 1
+        return counts
+
 @dataclass
 class TimetableResult:
     """Result of the scheduling process."""
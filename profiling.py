@@ -0,0 +1,48 @@
+"""
+Opt-in cProfile hook for individual requests.
+
+Profiling is off unless `PROFILE_DIR` is set. A request is then profiled
+when it carries the `PROFILE_HEADER` header or is picked by
+`PROFILE_SAMPLE_RATE`, and its stats are dumped to
+``<PROFILE_DIR>/<timestamp>-<pid>-<endpoint>.prof`` for `pstats` or snakeviz.
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+from typing import Optional
+
+from config import PROFILE_DIR, PROFILE_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+def start_profile(requested: bool, directory: Optional[str] = PROFILE_DIR,
+                  sample_rate: float = PROFILE_SAMPLE_RATE) -> Optional[cProfile.Profile]:
+    """Return a running profiler if this request should be profiled, else None."""
+    if directory is None or not (requested or (sample_rate > 0 and random.random() < sample_rate)):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread
+        return None
+    return profiler
+
+def dump_profile(profiler: cProfile.Profile, endpoint: str, directory: Optional[str] = PROFILE_DIR) -> Optional[str]:
+    """Stop `profiler` and write its stats; returns the file path."""
+    profiler.disable()
+    if directory is None:
+        return None
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", endpoint or "request")
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{name}.prof")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+    except OSError as e:
+        logger.error(f"Could not write profile: {e}")
+        return None
+    logger.info(f"Wrote profile {path}")
+    return path
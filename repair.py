@@ -0,0 +1,320 @@
+"""
+Incremental Timetable Repair.
+
+Applies a small change (a teacher becoming unavailable, subjects added,
+removed or re-weighted, slots pinned) to an existing timetable and
+re-optimizes only the cells around the change. The objective counts every
+changed cell, so the search prefers the smallest edit that satisfies the
+hard rules over a better-looking but different week.
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import REPAIR_TIME_BUDGET
+from constraint_spec import compile_constraints
+from constraints import CombinedEvaluator, ConstraintEvaluator, TeacherAvailability
+from exceptions import TimetableError
+from local_search import AdjacentDuplicateEvaluator
+from models import TimetableGrid, blocked_slots
+
+logger = logging.getLogger(__name__)
+
+HARD_WEIGHT = 100
+CHANGE_WEIGHT = 2
+DUPLICATE_WEIGHT = 1
+
+Cell = Tuple[int, int]
+
+class ChangeEvaluator(ConstraintEvaluator):
+    """Number of cells whose subject differs from the original timetable."""
+    def __init__(self, original: List[List[Optional[str]]], schedule: Dict[str, Any], meta: Dict[str, Any]):
+        self.original = original
+        super().__init__(schedule, meta)
+
+    def _changed(self, d: int, i: int) -> int:
+        return int(self.subjects[d][i] != self.original[d][i])
+
+    def _remove(self, d: int, i: int) -> int:
+        return -self._changed(d, i)
+
+    def _add(self, d: int, i: int) -> int:
+        return self._changed(d, i)
+
+class TimetableRepairer:
+    """Applies one delta to a generated timetable with a minimal edit."""
+    def __init__(self, timetable: Dict[str, List[Dict[str, Any]]], subject_teacher_map: Dict[str, str],
+                 days: Optional[List[str]] = None, periods_per_day: Optional[int] = None,
+                 time_budget: float = REPAIR_TIME_BUDGET):
+        """
+        Args:
+            timetable: ``{day: [{"period", "subject", "teacher"}]}`` as returned by /generate.
+            subject_teacher_map: Subject to teacher assignment of that timetable.
+            days: Day order (defaults to the timetable's key order).
+            periods_per_day: Grid width (defaults to the longest day).
+            time_budget: Wall-clock limit for the search in seconds.
+        """
+        self.days = list(days or timetable.keys())
+        self.periods = periods_per_day or max((len(s) for s in timetable.values()), default=0)
+        self.subject_teacher_map = dict(subject_teacher_map)
+        self.time_budget = time_budget
+        self.original: List[List[Optional[str]]] = [[None] * self.periods for _ in self.days]
+        for d, day in enumerate(self.days):
+            for session in timetable.get(day, []):
+                period = int(session["period"])
+                if not 1 <= period <= self.periods:
+                    raise TimetableError(f"Period {period} on {day} is outside the timetable")
+                if session["subject"] not in self.subject_teacher_map:
+                    raise TimetableError(f"Subject '{session['subject']}' has no teacher in subject_teacher_map")
+                self.original[d][period - 1] = session["subject"]
+        if any(subject is None for row in self.original for subject in row):
+            raise TimetableError("Only complete timetables can be repaired")
+
+    def repair(self, unavailable: Optional[Dict[str, List[Any]]] = None,
+               subject_hours: Optional[Dict[str, int]] = None, add: Optional[Dict[str, Dict[str, Any]]] = None,
+               remove: Optional[List[str]] = None, pins: Optional[List[Tuple[str, int, str]]] = None,
+               constraints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Args:
+            unavailable: Teacher -> blocked days ("Monday") or [day, period] pairs, as for /generate.
+            subject_hours: New weekly periods for existing subjects.
+            add: New subjects as ``{subject: {"teacher": ..., "hours": ...}}``.
+            remove: Subjects to drop.
+            pins: (day, period, subject) cells that must hold that subject.
+            constraints: Optional constraint spec, as for /generate.
+
+        Returns:
+            The repaired timetable, the changed cells and any remaining violations.
+        """
+        start_time = time.time()
+        unavailable = blocked_slots(unavailable or {}, self.periods)
+        for subject, spec in (add or {}).items():
+            if subject in self.subject_teacher_map:
+                raise TimetableError(f"Subject '{subject}' already exists")
+            self.subject_teacher_map[subject] = spec["teacher"]
+        for subject in remove or []:
+            if subject not in self.subject_teacher_map:
+                raise TimetableError(f"Unknown subject '{subject}'")
+
+        targets = self._targets(subject_hours or {}, add or {}, remove or [])
+        pinned = self._pinned_cells(pins or [], targets)
+
+        grid = TimetableGrid(self.days, self.periods, self.subject_teacher_map)
+        for d, row in enumerate(self.original):
+            for p, subject in enumerate(row):
+                grid.set(d, p, subject)
+        teachers = sorted(set(self.subject_teacher_map.values()))
+        # Shares of a split subject are named "<subject> [<teacher>]"
+        subject_of = {
+            unit: unit[:-len(f" [{teacher}]")] if unit.endswith(f" [{teacher}]") else unit
+            for unit, teacher in self.subject_teacher_map.items()
+        }
+        meta = {"teachers": teachers, "unavailable": unavailable, "subject_of": subject_of,
+                "periods_per_day": self.periods}
+        rules = list(compile_constraints(constraints).rules)
+        if unavailable:
+            rules.append(TeacherAvailability())
+        soft_rules = [rule for rule in rules if not rule.hard]
+
+        sessions = grid.sessions()
+        hard = CombinedEvaluator([rule.evaluator(sessions, meta) for rule in rules if rule.hard])
+        evaluator = CombinedEvaluator(
+            hard.evaluators + [rule.evaluator(sessions, meta) for rule in soft_rules]
+            + [ChangeEvaluator(self.original, sessions, meta), AdjacentDuplicateEvaluator(sessions, meta)],
+            [HARD_WEIGHT] * len(hard.evaluators) + [rule.weight for rule in soft_rules] + [CHANGE_WEIGHT, DUPLICATE_WEIGHT]
+        )
+        cells = evaluator.evaluators[0].subjects
+
+        def move(d: int, p: int, subject: Optional[str]) -> None:
+            evaluator.apply_move(d, p, subject, None if subject is None else self.subject_teacher_map[subject])
+            grid.set(d, p, subject)
+
+        # 1. Pins first, then vacate cells until no subject is over its target
+        dirty: Set[Cell] = set()
+        for (d, p), subject in pinned.items():
+            if cells[d][p] != subject:
+                move(d, p, subject)
+                dirty.add((d, p))
+        counts = self._counts(cells)
+        for subject in sorted(counts):
+            for d, p in self._cells_to_vacate(cells, hard, subject, counts[subject] - targets.get(subject, 0),
+                                              pinned, unavailable):
+                move(d, p, None)
+                dirty.add((d, p))
+
+        # 2. Refill vacated cells with subjects still short of their target
+        counts = self._counts(cells)
+        needs = {s: targets[s] - counts.get(s, 0) for s in targets if targets[s] > counts.get(s, 0)}
+        for d, p in sorted(dirty):
+            if cells[d][p] is not None:
+                continue
+            subject = min((s for s, n in needs.items() if n > 0),
+                          key=lambda s: (evaluator.delta_move(d, p, s, self.subject_teacher_map[s]), s))
+            move(d, p, subject)
+            needs[subject] -= 1
+
+        # 3. Blocked slots still held by their teacher are dirty too
+        for d, day in enumerate(self.days):
+            for p in range(self.periods):
+                if (self.subject_teacher_map[cells[d][p]], day, p + 1) in unavailable:
+                    dirty.add((d, p))
+
+        iterations, timed_out = self._local_search(evaluator, hard, grid, cells, dirty, pinned, start_time)
+
+        diff = [
+            {"day": day, "period": p + 1, "before": self.original[d][p], "after": cells[d][p],
+             "teacher": self.subject_teacher_map[cells[d][p]]}
+            for d, day in enumerate(self.days) for p in range(self.periods) if cells[d][p] != self.original[d][p]
+        ]
+        violations, soft_violations, soft_penalty = [], [], 0
+        for rule in rules:
+            found = rule.validate(grid.sessions(), meta)
+            if rule.hard:
+                violations.extend(found)
+            else:
+                soft_violations.extend(found)
+                soft_penalty += len(found) * rule.weight
+        teacher_load = {teacher: 0 for teacher in teachers}
+        teacher_load.update(grid.teacher_load())
+        duration = time.time() - start_time
+        logger.info(f"Repair changed {len(diff)} cells in {duration:.4f}s, {len(violations)} violations left")
+
+        return {
+            "timetable": grid.to_dict(),
+            "days": self.days,
+            "subject_teacher_map": {s: t for s, t in self.subject_teacher_map.items() if targets.get(s, 0) > 0},
+            "diff": diff,
+            "meta": {
+                "teacher_load": teacher_load,
+                "violations": violations,
+                "changed_cells": len(diff),
+                **({"soft_violations": soft_violations, "soft_penalty": soft_penalty} if soft_rules else {}),
+                "repair": {"iterations": iterations, "timed_out": timed_out, "duration": round(duration, 6)}
+            }
+        }
+
+    def _counts(self, cells: List[List[Optional[str]]]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for row in cells:
+            for subject in row:
+                if subject is not None:
+                    counts[subject] = counts.get(subject, 0) + 1
+        return counts
+
+    def _targets(self, subject_hours: Dict[str, int], add: Dict[str, Dict[str, Any]], remove: List[str]) -> Dict[str, int]:
+        """
+        New weekly hours per subject. Explicit hours are kept exactly; the other
+        subjects keep their current hours, topped up (least-loaded teacher first)
+        or trimmed (most-loaded first) so the week stays full.
+        """
+        total = len(self.days) * self.periods
+        counts = self._counts(self.original)
+        explicit = {s: 0 for s in remove}
+        for subject, spec in add.items():
+            explicit[subject] = int(spec.get("hours", total // max(1, len(self.subject_teacher_map) - len(remove))))
+        for subject, hours in subject_hours.items():
+            if subject not in self.subject_teacher_map:
+                raise TimetableError(f"Unknown subject '{subject}'")
+            if subject not in remove:
+                explicit[subject] = hours
+        others = {s: counts.get(s, 0) for s in self.subject_teacher_map if s not in explicit}
+        surplus = total - sum(explicit.values()) - sum(others.values())
+        if surplus and not others:
+            raise TimetableError(f"Subject hours add up to {total - surplus} but the week has {total} slots")
+
+        load: Dict[str, int] = {}
+        for subject, hours in list(explicit.items()) + list(others.items()):
+            teacher = self.subject_teacher_map[subject]
+            load[teacher] = load.get(teacher, 0) + hours
+        while surplus > 0:
+            subject = min(others, key=lambda s: (load[self.subject_teacher_map[s]], others[s], s))
+            others[subject] += 1
+            load[self.subject_teacher_map[subject]] += 1
+            surplus -= 1
+        while surplus < 0:
+            candidates = [s for s in others if others[s] > 0]
+            if not candidates:
+                raise TimetableError(f"Subject hours add up to more than the {total} slots of the week")
+            subject = max(candidates, key=lambda s: (load[self.subject_teacher_map[s]], others[s], s))
+            others[subject] -= 1
+            load[self.subject_teacher_map[subject]] -= 1
+            surplus += 1
+        return {**others, **explicit}
+
+    def _pinned_cells(self, pins: List[Tuple[str, int, str]], targets: Dict[str, int]) -> Dict[Cell, str]:
+        pinned: Dict[Cell, str] = {}
+        for day, period, subject in pins:
+            if day not in self.days or not 1 <= period <= self.periods:
+                raise TimetableError(f"Pinned slot {day} period {period} is outside the timetable")
+            if targets.get(subject, 0) <= 0:
+                raise TimetableError(f"Cannot pin '{subject}': it has no hours left")
+            pinned[(self.days.index(day), period - 1)] = subject
+        for subject in set(pinned.values()):
+            if sum(1 for s in pinned.values() if s == subject) > targets[subject]:
+                raise TimetableError(f"'{subject}' is pinned to more slots than its weekly hours")
+        return pinned
+
+    def _cells_to_vacate(self, cells: List[List[Optional[str]]], hard: CombinedEvaluator, subject: str,
+                         excess: int, pinned: Dict[Cell, str], unavailable: Set[Tuple[str, str, int]]) -> List[Cell]:
+        """The `excess` cells of `subject` whose removal helps most: blocked, then violating, then latest."""
+        if excess <= 0:
+            return []
+        teacher = self.subject_teacher_map[subject]
+        candidates = [
+            (d, p) for d in range(len(self.days)) for p in range(self.periods)
+            if cells[d][p] == subject and (d, p) not in pinned
+        ]
+        candidates.sort(key=lambda c: (
+            (teacher, self.days[c[0]], c[1] + 1) not in unavailable,
+            hard.delta_move(c[0], c[1], None, None) >= 0,
+            -c[0], -c[1]
+        ))
+        return candidates[:excess]
+
+    def _hot_cells(self, hard: CombinedEvaluator, cells: List[List[Optional[str]]], pinned: Dict[Cell, str]) -> Set[Cell]:
+        """Cells taking part in a hard violation: emptying them lowers the hard penalty."""
+        if hard.penalty == 0:
+            return set()
+        return {
+            (d, p) for d in range(len(cells)) for p in range(len(cells[d]))
+            if (d, p) not in pinned and hard.delta_move(d, p, None, None) < 0
+        }
+
+    def _local_search(self, evaluator: CombinedEvaluator, hard: CombinedEvaluator, grid: TimetableGrid,
+                      cells: List[List[Optional[str]]], dirty: Set[Cell], pinned: Dict[Cell, str],
+                      start_time: float) -> Tuple[int, bool]:
+        """
+        Best-improvement swaps where one side is a dirty or violating cell.
+        Every accepted swap marks both cells dirty, so the neighbourhood only
+        grows as far as the change actually ripples.
+        """
+        free = [(d, p) for d in range(len(self.days)) for p in range(self.periods) if (d, p) not in pinned]
+        iterations = 0
+        while True:
+            if time.time() - start_time > self.time_budget:
+                return iterations, True
+            focus = sorted((dirty - set(pinned)) | self._hot_cells(hard, cells, pinned))
+            best, best_delta = None, 0
+            for a in focus:
+                for b in free:
+                    if b == a or cells[a[0]][a[1]] == cells[b[0]][b[1]]:
+                        continue
+                    delta = evaluator.delta_swap(a[0], a[1], b[0], b[1])
+                    if delta < best_delta:
+                        best, best_delta = (a, b), delta
+            if best is None:
+                return iterations, False
+            (d1, p1), (d2, p2) = best
+            evaluator.apply_swap(d1, p1, d2, p2)
+            grid.swap(d1, p1, d2, p2)
+            dirty.update(best)
+            iterations += 1
+
+def repair_timetable(result: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Public interface: repair a /generate result with a parsed delta (see `utils.extract_repair_request`)."""
+    repairer = TimetableRepairer(result["timetable"], result["subject_teacher_map"], days=result.get("days"),
+                                 periods_per_day=result.get("periods_per_day"))
+    response = repairer.repair(**delta)
+    if result.get("time_slots"):
+        response["time_slots"] = result["time_slots"]
+    return response
@@ -0,0 +1,263 @@
+"""
+Deterministic replay of captured generations.
+
+Re-runs the records `capture.py` writes through `Scheduler` (or
+`SchoolScheduler` for school requests) with the recorded seed, stopping
+local search at the iteration the recorded run reached rather than by the
+clock, so a replay rebuilds the exact timetable on any machine. Each
+replay is compared with its record: whether the timetables match (by
+digest), the violations, and how every stage's time moved. Nothing here
+imports Flask:
+
+    python replay.py captures/ --slowest 20
+    python replay.py captures/capture-4711.jsonl --key 3f2a --repeat 5
+    python replay.py captures/ --speed 2 --concurrency 4 --output replay.jsonl
+
+Records replay in capture order. With --speed N they are submitted at N
+times the recorded arrival rate; by default as fast as the workers allow.
+A summary is printed to stderr; the exit status is 1 when any replay
+diverged from its record.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from capture import result_digest, result_violations
+from exceptions import TimetableError
+from scheduler import Scheduler, SchoolScheduler
+
+logger = logging.getLogger(__name__)
+
+def read_captures(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """Records of capture files, or of every capture file (rotated ones included) in a directory, oldest first."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "capture-*.jsonl*"))))
+        else:
+            files.append(path)
+    records = []
+    for name in files:
+        with open(name, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A process killed mid-write leaves a torn last line
+                    logger.warning(f"Skipping unreadable record {name}:{line_no}")
+    records.sort(key=lambda r: r["time"])
+    return records
+
+def select(records: List[Dict[str, Any]], key: Optional[str] = None, slowest: Optional[int] = None,
+           min_duration: float = 0.0) -> List[Dict[str, Any]]:
+    """Records whose key starts with `key`, at least `min_duration` long, cut to the `slowest` N; in capture order."""
+    chosen = [r for r in records if (key is None or r["key"].startswith(key)) and r["duration"] >= min_duration]
+    if slowest is not None:
+        chosen = sorted(chosen, key=lambda r: r["duration"], reverse=True)[:slowest]
+        chosen.sort(key=lambda r: r["time"])
+    return chosen
+
+def _run(record: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+    """One replay of `record`; returns the result in /generate shape (timetables, meta) and its duration."""
+    inputs = record["input"]
+    options = inputs["options"]
+    start_time = time.perf_counter()
+    if record["kind"] == "school":
+        sections = [tuple(section) for section in inputs["sections"]]
+        result = SchoolScheduler(sections, inputs["periods_per_day"], facilities=options["facilities"],
+                                 constraints=options["constraints"], seed=record["seed"],
+                                 unavailable=options.get("unavailable")).generate(strategy=options["strategy"])
+    else:
+        # An empty dict still switches the clock off for runs that recorded no search
+        scheduler = Scheduler(inputs["subjects"], inputs["teachers"], inputs["periods_per_day"],
+                              subject_hours=options["subject_hours"], unavailable=options["unavailable"],
+                              seed=record["seed"], optimizer=options["optimizer"], staffing=options["staffing"],
+                              facilities=options["facilities"], constraints=options["constraints"],
+                              replay_search=record.get("search") or {})
+        generated = scheduler.generate(strategy=options["strategy"])
+        result = {"timetable": generated.timetable, "meta": generated.meta}
+    return result, time.perf_counter() - start_time
+
+def _compare_stages(recorded: Dict[str, float], replayed: Dict[str, float]) -> Dict[str, Dict[str, Any]]:
+    stages = {}
+    for stage in dict.fromkeys(list(recorded) + list(replayed)):
+        before, after = recorded.get(stage), replayed.get(stage)
+        stages[stage] = {"recorded": before, "replayed": after,
+                         "ratio": round(after / before, 3) if before and after is not None else None}
+    return stages
+
+def replay_record(record: Dict[str, Any], repeat: int = 1) -> Dict[str, Any]:
+    """
+    Replay one capture record and compare it with what was recorded.
+
+    Args:
+        record: A record from the capture log.
+        repeat: Times to run it; timings are the per-stage medians, and
+            runs that disagree with each other count as diverged.
+
+    Returns:
+        Dictionary with key, kind, outcome ("match", "diverged" or "error"),
+        recorded and replayed duration, ratio of replayed to recorded stage
+        time, per-stage timings, and the recorded and replayed digest,
+        violations or error.
+    """
+    report: Dict[str, Any] = {"key": record["key"], "kind": record["kind"], "seed": record["seed"],
+                              "recorded_duration": record["duration"]}
+    digests, violations, durations, errors = set(), set(), [], set()
+    timings: Dict[str, List[float]] = {}
+    try:
+        for _ in range(repeat):
+            try:
+                result, duration = _run(record)
+            except TimetableError as e:
+                errors.add(e.message)
+                continue
+            digests.add(result_digest(result))
+            violations.add(result_violations(result))
+            durations.append(duration)
+            for stage, seconds in result["meta"]["timings"].items():
+                timings.setdefault(stage, []).append(seconds)
+    except Exception as e:
+        logger.exception(f"Replay of {record['key'][:12]} crashed")
+        report.update(outcome="error", error=f"Replay failed: {e}")
+        return report
+
+    if record["status"] == "failed":
+        report.update(recorded_error=record["error"], replayed_error=sorted(errors) or None)
+        matched = not digests and errors == {record["error"]}
+    else:
+        report.update(recorded_digest=record["digest"], replayed_digest=sorted(digests) or None,
+                      recorded_violations=record["violations"], replayed_violations=sorted(violations) or None)
+        if errors:
+            report["replayed_error"] = sorted(errors)
+        matched = not errors and digests == {record["digest"]}
+    report["outcome"] = "match" if matched else "diverged"
+
+    replayed = {stage: round(statistics.median(values), 6) for stage, values in timings.items()}
+    recorded_total, replayed_total = sum(record["timings"].values()), sum(replayed.values())
+    report.update(
+        duration=round(statistics.median(durations), 6) if durations else None,
+        ratio=round(replayed_total / recorded_total, 3) if recorded_total and replayed else None,
+        stages=_compare_stages(record["timings"], replayed)
+    )
+    return report
+
+def run_replay(records: List[Dict[str, Any]], concurrency: int = 1, speed: float = 0.0,
+               repeat: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Replay records and yield their reports in completion order. With a
+    `speed` each record is submitted at its recorded offset from the first
+    divided by `speed`; otherwise at most twice `concurrency` are in flight.
+    """
+    if concurrency <= 1 and speed <= 0:
+        for record in records:
+            yield replay_record(record, repeat)
+        return
+
+    def collect(done: Iterable[Future]) -> Iterator[Dict[str, Any]]:
+        for future in done:
+            record = pending.pop(future)
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker process itself died
+                yield {"key": record["key"], "kind": record["kind"], "outcome": "error",
+                       "error": f"Worker failed: {e}"}
+
+    pending: Dict[Future, Dict[str, Any]] = {}
+    with ProcessPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        first = records[0]["time"] if records else 0.0
+        start_time = time.monotonic()
+        for record in records:
+            if speed > 0:
+                due = start_time + (record["time"] - first) / speed
+                while time.monotonic() < due:
+                    done, _ = wait(pending, timeout=due - time.monotonic(), return_when=FIRST_COMPLETED)
+                    yield from collect(done)
+            else:
+                while len(pending) >= concurrency * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from collect(done)
+            pending[executor.submit(replay_record, record, repeat)] = record
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+
+class ReplayStats:
+    """Counts reports as they stream past on their way to the writer."""
+    def __init__(self):
+        self.outcomes: Dict[str, int] = {"match": 0, "diverged": 0, "error": 0}
+        self.ratios: List[Tuple[float, str]] = []
+        self.problems: List[Tuple[str, str, str]] = []
+
+    def track(self, reports: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for report in reports:
+            self.outcomes[report["outcome"]] += 1
+            if report.get("ratio") is not None:
+                self.ratios.append((report["ratio"], report["key"]))
+            if report["outcome"] == "diverged":
+                self.problems.append((report["key"], "DIVERGED", "replay differs from the recorded run"))
+            elif report["outcome"] == "error":
+                self.problems.append((report["key"], "ERROR", report["error"]))
+            yield report
+
+    def summary(self, elapsed: float) -> str:
+        total = sum(self.outcomes.values())
+        line = (f"{total} replays ({self.outcomes['match']} matched, {self.outcomes['diverged']} diverged, "
+                f"{self.outcomes['error']} errors) in {elapsed:.2f}s")
+        if self.ratios:
+            ordered = sorted(self.ratios)
+            worst, key = ordered[-1]
+            line += (f"; stage time vs recorded: p50 {ordered[len(ordered) // 2][0]:.2f}x, "
+                     f"max {worst:.2f}x ({key[:12]})")
+        return line
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured generations and compare them with the capture")
+    parser.add_argument("paths", nargs="+", help="capture files, or directories of them")
+    parser.add_argument("--key", help="only records whose result id starts with this")
+    parser.add_argument("--slowest", type=int, help="only the N slowest records")
+    parser.add_argument("--min-duration", type=float, default=0.0, help="only records at least this many seconds")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="replay at this multiple of the recorded arrival rate (default: as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=1, help="worker processes")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per record; timings are medians")
+    parser.add_argument("--output", help="write reports here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="log scheduler progress")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    records = select(read_captures(args.paths), key=args.key, slowest=args.slowest, min_duration=args.min_duration)
+    if not records:
+        print("No capture records to replay", file=sys.stderr)
+        return 1
+
+    out = sys.stdout if not args.output else open(args.output, "w")
+    stats = ReplayStats()
+    start_time = time.perf_counter()
+    try:
+        for report in stats.track(run_replay(records, concurrency=args.concurrency, speed=args.speed,
+                                             repeat=max(1, args.repeat))):
+            out.write(json.dumps(report) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    for key, outcome, problem in stats.problems:
+        print(f"{outcome} {key[:12]}: {problem}", file=sys.stderr)
+    print(stats.summary(time.perf_counter() - start_time), file=sys.stderr)
+    return 1 if stats.problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
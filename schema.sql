@@ -6,5 +6,47 @@ CREATE TABLE IF NOT EXISTS history (
     teachers TEXT NOT NULL,
     periods INTEGER NOT NULL,
     duration REAL,
-    status TEXT
+    status TEXT,
+    strategy TEXT,
+    result_id TEXT
 );
+
+-- Newest-first pages, optionally filtered by status or input size
+CREATE INDEX IF NOT EXISTS idx_history_status ON history (status, id);
+CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp);
+CREATE INDEX IF NOT EXISTS idx_history_size ON history (subjects, teachers, periods, duration);
+
+-- Write-through store for the /generate result cache
+CREATE TABLE IF NOT EXISTS result_cache (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+
+-- Generated timetables under their result id; seq keeps slot rows small
+CREATE TABLE IF NOT EXISTS timetables (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    sections INTEGER NOT NULL,
+    periods INTEGER NOT NULL,
+    strategy TEXT,
+    payload TEXT NOT NULL,
+    digest TEXT
+);
+
+-- One row per taught period; section is '' for a single-class timetable, day 0 is Monday
+CREATE TABLE IF NOT EXISTS timetable_slots (
+    timetable INTEGER NOT NULL REFERENCES timetables (seq),
+    section TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    teacher TEXT,
+    room TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_slots_teacher ON timetable_slots (teacher, day, period);
+CREATE INDEX IF NOT EXISTS idx_slots_subject ON timetable_slots (subject);
+CREATE INDEX IF NOT EXISTS idx_slots_section ON timetable_slots (section);
+CREATE INDEX IF NOT EXISTS idx_slots_timetable ON timetable_slots (timetable);
@@ -11,7 +11,7 @@ export async function fetchHistory() {
     try {
         const response = await fetch('/history');
         const data = await response.json();
-        renderHistory(data);
+        renderHistory(data.items || []);
     } catch (e) {
         console.error("History error", e);
     }
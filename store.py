@@ -0,0 +1,227 @@
+"""
+Timetable Store.
+
+Every generated result is kept in SQLite under its result id, with one row
+per taught period in `timetable_slots`. The slot table is indexed by
+(teacher, day, period), subject and section, so questions such as "where
+is Smith on Tuesday, across every stored timetable" are an index lookup
+instead of a regeneration.
+
+Results are written behind the request by `timetable_writer`. A read of a
+result that is still queued waits for it, so a client always finds the
+result /generate just returned; slot queries may lag by a moment.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from cache import cache_key
+from config import TIMETABLE_WRITE_BATCH, TIMETABLE_WRITE_QUEUE_LIMIT, TIMETABLE_WRITE_SECONDS
+from database import WriteBehind, pool, query_db
+from exceptions import TimetableError
+from metrics import metrics
+from models import DayOfWeek
+
+logger = logging.getLogger(__name__)
+
+SLOT_FIELDS = ("timetable", "section", "day", "period", "subject", "teacher", "room")
+
+# Query parameters that filter slots, by column
+SLOT_FILTERS = ("teacher", "day", "period", "subject", "section")
+
+# Days are stored as their position in the week so teacher queries come back in calendar order
+DAYS = [d.value for d in DayOfWeek]
+
+def _slot_rows(seq: int, result: Dict[str, Any]) -> Iterator[Tuple[Any, ...]]:
+    """Slot rows of a class result (section '') or of every section of a school result."""
+    if "sections" in result:
+        sources = ((name, data["timetable"]) for name, data in result["sections"].items())
+    else:
+        sources = iter([("", result.get("timetable", {}))])
+    for section, timetable in sources:
+        for day, sessions in timetable.items():
+            for session in sessions:
+                if session.get("subject") and session.get("type", "Lecture") == "Lecture":
+                    yield (seq, section, DAYS.index(day), session["period"], session["subject"], session.get("teacher"),
+                           session.get("room"))
+
+def _digest(result_id: str, created: float, strategy: Optional[str], result: Dict[str, Any]) -> str:
+    """Canonical hash of everything `get_timetable` returns for a row, so equal digests mean equal bodies."""
+    return cache_key({"id": result_id, "created": created, "strategy": strategy, "result": result})
+
+def save_timetable(result_id: str, result: Dict[str, Any], strategy: Optional[str] = None) -> bool:
+    """
+    Store a result and its slots, replacing any earlier result with the same id.
+    Failures are logged, not raised, so a storage problem never fails a generation.
+
+    Returns:
+        True when the result was stored.
+    """
+    return _store(result_id, result, json.dumps(result, separators=(",", ":")), strategy)
+
+def _store(result_id: str, result: Dict[str, Any], payload: str, strategy: Optional[str]) -> bool:
+    sections = len(result["sections"]) if "sections" in result else 1
+    periods = len(result.get("time_slots", []))
+    created = time.time()
+    try:
+        with metrics.timer("timetable_db_write_duration_seconds"), pool.connection() as db:
+            old = db.execute("SELECT seq FROM timetables WHERE id = ?", (result_id,)).fetchone()
+            if old is not None:
+                db.execute("DELETE FROM timetable_slots WHERE timetable = ?", (old["seq"],))
+                db.execute("DELETE FROM timetables WHERE seq = ?", (old["seq"],))
+            seq = db.execute(
+                "INSERT INTO timetables (id, created, sections, periods, strategy, payload, digest) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (result_id, created, sections, periods, strategy, payload, _digest(result_id, created, strategy, result))
+            ).lastrowid
+            db.executemany(
+                f'INSERT INTO timetable_slots ({", ".join(SLOT_FIELDS)}) VALUES ({", ".join("?" * len(SLOT_FIELDS))})',
+                _slot_rows(seq, result)
+            )
+            db.commit()
+    except sqlite3.Error as e:
+        metrics.inc("timetable_db_writes_total", result="error")
+        logger.error(f"Storing timetable {result_id[:12]} failed: {e}")
+        return False
+    metrics.inc("timetable_db_writes_total", result="ok")
+    return True
+
+class TimetableWriter(WriteBehind):
+    """
+    Write-behind queue for `save_timetable`. `save` snapshots the result as
+    its JSON payload and returns; the DELETE, inserts and commit happen on
+    the writer thread. A full queue writes on the caller's thread instead,
+    since a dropped result would be a lost timetable.
+    """
+    name = "timetable-writer"
+
+    def __init__(self, batch_size: int = TIMETABLE_WRITE_BATCH, flush_interval: float = TIMETABLE_WRITE_SECONDS,
+                 queue_limit: int = TIMETABLE_WRITE_QUEUE_LIMIT):
+        super().__init__(batch_size, flush_interval, queue_limit)
+        # Queued saves per result id, so reads know when to wait
+        self._unsaved: Dict[str, int] = {}
+        self._unsaved_lock = threading.Lock()
+
+    def save(self, result_id: str, result: Dict[str, Any], strategy: Optional[str] = None) -> None:
+        """Queue a result; the caller may keep changing `result` afterwards."""
+        with self._unsaved_lock:
+            self._unsaved[result_id] = self._unsaved.get(result_id, 0) + 1
+        self.put((result_id, json.dumps(result, separators=(",", ":")), strategy))
+
+    def wait_for(self, result_id: str) -> None:
+        """Return once no save of `result_id` is queued."""
+        if result_id in self._unsaved:
+            self.flush()
+
+    def _overflow(self, item: Tuple[str, str, Optional[str]]) -> None:
+        self._write([item])
+
+    def _write(self, items: List[Tuple[str, str, Optional[str]]]) -> int:
+        written = 0
+        for result_id, payload, strategy in items:
+            written += _store(result_id, json.loads(payload), payload, strategy)
+            with self._unsaved_lock:
+                left = self._unsaved.pop(result_id, 1) - 1
+                if left > 0:
+                    self._unsaved[result_id] = left
+        return written
+
+timetable_writer = TimetableWriter()
+
+def get_timetable(result_id: str) -> Optional[Dict[str, Any]]:
+    """
+    The stored result with its id, creation time, strategy and version (the
+    content digest `timetable_version` returns), or None.
+    """
+    timetable_writer.wait_for(result_id)
+    row = query_db("SELECT id, created, strategy, payload, digest FROM timetables WHERE id = ?", (result_id,), one=True)
+    if row is None:
+        return None
+    result = json.loads(row["payload"])
+    # Rows stored before digests were kept get theirs on read
+    version = row["digest"] or _digest(row["id"], row["created"], row["strategy"], result)
+    result.update(id=row["id"], created=row["created"], strategy=row["strategy"], version=version)
+    return result
+
+def timetable_version(result_id: str) -> Optional[str]:
+    """
+    Content digest of a stored result, without loading it when it has one;
+    it changes exactly when the result's body does. None when it is not stored.
+    """
+    timetable_writer.wait_for(result_id)
+    row = query_db("SELECT digest FROM timetables WHERE id = ?", (result_id,), one=True)
+    if row is None:
+        return None
+    if row["digest"] is None:
+        return get_timetable(result_id)["version"]
+    return row["digest"]
+
+def query_slots(filters: Dict[str, Any], limit: int, cursor: Optional[str] = None
+                ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Slots across all stored timetables, using keyset pagination. With a
+    teacher the (teacher, day, period) index gives the order: by day, then
+    period, then oldest first. Otherwise slots come newest first.
+
+    Args:
+        filters: Any of teacher, day (a name), period, subject and section;
+            "timetable" narrows to one result id.
+        limit: Page size.
+        cursor: Cursor from the previous page.
+
+    Returns:
+        Tuple of the slots and the cursor for the next page (None on the last page).
+    """
+    clauses, args = [], []
+    for column in SLOT_FILTERS:
+        if filters.get(column) is not None:
+            clauses.append(f"s.{column} = ?")
+            args.append(DAYS.index(filters[column]) if column == "day" else filters[column])
+    if filters.get("timetable"):
+        clauses.append("t.id = ?")
+        args.append(filters["timetable"])
+    # Follow the index: slot columns no filter pins, then rowid; the cursor holds their last values
+    if filters.get("teacher") is not None:
+        keys = [c for c in ("day", "period") if filters.get(c) is None] + ["position"]
+        direction = ">"
+    else:
+        keys, direction = ["position"], "<"
+    if cursor is not None:
+        try:
+            values = [int(part) for part in cursor.split(".")]
+        except ValueError:
+            values = []
+        if len(values) != len(keys):
+            raise TimetableError("Invalid cursor")
+        columns = [f"s.{'rowid' if key == 'position' else key}" for key in keys]
+        clauses.append(f"({', '.join(columns)}) {direction} ({', '.join('?' * len(keys))})")
+        args.extend(values)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = ", ".join(f"s.{'rowid' if key == 'position' else key}{' DESC' if direction == '<' else ''}" for key in keys)
+    rows = query_db(
+        f"SELECT s.rowid AS position, t.id AS timetable, s.section, s.day, s.period, s.subject, s.teacher, s.room "
+        f"FROM timetable_slots s JOIN timetables t ON t.seq = s.timetable {where} ORDER BY {order} LIMIT ?",
+        args + [limit + 1]
+    )
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = ".".join(str(items[-1][key]) for key in keys) if len(rows) > limit else None
+    for item in items:
+        del item["position"]
+        item["day"] = DAYS[item["day"]]
+        item["section"] = item["section"] or None
+    return items, next_cursor
+
+def recent_timetables(limit: int = 10) -> List[Dict[str, Any]]:
+    """The newest stored timetables, without their payloads."""
+    rows = query_db("SELECT id, created, sections, periods, strategy FROM timetables ORDER BY seq DESC LIMIT ?",
+                    (limit,))
+    return [dict(row) for row in rows]
+
+def store_stats() -> Dict[str, int]:
+    return {
+        "timetables": query_db("SELECT COUNT(*) AS n FROM timetables", one=True)["n"],
+        "slots": query_db("SELECT COUNT(*) AS n FROM timetable_slots", one=True)["n"],
+    }
@@ -0,0 +1,112 @@
+"""
+Term Planning.
+
+A term is many weeks, but most of them are the same week: a rotation label
+("A", "B", an exam week) decides the inputs, and only holidays make one
+week differ from another of the same label. `plan_term` therefore solves
+one template per distinct (label, open days) signature and points every
+week at its template, so a fifteen-week term with a few holidays costs a
+handful of generations rather than fifteen. Template keys follow the
+/generate cache key, so a regular week reuses a result already cached by
+/generate and the other way round.
+"""
+import copy
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from cache import ResultCache, cache_key
+from config import DEFAULT_DAYS
+from scheduler import generate_scheduler_response
+from utils import generation_key
+
+logger = logging.getLogger(__name__)
+
+def _scale_hours(subject_hours: Dict[str, int], open_days: int) -> Dict[str, int]:
+    """Explicit weekly hours cut to a short week in proportion, rounding by largest remainder."""
+    if not subject_hours:
+        return subject_hours
+    exact = {s: h * open_days / len(DEFAULT_DAYS) for s, h in subject_hours.items()}
+    scaled = {s: int(v) for s, v in exact.items()}
+    leftover = round(sum(exact.values())) - sum(scaled.values())
+    for subject in sorted(exact, key=lambda s: (scaled[s] - exact[s], s))[:leftover]:
+        scaled[subject] += 1
+    return scaled
+
+def _trim(result: Dict[str, Any], days: List[str]) -> Dict[str, Any]:
+    """A full-week result with the closed days taken out."""
+    trimmed = copy.deepcopy(result)
+    trimmed["timetable"] = {day: trimmed["timetable"][day] for day in days}
+    trimmed["days"] = days
+    return trimmed
+
+def plan_term(spec: Dict[str, Any], term: Dict[str, Any], cache: Optional[ResultCache] = None) -> Dict[str, Any]:
+    """
+    Timetable every week of a term, solving each distinct week once.
+
+    Args:
+        spec: The base request, as from `parse_generation_request`.
+        term: The calendar, as from `utils.extract_term_request`.
+        cache: Optional result cache templates are read from and written to.
+
+    Returns:
+        Dictionary with weeks (week, label, start when known, days, closed and
+        the key of its template), templates (key -> timetable result) and meta
+        counting templates solved and weeks that reused one.
+    """
+    start_time = time.perf_counter()
+    templates: Dict[str, Dict[str, Any]] = {}
+    solved = 0
+
+    def template(label: str, days: List[str]) -> str:
+        nonlocal solved
+        options = dict(term["options"][label])
+        if days != DEFAULT_DAYS:
+            options["subject_hours"] = _scale_hours(options.get("subject_hours") or {}, len(days))
+        # Only short weeks carry days, so a regular week shares its key with the same /generate request
+        key = generation_key(None, spec["subjects"], spec["teachers"], spec["periods_per_day"], options,
+                             days=None if days == DEFAULT_DAYS else days)
+        if key in templates:
+            return key
+        result = cache.get(key) if cache is not None else None
+        if result is None:
+            logger.info(f"Solving week template {label} ({len(days)} days)")
+            result = generate_scheduler_response(spec["subjects"], spec["teachers"], spec["periods_per_day"],
+                                                 days=None if days == DEFAULT_DAYS else days, **options)
+            solved += 1
+            if cache is not None:
+                cache.put(key, result)
+        templates[key] = result
+        return key
+
+    weeks = []
+    for week, label in enumerate(term["labels"], 1):
+        closed = [day for day in DEFAULT_DAYS if day in term["closed"].get(week, [])]
+        days = [day for day in DEFAULT_DAYS if day not in closed]
+        entry: Dict[str, Any] = {"week": week, "label": label, "days": days, "closed": closed, "template": None}
+        if term["start"] is not None:
+            entry["start"] = (term["start"] + timedelta(weeks=week - 1)).isoformat()
+        if days and (not closed or term["short_weeks"] == "resolve"):
+            entry["template"] = template(label, days)
+        elif days:
+            # Trimmed weeks get their own entry, keyed by the template they were cut from
+            full = template(label, list(DEFAULT_DAYS))
+            key = cache_key({"template": full, "days": days})
+            templates.setdefault(key, _trim(templates[full], days))
+            entry["template"] = key
+        weeks.append(entry)
+
+    duration = time.perf_counter() - start_time
+    logger.info(f"Planned {len(weeks)} weeks from {len(templates)} templates ({solved} solved) in {duration:.4f}s")
+    return {
+        "weeks": weeks,
+        "templates": templates,
+        "meta": {
+            "weeks": len(weeks),
+            "templates": len(templates),
+            "solved": solved,
+            "reused": sum(1 for w in weeks if w["template"]) - len({w["template"] for w in weeks if w["template"]}),
+            "duration_seconds": round(duration, 4)
+        }
+    }
@@ -0,0 +1,43 @@
+"""
+Shared fixtures. The modules live at the repository root, and the app opens
+its SQLite database at import time, so both are set up before any test
+module imports them.
+"""
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="timetable-tests-"), "scheduler.db"))
+
+@pytest.fixture
+def client():
+    """A Flask test client with an empty result cache."""
+    from app import app
+    from cache import result_cache
+
+    result_cache.clear()
+    app.config["TESTING"] = True
+    with app.test_client() as test_client:
+        yield test_client
+    result_cache.clear()
+
+def grid_teachers(result):
+    """(teacher, day, period) of every taught slot of a class or school result, repeats included."""
+    if "sections" in result:
+        timetables = [data["timetable"] for data in result["sections"].values()]
+    else:
+        timetables = [result["timetable"]]
+    return [(session["teacher"], day, session["period"])
+            for timetable in timetables for day, sessions in timetable.items() for session in sessions]
+
+def school(n, seed=0):
+    """`n` sections of eight subjects drawn from a shared teacher pool with about 30% spare teaching time."""
+    rng = random.Random(seed)
+    subjects = ["Math", "English", "Physics", "Chemistry", "Biology", "History", "Art", "PE"]
+    pool = [f"T{i}" for i in range(int(n * 1.3) + 1)]
+    return [(f"S{s}", subjects, sorted(rng.sample(pool, len(subjects)))) for s in range(n)]
@@ -0,0 +1,55 @@
+"""Stored timetables over HTTP: content-digest ETags and conditional fetches."""
+import copy
+import gzip
+import json
+
+import pytest
+
+from store import timetable_writer
+
+BODY = {"subjects": "Math,English,Physics", "teachers": "Smith,Lee,Khan", "periods_per_day": 6, "seed": 2}
+
+@pytest.fixture
+def result_id(client):
+    response = client.post("/generate", json=BODY)
+    assert response.status_code == 200
+    return response.get_json()["meta"]["result_id"]
+
+def test_timetable_etag_is_stable_and_answers_304(client, result_id):
+    first = client.get(f"/timetables/{result_id}")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert client.get(f"/timetables/{result_id}").headers["ETag"] == etag
+
+    again = client.get(f"/timetables/{result_id}", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.get_data() == b""
+
+def test_each_representation_has_its_own_etag(client, result_id):
+    plain = client.get(f"/timetables/{result_id}")
+    zipped = client.get(f"/timetables/{result_id}", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert zipped.headers["ETag"] != plain.headers["ETag"]
+    assert json.loads(gzip.decompress(zipped.get_data())) == plain.get_json()
+    # The plain tag does not validate the gzip representation
+    mismatched = client.get(f"/timetables/{result_id}", headers={"Accept-Encoding": "gzip",
+                                                                 "If-None-Match": plain.headers["ETag"]})
+    assert mismatched.status_code == 200
+    matched = client.get(f"/timetables/{result_id}", headers={"Accept-Encoding": "gzip",
+                                                              "If-None-Match": zipped.headers["ETag"]})
+    assert matched.status_code == 304
+
+def test_replaced_timetable_gets_a_new_etag(client, result_id):
+    before = client.get(f"/timetables/{result_id}")
+    replaced = copy.deepcopy(before.get_json())
+    replaced["timetable"]["Monday"][0]["subject"] = "Art"
+    timetable_writer.save(result_id, replaced)
+
+    after = client.get(f"/timetables/{result_id}", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert after.get_json()["timetable"]["Monday"][0]["subject"] == "Art"
+
+def test_unknown_timetable_is_404(client):
+    assert client.get("/timetables/missing").status_code == 404
@@ -0,0 +1,81 @@
+"""Incremental evaluators must always agree with a full rescan by `validate`."""
+import random
+
+import pytest
+
+from constraint_spec import compile_constraints
+from constraints import CombinedEvaluator, TeacherAvailability
+from models import ClassSession
+from utils import extract_constraint_options
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+PERIODS = 6
+SUBJECT_TEACHER = {"Math": "Smith", "Physics": "Smith", "English": "Lee", "History": "Khan", "PE": "Lee"}
+
+SPECS = [
+    {},
+    {"max_consecutive": 1, "max_daily": 3, "teachers": {"Smith": {"max_daily": 2}}},
+    {"subject_spread": {"Math": 1, "*": 2},
+     "forbidden": [{"subject": "PE", "period": 1}, {"teacher": "Lee", "day": "Friday"}]},
+    {"max_daily": 2, "subject_spread": 1, "weights": {"max_daily": 3, "subject_spread": 2}},
+]
+
+def _schedule(rows):
+    return {
+        day: [ClassSession(period=p + 1, subject=subject, teacher=SUBJECT_TEACHER[subject])
+              for p, subject in enumerate(row) if subject is not None]
+        for day, row in zip(DAYS, rows)
+    }
+
+def _random_rows(rng, free=0, scattered=False):
+    """A full week, or one with `free` empty cells: at the end of the week, or anywhere once searched."""
+    cells = [rng.choice(sorted(SUBJECT_TEACHER)) for _ in range(len(DAYS) * PERIODS - free)] + [None] * free
+    if scattered:
+        rng.shuffle(cells)
+    return [cells[d * PERIODS:(d + 1) * PERIODS] for d in range(len(DAYS))]
+
+def _rescan(rules, rows, meta):
+    schedule = _schedule(rows)
+    return [len(rule.validate(schedule, meta)) for rule in rules]
+
+def _rows_of(evaluator):
+    return [row[:] for row in evaluator.subjects]
+
+def test_free_period_ends_a_consecutive_run():
+    rules = compile_constraints(extract_constraint_options({"constraints": {"max_consecutive": 2}})).rules
+    rule = next(rule for rule in rules if rule.name == "max_consecutive")
+    meta = {"teachers": ["Smith"]}
+    gap = {"Monday": [ClassSession(period=p, subject="Math", teacher="Smith") for p in (1, 2, 4, 5)]}
+    run = {"Monday": [ClassSession(period=p, subject="Math", teacher="Smith") for p in (1, 2, 3, 4)]}
+    assert rule.validate(gap, meta) == []
+    assert rule.evaluator(gap, meta).penalty == 0
+    assert len(rule.validate(run, meta)) == rule.evaluator(run, meta).penalty == 1
+
+@pytest.mark.parametrize("spec", SPECS)
+@pytest.mark.parametrize("free, scattered", [(0, False), (4, False), (6, True)])
+def test_evaluators_track_validate_through_swaps_and_moves(spec, free, scattered):
+    rng = random.Random(7)
+    rows = _random_rows(rng, free, scattered)
+    meta = {"teachers": sorted(set(SUBJECT_TEACHER.values())), "periods_per_day": PERIODS,
+            "unavailable": {("Khan", "Monday", 2), ("Smith", "Wednesday", 5), ("Lee", "Thursday", 1)}}
+    rules = list(compile_constraints(extract_constraint_options({"constraints": spec})).rules) + [TeacherAvailability()]
+    evaluators = [rule.evaluator(_schedule(rows), meta) for rule in rules]
+    combined = CombinedEvaluator(evaluators)
+    # Searches swap lessons with free periods too, so every cell is a candidate
+    slots = [(d, i) for d in range(len(DAYS)) for i in range(PERIODS)]
+
+    assert [e.penalty for e in evaluators] == _rescan(rules, rows, meta)
+    for step in range(300):
+        (d1, i1), (d2, i2) = rng.sample(slots, 2)
+        before = combined.penalty
+        predicted = combined.delta_swap(d1, i1, d2, i2)
+        assert combined.penalty == before
+        if step % 3:
+            applied = combined.apply_swap(d1, i1, d2, i2)
+        else:
+            subject = rng.choice(sorted(SUBJECT_TEACHER))
+            predicted = combined.delta_move(d1, i1, subject, SUBJECT_TEACHER[subject])
+            applied = combined.apply_move(d1, i1, subject, SUBJECT_TEACHER[subject])
+        assert applied == predicted
+        assert combined.penalty == before + applied
+        assert [e.penalty for e in evaluators] == _rescan(rules, _rows_of(evaluators[0]), meta)
@@ -0,0 +1,104 @@
+"""The constraint-satisfaction strategy, including weeks the subjects do not fill."""
+import pytest
+
+from csp import CSPSolver
+from exceptions import InfeasibleScheduleError
+from scheduler import Scheduler
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+def _rows(grid, periods):
+    return [grid[d * periods:(d + 1) * periods] for d in range(len(DAYS))]
+
+def _runs(row, teacher_of):
+    """Longest run of one teacher in a day."""
+    longest, run, previous = 0, 0, None
+    for subject in row:
+        teacher = teacher_of.get(subject)
+        run = run + 1 if teacher is not None and teacher == previous else 1
+        previous = teacher
+        if teacher is not None:
+            longest = max(longest, run)
+    return longest
+
+@pytest.mark.parametrize("hours", [
+    {"Math": 10, "English": 10, "Physics": 10},
+    {"Math": 10, "English": 10},
+    {"Math": 7, "English": 4, "Physics": 2},
+    {"Math": 1},
+])
+def test_solver_places_every_hour_and_leaves_the_rest_free(hours):
+    teacher_of = {"Math": "Smith", "English": "Lee", "Physics": "Khan"}
+    solver = CSPSolver(hours, teacher_of, DAYS, 6)
+    grid = solver.solve()
+    assert len(grid) == 30
+    for subject, count in hours.items():
+        assert grid.count(subject) == count
+    assert grid.count(None) == 30 - sum(hours.values())
+    for row in _rows(grid, 6):
+        # Free periods only ever close a day
+        filled = [subject for subject in row if subject is not None]
+        assert row[:len(filled)] == filled
+        assert _runs(row, teacher_of) <= 2
+        for teacher in teacher_of.values():
+            assert sum(1 for subject in row if teacher_of.get(subject) == teacher) <= 4
+
+def test_solver_respects_unavailability_in_a_partial_week():
+    teacher_of = {"Math": "Smith", "English": "Lee"}
+    blocked = {("Smith", "Monday", p) for p in range(1, 7)} | {("Lee", "Friday", 1), ("Lee", "Friday", 2)}
+    grid = CSPSolver({"Math": 12, "English": 8}, teacher_of, DAYS, 6, blocked).solve()
+    for d, row in enumerate(_rows(grid, 6)):
+        for p, subject in enumerate(row, 1):
+            if subject is not None:
+                assert (teacher_of[subject], DAYS[d], p) not in blocked
+
+def test_solver_rejects_more_hours_than_the_week():
+    with pytest.raises(InfeasibleScheduleError):
+        CSPSolver({"Math": 20, "English": 11}, {"Math": "Smith", "English": "Lee"}, DAYS, 6).solve()
+
+def test_solver_proves_infeasible_teacher_limits():
+    # One teacher, at most four periods a day, cannot take 21 periods in a five-day week
+    with pytest.raises(InfeasibleScheduleError):
+        CSPSolver({"Math": 21}, {"Math": "Smith"}, DAYS, 6).solve()
+
+def test_csp_strategy_serves_partial_week_subject_hours():
+    scheduler = Scheduler(["Math", "English"], ["Smith", "Lee"], 6, subject_hours={"Math": 10, "English": 10}, seed=1)
+    result = scheduler.generate(strategy="csp")
+    assert result.meta["violations"] == []
+    assert sum(result.meta["teacher_load"].values()) == 20
+    for sessions in result.timetable.values():
+        assert [s["period"] for s in sessions] == list(range(1, len(sessions) + 1))
+
+def test_generate_accepts_a_partial_week_with_csp(client):
+    response = client.post("/generate", json={"subjects": "Math,English", "teachers": "Smith,Lee",
+                                              "periods_per_day": 6, "strategy": "csp",
+                                              "subject_hours": {"Math": 10, "English": 10}})
+    assert response.status_code == 200
+    assert sorted(response.get_json()["meta"]["teacher_load"].values()) == [10, 10]
+
+def test_solver_deals_within_subject_rules():
+    # Smith's two subjects share every slot Smith gets, so only the dealing can honour the rules
+    teacher_of = {"Math": "Smith", "Physics": "Smith", "English": "Lee"}
+    blocked = {("Math", day, 1) for day in DAYS} | {("Physics", "Monday", p) for p in range(1, 7)}
+    grid = CSPSolver({"Math": 10, "Physics": 8, "English": 10}, teacher_of, DAYS, 6,
+                     subject_daily={"Math": 2, "Physics": 2}, subject_blocked=blocked).solve()
+    for d, row in enumerate(_rows(grid, 6)):
+        assert row.count("Math") <= 2 and row.count("Physics") <= 2
+        for p, subject in enumerate(row, 1):
+            assert (subject, DAYS[d], p) not in blocked
+
+def test_solver_proves_infeasible_subject_rules():
+    # Two Math periods a day, never on Monday, leaves room for eight
+    with pytest.raises(InfeasibleScheduleError):
+        CSPSolver({"Math": 9, "English": 10}, {"Math": "Smith", "English": "Lee"}, DAYS, 6,
+                  subject_daily={"Math": 2}, subject_blocked={("Math", "Monday", p) for p in range(1, 7)}).solve()
+
+@pytest.mark.parametrize("spec", [
+    {"forbidden": [{"subject": "Math", "period": 1}]},
+    {"subject_spread": {"*": 1}},
+    {"subject_spread": {"Math": 1, "*": 2}, "forbidden": [{"subject": "Art", "day": "Friday"}]},
+])
+def test_csp_strategy_honours_hard_subject_rules(spec):
+    scheduler = Scheduler(["Math", "English", "Physics", "Chemistry", "History", "Art"],
+                          ["Smith", "Lee", "Khan", "Park"], 6, seed=1, constraints=spec)
+    assert scheduler.generate(strategy="csp").meta["violations"] == []
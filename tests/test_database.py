@@ -0,0 +1,35 @@
+"""The history write-behind queue: a flush commits every row queued so far."""
+import time
+
+import pytest
+
+from database import HistoryWriter, pool
+
+@pytest.fixture(autouse=True)
+def app_context():
+    # Importing the app creates the tables
+    from app import app
+
+    with app.app_context():
+        yield
+
+def _history_rows(status):
+    with pool.connection() as db:
+        return db.execute("SELECT COUNT(*) FROM history WHERE status = ?", (status,)).fetchone()[0]
+
+def test_history_flush_commits_the_batch_the_writer_holds():
+    # A long interval keeps the rows in the writer thread's batch, off the queue
+    writer = HistoryWriter(batch_size=100, flush_interval=60)
+    for _ in range(5):
+        writer.record(3, 3, 6, 0.1, "held")
+    time.sleep(0.2)
+    assert writer.pending() == 0
+    assert _history_rows("held") == 0
+    assert writer.flush()
+    assert _history_rows("held") == 5
+
+def test_history_flush_without_a_writer_thread_drains_the_queue():
+    writer = HistoryWriter()
+    writer._queue.put_nowait((time.strftime("%Y-%m-%d %H:%M:%S"), "3", "3", 6, 0.1, "unthreaded", None, None))
+    assert writer.flush()
+    assert _history_rows("unthreaded") == 1
@@ -0,0 +1,34 @@
+"""/export of stored results, from the cache or, once the entry has expired, the store."""
+import json
+
+import pytest
+
+from cache import result_cache
+
+BODY = {"subjects": "Math,English,Physics", "teachers": "Smith,Lee,Khan", "periods_per_day": 6, "seed": 2}
+
+@pytest.fixture
+def result_id(client):
+    response = client.post("/generate", json=BODY)
+    assert response.status_code == 200
+    return response.get_json()["meta"]["result_id"]
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_export_after_cache_expiry_reads_the_store(client, result_id, fmt):
+    cached = client.get(f"/export/{result_id}?format={fmt}").get_data()
+    result_cache.clear()
+    response = client.get(f"/export/{result_id}?format={fmt}")
+    assert response.status_code == 200
+    assert response.get_data() == cached
+    assert result_id[:12].encode() in cached
+
+def test_export_post_after_cache_expiry(client, result_id):
+    result_cache.clear()
+    response = client.post("/export", json={"result_ids": [result_id], "format": "ndjson"})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(rows) == 30
+    assert {row["timetable"] for row in rows} == {result_id[:12]}
+
+def test_export_of_an_unknown_result_is_404(client):
+    assert client.get("/export/missing").status_code == 404
@@ -0,0 +1,65 @@
+"""The feasibility pre-check: pigeonhole bounds, and Hall's condition for classes and schools."""
+import pytest
+
+from exceptions import InfeasibleScheduleError
+from feasibility import check_feasibility, check_school_feasibility
+
+def _conflict(check, *args, **kwargs):
+    with pytest.raises(InfeasibleScheduleError) as raised:
+        check(*args, **kwargs)
+    return raised.value
+
+def test_feasible_class_passes():
+    check_feasibility(["Math", "English", "Physics"], ["Smith", "Lee", "Khan"], 6)
+
+def test_daily_limit_leaves_a_day_uncovered():
+    error = _conflict(check_feasibility, ["Math", "English"], ["Smith"], 6)
+    assert error.conflict == {"teachers": ["Smith"], "days": ["Monday"], "required": 6, "available": 4}
+
+def test_explicit_hours_beyond_the_week():
+    error = _conflict(check_feasibility, ["Math", "English"], ["Smith", "Lee"], 6, subject_hours={"Math": 40})
+    assert error.conflict["subjects"] == ["Math"]
+    assert (error.conflict["required"], error.conflict["available"]) == (40, 30)
+
+def test_slot_nobody_can_teach():
+    everyone_away = {t: [["Monday", 1]] for t in ("Smith", "Lee", "Khan")}
+    error = _conflict(check_feasibility, ["Math", "English", "Physics"], ["Smith", "Lee", "Khan"], 6,
+                      unavailable=everyone_away)
+    assert error.conflict["days"] == ["Monday"]
+    assert error.conflict["available"] == 0
+
+def test_hall_violation_names_the_subjects_and_their_only_teachers():
+    # Math and Physics can only go to Smith, who cannot take both subjects' hours alone
+    staffing = {"qualifications": {"Smith": ["Math", "Physics"], "Lee": ["English"], "Khan": ["English"]}}
+    error = _conflict(check_feasibility, ["Math", "English", "Physics"], ["Smith", "Lee", "Khan"], 6,
+                      subject_hours={"Math": 12, "Physics": 12, "English": 6}, staffing=staffing)
+    assert error.conflict.get("teachers") == ["Smith"]
+    assert error.conflict["required"] > error.conflict["available"]
+
+SCHOOL = [("7A", ["Math", "English"], ["Smith", "Lee"]),
+          ("7B", ["Math", "English"], ["Smith", "Lee"]),
+          ("7C", ["Math", "English"], ["Smith", "Lee"]),
+          ("7D", ["Math", "English"], ["Khan", "Shah"])]
+
+def test_school_with_enough_shared_teachers_passes():
+    check_school_feasibility(SCHOOL[:2] + SCHOOL[3:], 6)
+
+def test_school_hall_violation_is_the_smallest_set_of_sections():
+    error = _conflict(check_school_feasibility, SCHOOL, 6)
+    assert sorted(error.conflict["sections"]) == ["7A", "7B", "7C"]
+    assert error.conflict["teachers"] == ["Lee", "Smith"]
+    assert (error.conflict["required"], error.conflict["available"]) == (90, 60)
+
+def test_school_check_counts_unavailability():
+    sections = SCHOOL[:2]
+    check_school_feasibility(sections, 6)
+    # Each section can still fill Monday on its own, but not both from the same two teachers
+    error = _conflict(check_school_feasibility, sections, 6,
+                      unavailable={"Smith": [["Monday", 1], ["Monday", 2], ["Monday", 3]]})
+    assert sorted(error.conflict["sections"]) == ["7A", "7B"]
+    assert (error.conflict["required"], error.conflict["available"]) == (60, 57)
+
+def test_school_section_that_fails_alone_is_named():
+    error = _conflict(check_school_feasibility, [("7A", ["Math", "English"], ["Smith"])], 6)
+    assert error.conflict["sections"] == ["7A"]
+    assert error.message.startswith("7A: ")
@@ -0,0 +1,90 @@
+"""Local search: its extra cost terms track full counts, and it stops once no better cost is possible."""
+import random
+
+import pytest
+
+from local_search import AdjacentDuplicateEvaluator, DailyBalanceEvaluator
+from models import ClassSession
+from scheduler import generate_scheduler_response
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+PERIODS = 6
+SUBJECT_TEACHER = {"Math": "Smith", "Physics": "Smith", "English": "Lee", "History": "Khan", "PE": "Lee"}
+
+def _schedule(rows):
+    return {
+        day: [ClassSession(period=p + 1, subject=subject, teacher=SUBJECT_TEACHER[subject])
+              for p, subject in enumerate(row) if subject is not None]
+        for day, row in zip(DAYS, rows)
+    }
+
+def _random_rows(rng, free=0):
+    cells = [rng.choice(sorted(SUBJECT_TEACHER)) for _ in range(len(DAYS) * PERIODS - free)] + [None] * free
+    return [cells[d * PERIODS:(d + 1) * PERIODS] for d in range(len(DAYS))]
+
+def _rows_of(evaluator):
+    return [row[:] for row in evaluator.subjects]
+
+def _duplicates(rows):
+    return sum(1 for row in rows for a, b in zip(row, row[1:]) if a is not None and a == b)
+
+def _balance(rows):
+    total = 0
+    for row in rows:
+        counts = {}
+        for subject in row:
+            if subject is not None:
+                teacher = SUBJECT_TEACHER[subject]
+                counts[teacher] = counts.get(teacher, 0) + 1
+        total += sum(count * count for count in counts.values())
+    return total
+
+def test_local_search_terms_track_full_counts():
+    rng = random.Random(11)
+    rows = _random_rows(rng, free=3)
+    schedule = _schedule(rows)
+    meta = {"teachers": sorted(set(SUBJECT_TEACHER.values()))}
+    duplicates, balance = AdjacentDuplicateEvaluator(schedule, meta), DailyBalanceEvaluator(schedule, meta)
+    bound = balance.lower_bound()
+    filled = [(d, i) for d, row in enumerate(rows) for i, subject in enumerate(row) if subject is not None]
+    for _ in range(300):
+        (d1, i1), (d2, i2) = rng.sample(filled, 2)
+        duplicates.apply_swap(d1, i1, d2, i2)
+        balance.apply_swap(d1, i1, d2, i2)
+        rows = _rows_of(duplicates)
+        assert duplicates.penalty == _duplicates(rows)
+        assert balance.penalty == _balance(rows)
+        assert balance.penalty >= bound
+
+def test_balance_lower_bound_is_reached_by_an_even_week():
+    # Smith teaches 10 periods, Lee 10, Khan 10: two each per day is the best spread
+    rows = [["Math", "English", "History", "Physics", "PE", "History"] for _ in DAYS]
+    balance = DailyBalanceEvaluator(_schedule(rows), {"teachers": ["Khan", "Lee", "Smith"]})
+    assert balance.penalty == balance.lower_bound() == len(DAYS) * 3 * 2 ** 2
+
+@pytest.mark.parametrize("optimizer", ["annealing", "tabu"])
+def test_local_search_stops_at_the_balance_lower_bound(optimizer):
+    result = generate_scheduler_response(["Math", "English", "Physics"], ["Smith", "Lee", "Khan"], 6,
+                                         seed=1, optimizer=optimizer)
+    search = result["meta"]["search"]
+    assert result["meta"]["violations"] == []
+    # Ten periods each, two a day, is the best spread: 5 days * 3 teachers * 2**2
+    assert search["best_cost"] == 60
+    assert not search["timed_out"]
+    assert search["iterations"] < 6000
+
+def test_balance_lower_bound_counts_days_left_empty():
+    # Two packed days; the other three are free but still available
+    rows = [["Math", "Math", "English", "English", None, None]] * 2 + [[None] * PERIODS] * 3
+    balance = DailyBalanceEvaluator(_schedule(rows), {"teachers": ["Lee", "Smith"], "periods_per_day": PERIODS})
+    assert balance.penalty == 2 * (2 ** 2 + 2 ** 2)
+    assert balance.lower_bound() == 2 * 4 * 1 ** 2
+
+@pytest.mark.parametrize("strategy", ["standard", "genetic"])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_spare_periods_move_between_days(strategy, seed):
+    # At most two Math periods in a row: five four-lesson days hold only 15 of the 16, so the days must differ
+    result = generate_scheduler_response(["Math", "English"], ["Smith", "Lee"], 6, strategy=strategy,
+                                         subject_hours={"Math": 16, "English": 4}, seed=seed)
+    assert result["meta"]["violations"] == []
+    assert sorted(result["meta"]["teacher_load"].values()) == [4, 16]
@@ -0,0 +1,42 @@
+"""Metrics merged across processes: exited workers keep their counters but not their gauges."""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from metrics import MetricsRegistry
+
+def _exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def _write(directory, pid, started, counter, gauge):
+    snapshot = {"pid": pid, "started": started, "buckets": list(MetricsRegistry().buckets),
+                "counters": [["timetable_jobs_total", [["status", "done"]], counter]],
+                "gauges": [["timetable_jobs", [["status", "running"]], gauge]], "histograms": []}
+    with open(os.path.join(directory, f"{pid}-{int(started * 1000)}.json"), "w") as f:
+        json.dump(snapshot, f)
+
+def test_exited_workers_keep_counters_but_not_gauges(tmp_path):
+    _write(str(tmp_path), _exited_pid(), time.time(), counter=4, gauge=9)
+    # The test runner's parent stands in for a worker that is still running
+    _write(str(tmp_path), os.getppid(), time.time(), counter=1, gauge=3)
+    registry = MetricsRegistry(directory=str(tmp_path))
+    registry.inc("timetable_jobs_total", status="done")
+    registry.set("timetable_jobs", 2, status="running")
+    text = registry.render()
+    assert 'timetable_jobs_total{status="done"} 6' in text
+    assert 'timetable_jobs{status="running"} 5' in text
+
+def test_a_reused_pid_gets_its_own_snapshot(tmp_path):
+    # An earlier process under this pid: its counters stay, its gauge is stale
+    _write(str(tmp_path), os.getpid(), time.time() - 60, counter=4, gauge=9)
+    registry = MetricsRegistry(directory=str(tmp_path))
+    registry.inc("timetable_jobs_total", status="done")
+    registry.set("timetable_jobs", 2, status="running")
+    text = registry.render()
+    assert len(os.listdir(tmp_path)) == 2
+    assert 'timetable_jobs_total{status="done"} 5' in text
+    assert 'timetable_jobs{status="running"} 2' in text
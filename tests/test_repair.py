@@ -0,0 +1,84 @@
+"""Incremental repair: the change is applied with a small edit and no new violations."""
+import pytest
+
+from exceptions import TimetableError, ValidationError
+from repair import repair_timetable
+from scheduler import generate_scheduler_response
+from utils import extract_repair_request
+
+SUBJECTS = ["Math", "English", "Physics", "History"]
+TEACHERS = ["Smith", "Lee", "Khan"]
+
+@pytest.fixture(scope="module")
+def generated():
+    # A clean week, so every edit a repair makes is down to the change
+    result = generate_scheduler_response(SUBJECTS, TEACHERS, 6, seed=4)
+    assert result["meta"]["violations"] == []
+    return result
+
+def _cells(timetable):
+    return {(day, s["period"]): (s["subject"], s["teacher"]) for day, sessions in timetable.items() for s in sessions}
+
+def _counts(timetable):
+    counts = {}
+    for subject, _ in _cells(timetable).values():
+        counts[subject] = counts.get(subject, 0) + 1
+    return counts
+
+def _repair(result, delta):
+    return repair_timetable(*extract_repair_request({"result": result, "delta": delta}))
+
+def test_unavailable_teacher_is_moved_with_a_small_edit(generated):
+    teacher = generated["subject_teacher_map"]["Math"]
+    taught = sorted(slot for slot, (_, t) in _cells(generated["timetable"]).items() if t == teacher)[:2]
+    repaired = _repair(generated, {"unavailable": {teacher: [list(slot) for slot in taught]}})
+
+    cells = _cells(repaired["timetable"])
+    assert repaired["meta"]["violations"] == []
+    assert all(cells.get(slot, (None, None))[1] != teacher for slot in taught)
+    assert _counts(repaired["timetable"]) == _counts(generated["timetable"])
+    # Each blocked lesson costs a swap at most, so the edit stays local
+    assert 0 < repaired["meta"]["changed_cells"] <= 2 * len(taught)
+    original = _cells(generated["timetable"])
+    for change in repaired["diff"]:
+        slot = (change["day"], change["period"])
+        assert change["before"] == original[slot][0]
+        assert change["after"] == cells[slot][0]
+
+def test_unchanged_week_needs_no_edit(generated):
+    teacher = generated["subject_teacher_map"]["Math"]
+    taught = {slot for slot, (_, t) in _cells(generated["timetable"]).items() if t == teacher}
+    free = next([day, p] for day in generated["days"] for p in range(1, 7) if (day, p) not in taught)
+    repaired = _repair(generated, {"unavailable": {teacher: [free]}})
+    assert repaired["diff"] == []
+    assert repaired["timetable"] == generated["timetable"]
+
+def test_hours_and_pins_are_met(generated):
+    repaired = _repair(generated, {"subject_hours": {"Math": 5}, "remove": ["History"],
+                                   "add": {"Art": {"teacher": "Khan", "hours": 4}},
+                                   "pin": [{"day": "Tuesday", "period": 3, "subject": "Art"}]})
+    counts = _counts(repaired["timetable"])
+    assert counts["Math"] == 5
+    assert counts["Art"] == 4
+    assert "History" not in counts
+    assert _cells(repaired["timetable"])[("Tuesday", 3)] == ("Art", "Khan")
+    assert repaired["meta"]["violations"] == []
+
+def test_unknown_subject_is_rejected(generated):
+    with pytest.raises(TimetableError):
+        _repair(generated, {"remove": ["Chemistry"]})
+
+@pytest.mark.parametrize("entry", [["Monday", 7], ["Monday", None], ["Funday", 1], "Mon"])
+def test_bad_unavailable_entries_are_rejected(generated, entry):
+    with pytest.raises(ValidationError):
+        _repair(generated, {"unavailable": {"Smith": [entry]}})
+
+def test_repair_by_result_id_after_cache_expiry(client):
+    from cache import result_cache
+
+    body = {"subjects": ",".join(SUBJECTS), "teachers": ",".join(TEACHERS), "periods_per_day": 6, "seed": 4}
+    result_id = client.post("/generate", json=body).get_json()["meta"]["result_id"]
+    result_cache.clear()
+    response = client.post("/repair", json={"result_id": result_id, "delta": {"unavailable": {"Smith": ["Friday"]}}})
+    assert response.status_code == 200
+    assert all(s["teacher"] != "Smith" for s in response.get_json()["timetable"]["Friday"])
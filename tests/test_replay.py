@@ -0,0 +1,70 @@
+"""Capture and replay: a captured /generate run replays to the same schedule, or the same error."""
+import pytest
+
+import app as app_module
+import scheduler
+from capture import CaptureLog
+from conftest import school
+from replay import read_captures, replay_record
+
+CLASS = {"subjects": "Math,English,Physics,History", "teachers": "Smith,Lee,Khan", "periods_per_day": 6}
+
+def _school_body(n, **options):
+    sections = [{"name": name, "subjects": ",".join(subjects), "teachers": ",".join(teachers)}
+                for name, subjects, teachers in school(n)]
+    return {"sections": sections, "periods_per_day": 6, **options}
+
+@pytest.fixture
+def captures(client, tmp_path, monkeypatch):
+    """Posts /generate bodies with every run captured, and returns the records read back from disk."""
+    monkeypatch.setattr(app_module, "capture_log", CaptureLog(directory=str(tmp_path), sample_rate=1.0))
+
+    def run(*bodies):
+        statuses = [client.post("/generate", json=body).status_code for body in bodies]
+        app_module.capture_log._file().close()
+        return statuses, read_captures([str(tmp_path)])
+    return run
+
+def test_class_runs_replay_to_the_same_schedule(captures):
+    statuses, records = captures(dict(CLASS, seed=5), dict(CLASS, seed=5, optimizer="tabu"), dict(CLASS, strategy="csp"),
+                                  dict(CLASS, seed=5, strategy="genetic"))
+    assert statuses == [200] * 4
+    assert [r["status"] for r in records] == ["success"] * 4
+    for record in records:
+        report = replay_record(record, repeat=2)
+        assert report["outcome"] == "match", report
+        assert report["replayed_digest"] == [record["digest"]]
+
+def test_genetic_run_cut_short_replays_to_the_same_schedule(captures, monkeypatch):
+    # With no time at all the genetic stage stops at its first generation; a replay must stop there too
+    monkeypatch.setattr(scheduler, "GENETIC_TIME_BUDGET", 0.0)
+    _, records = captures(dict(CLASS, seed=5, strategy="genetic"))
+    assert records[0]["search"]["genetic"]["timed_out"]
+    assert replay_record(records[0], repeat=2)["outcome"] == "match"
+
+def test_unseeded_run_replays_from_the_drawn_seed(captures):
+    _, records = captures(CLASS)
+    assert records[0]["seed"] is not None
+    assert replay_record(records[0])["outcome"] == "match"
+
+def test_school_run_replays_to_the_same_schedule(captures):
+    statuses, records = captures(_school_body(10, seed=2, unavailable={"T0": ["Monday"]}))
+    assert statuses == [200]
+    assert records[0]["kind"] == "school"
+    assert replay_record(records[0], repeat=2)["outcome"] == "match"
+
+def test_failed_run_replays_to_the_same_error(captures):
+    # Passes the request's feasibility check, but T0's lessons cannot all be placed around the other sections
+    blocked = {"T0": [["Monday", p] for p in range(1, 7)] + ["Friday"]}
+    statuses, records = captures(_school_body(10, seed=1, unavailable=blocked))
+    assert statuses == [422]
+    assert records[0]["status"] == "failed"
+    assert "fit no free slot" in records[0]["error"]
+    report = replay_record(records[0], repeat=2)
+    assert report["outcome"] == "match", report
+    assert report["replayed_error"] == [records[0]["error"]]
+
+def test_tampered_digest_diverges(captures):
+    _, records = captures(dict(CLASS, seed=5))
+    record = dict(records[0], digest="0" * 16)
+    assert replay_record(record)["outcome"] == "diverged"
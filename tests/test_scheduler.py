@@ -0,0 +1,80 @@
+"""School generation: shared teachers are never double-booked, hard limits hold in every section, and school requests
+get only the options they support. Multi-start runs stop once they are no longer needed."""
+import threading
+from collections import Counter
+
+import pytest
+
+from conftest import grid_teachers, school
+from exceptions import GenerationCancelledError, InfeasibleScheduleError, ValidationError
+from scheduler import _generate_once, generate_scheduler_response, generate_school_response
+
+def _double_booked(result):
+    return [slot for slot, count in Counter(grid_teachers(result)).items() if count > 1]
+
+@pytest.mark.parametrize("n", [10, 60])
+def test_school_never_double_books_a_teacher(n):
+    result = generate_school_response(school(n), 6, seed=1)
+    assert result["conflicts"] == []
+    assert _double_booked(result) == []
+    assert sum(result["teacher_load"].values()) == n * 30
+
+@pytest.mark.parametrize("n, seed, constraints", [
+    (20, 1, None),
+    (50, 2, None),
+    (30, 1, {"subject_spread": {"*": 2}, "forbidden": [{"subject": "PE", "period": 1}]}),
+])
+def test_school_sections_keep_hard_limits(n, seed, constraints):
+    result = generate_school_response(school(n), 6, seed=seed, constraints=constraints)
+    assert _double_booked(result) == []
+    assert [v for section in result["sections"].values() for v in section["violations"]] == []
+
+def test_school_without_enough_teachers_is_infeasible():
+    sections = [(name, ["Math", "English"], ["Smith", "Lee"]) for name in ("7A", "7B", "7C")]
+    with pytest.raises(InfeasibleScheduleError):
+        generate_school_response(sections, 6, seed=1)
+
+def test_school_honours_unavailability():
+    sections = school(10)
+    teacher = sections[0][2][0]
+    blocked = ["Monday", ["Friday", 1], ["Friday", 2]]
+    result = generate_school_response(sections, 6, seed=1, unavailable={teacher: blocked})
+    assert _double_booked(result) == []
+    taught = {(day, period) for t, day, period in grid_teachers(result) if t == teacher}
+    assert not any(day == "Monday" or (day, period) in {("Friday", 1), ("Friday", 2)} for day, period in taught)
+
+def test_school_request_honours_unavailability(client):
+    body = {"sections": [{"name": "7A", "subjects": "Math,English,Physics", "teachers": "Smith,Lee,Khan"},
+                         {"name": "7B", "subjects": "Math,English", "teachers": "Shah,Ng"}],
+            "periods_per_day": 6, "seed": 3, "unavailable": {"Smith": ["Tuesday"]}}
+    response = client.post("/generate", json=body)
+    assert response.status_code == 200
+    assert all(s["teacher"] != "Smith" for s in response.get_json()["sections"]["7A"]["timetable"]["Tuesday"])
+
+@pytest.mark.parametrize("option", [{"optimizer": "tabu"}, {"subject_hours": {"Math": 4}}, {"max_hours": 20},
+                                    {"strategy": "csp"}])
+def test_school_request_rejects_class_only_options(client, option):
+    body = {"sections": [{"name": "7A", "subjects": "Math,English", "teachers": "Smith,Lee"}],
+            "periods_per_day": 6, **option}
+    response = client.post("/generate", json=body)
+    assert response.status_code == 400
+    assert "cannot be used with sections" in response.get_json()["error"]
+
+def test_school_rejects_a_strategy_it_cannot_place_with():
+    with pytest.raises(ValidationError):
+        generate_school_response(school(10), 6, strategy="csp", seed=1)
+
+def test_a_cancelled_restart_stops_at_its_next_progress_report():
+    cancelled = threading.Event()
+    cancelled.set()
+    # The genetic strategy reports after every generation, so the first report comes early
+    args = (["Math", "English", "Physics"], ["Smith", "Lee", "Khan"], 6, "genetic", None, None, "annealing",
+            None, None, None, None)
+    with pytest.raises(GenerationCancelledError):
+        _generate_once(*args, 1, None, cancelled)
+
+def test_multi_start_returns_the_best_restart():
+    result = generate_scheduler_response(["Math", "English", "Physics", "Chemistry"], ["Smith", "Lee", "Khan"], 6,
+                                         seed=1, restarts=4, workers=2)
+    assert result["meta"]["violations"] == []
+    assert 1 <= result["meta"]["restarts"] <= 4
@@ -0,0 +1,27 @@
+"""The timetable store: saves are written behind the request but read back at once."""
+import pytest
+
+import store
+from store import TimetableWriter
+
+@pytest.fixture(autouse=True)
+def app_context():
+    # Importing the app creates the tables
+    from app import app
+
+    with app.app_context():
+        yield
+
+def test_saved_timetable_is_read_back_before_the_writer_runs(monkeypatch):
+    writer = TimetableWriter(flush_interval=60)
+    monkeypatch.setattr(store, "timetable_writer", writer)
+    result = {"timetable": {"Monday": [{"period": 1, "subject": "Math", "teacher": "Smith"}]}, "meta": {}}
+    writer.save("queued", result, strategy="standard")
+    # The queued payload is a snapshot, so later changes to the result are not stored
+    result["timetable"]["Monday"][0]["subject"] = "Art"
+
+    assert store.timetable_version("queued") is not None
+    stored = store.get_timetable("queued")
+    assert stored["timetable"]["Monday"][0]["subject"] == "Math"
+    assert stored["strategy"] == "standard"
+    assert writer.pending() == 0
@@ -0,0 +1,40 @@
+"""Request validation: teacher unavailability and the /generate request key."""
+import pytest
+
+from exceptions import ValidationError
+from utils import extract_unavailable, parse_generation_request
+
+def test_unavailable_entries_are_cleaned():
+    cleaned = extract_unavailable({" Smith ": ["Monday", ["Tuesday", "3"]], "Lee": []}, 6)
+    assert cleaned == {"Smith": ["Monday", ["Tuesday", 3]], "Lee": []}
+    assert extract_unavailable(None, 6) == {}
+
+@pytest.mark.parametrize("raw", [
+    ["Smith"],
+    {"Smith": "Monday"},
+    {"Smith": ["Mon"]},
+    {"Smith": [["Funday", 1]]},
+    {"Smith": [["Monday"]]},
+    {"Smith": [["Monday", 1, 2]]},
+    {"Smith": [["Monday", 0]]},
+    {"Smith": [["Monday", 7]]},
+    {"Smith": [["Monday", 1.5]]},
+    {"Smith": [["Monday", None]]},
+    {"Smith": [["Monday", True]]},
+    {"Smith": [["Monday", "first"]]},
+])
+def test_bad_unavailable_entries_are_rejected(raw):
+    with pytest.raises(ValidationError):
+        extract_unavailable(raw, 6)
+
+def test_generate_rejects_bad_unavailable(client):
+    response = client.post("/generate", json={"subjects": "Math,English", "teachers": "Smith,Lee",
+                                              "periods_per_day": 6, "unavailable": {"Smith": [["Monday", 9]]}})
+    assert response.status_code == 400
+    assert "between 1 and 6" in response.get_json()["error"]
+
+def test_unavailable_is_part_of_the_request_key():
+    body = {"subjects": "Math,English,Physics", "teachers": "Smith,Lee,Khan", "periods_per_day": 6, "seed": 1}
+    plain = parse_generation_request(body)["key"]
+    assert parse_generation_request(dict(body, unavailable={}))["key"] == plain
+    assert parse_generation_request(dict(body, unavailable={"Smith": ["Monday"]}))["key"] != plain
@@ -1,13 +1,23 @@
 """
 Utility functions for input validation and data extraction.
 """
-from typing import Dict, List, Tuple, Any
-from flask import jsonify, Response
+from datetime import date
+from typing import Dict, List, Optional, Tuple, Any, TYPE_CHECKING
 
-from config import DEFAULT_PERIODS, MIN_PERIODS, MAX_PERIODS, MAX_SUBJECTS, MAX_TEACHERS
-from exceptions import TimetableError
+from config import (
+    DEFAULT_PERIODS, MIN_PERIODS, MAX_PERIODS, MAX_SUBJECTS, MAX_TEACHERS, MAX_SECTIONS, STRATEGIES,
+    SCHOOL_STRATEGIES, OPTIMIZERS, LOCAL_SEARCH_METHOD, MAX_RESTARTS, GENERATION_WORKERS, MAX_ROOMS, DEFAULT_DAYS, MAX_TERM_WEEKS
+)
+from exceptions import TimetableError, ValidationError
+from models import DayOfWeek
 
-def api_response(data: Any = None, error: str = None, status: int = 200) -> Tuple[Response, int]:
+if TYPE_CHECKING:
+    from flask import Response
+
+# Options of the single-class pipeline that school placement has no use for
+CLASS_ONLY_OPTIONS = ("subject_hours", "optimizer", "restarts", "qualifications", "preferences", "max_hours", "split")
+
+def api_response(data: Any = None, error: str = None, status: int = 200) -> Tuple["Response", int]:
     """
     Helper to create a consistent JSON response.
     
@@ -19,6 +29,9 @@ def api_response(data: Any = None, error: str = None, status: int = 200) -> Tupl
     Returns:
         Tuple containing the response object and status code.
     """
+    # Imported here so the batch CLI can use this module without loading Flask
+    from flask import jsonify
+    
     payload = {}
     if data is not None:
         payload.update(data)
@@ -26,6 +39,81 @@ def api_response(data: Any = None, error: str = None, status: int = 200) -> Tupl
         payload["error"] = error
     return jsonify(payload), status
 
+def parse_generation_request(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract, validate and key a /generate body, rejecting inputs the
+    feasibility pre-check proves impossible before any solver runs.
+    
+    Args:
+        data: The JSON request body, for one class or with "sections" for a school.
+        
+    Returns:
+        Dictionary with sections (None for one class), subjects, teachers,
+        periods_per_day, options (see `extract_generation_options`) and key,
+        the content hash identical requests share.
+        
+    Raises:
+        TimetableError: If the body is invalid.
+        ValidationError: If a school body sets an option or strategy only a single class takes.
+        InfeasibleScheduleError: If no timetable can satisfy it; ``conflict``
+            names the smallest conflicting set.
+    """
+    from feasibility import check_feasibility, check_school_feasibility
+    
+    if not data:
+        raise TimetableError("Invalid JSON body")
+        
+    if "sections" in data:
+        sections, periods_per_day = extract_batch_request_data(data)
+        validate_batch_request_data(sections, periods_per_day)
+        ignored = [field for field in CLASS_ONLY_OPTIONS if data.get(field) not in (None, "", [], {})]
+        if ignored:
+            raise ValidationError(f"{', '.join(ignored)} cannot be used with sections")
+        subjects = [s for _, section_subjects, _ in sections for s in section_subjects]
+        teachers = sorted({t for _, _, section_teachers in sections for t in section_teachers})
+    else:
+        sections = None
+        subjects, teachers, periods_per_day = extract_request_data(data)
+        validate_request_data(subjects, teachers, periods_per_day)
+    options = extract_generation_options(data)
+    if sections is not None:
+        if options["strategy"] not in SCHOOL_STRATEGIES:
+            raise ValidationError(f"Strategy '{options['strategy']}' cannot be used with sections. "
+                                  f"Choose one of: {', '.join(SCHOOL_STRATEGIES)}")
+        check_school_feasibility(sections, periods_per_day, **options)
+    else:
+        check_feasibility(subjects, teachers, periods_per_day, **options)
+    
+    return {
+        "sections": sections,
+        "subjects": subjects,
+        "teachers": teachers,
+        "periods_per_day": periods_per_day,
+        "options": options,
+        "key": generation_key(sections, subjects, teachers, periods_per_day, options)
+    }
+
+def generation_key(sections: Optional[List[Tuple[str, List[str], List[str]]]], subjects: List[str],
+                   teachers: List[str], periods_per_day: int, options: Dict[str, Any],
+                   days: Optional[List[str]] = None) -> str:
+    """
+    Content hash of a generation: identical normalized inputs share one
+    cached result, and the worker count, which does not change it, is left
+    out. Only a short week passes `days`, so a full week keys like /generate.
+    """
+    from cache import cache_key
+
+    payload = {
+        "sections": sections,
+        "subjects": subjects,
+        "teachers": teachers,
+        "periods_per_day": periods_per_day,
+        "options": {k: v for k, v in options.items() if k != "workers"}
+    }
+    if days is not None:
+        payload["days"] = days
+    return cache_key(payload)
+
 def extract_request_data(data: Dict[str, Any]) -> Tuple[List[str], List[str], int]:
     """
     Extract and clean data from the request.
@@ -54,6 +142,455 @@ def extract_request_data(data: Dict[str, Any]) -> Tuple[List[str], List[str], in
         
     return subjects, teachers, periods_per_day
 
+def extract_generation_options(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract optional scheduling settings from the request.
+    
+    Args:
+        data: The JSON request body.
+        
+    Returns:
+        Keyword arguments for `generate_scheduler_response`: strategy,
+        subject_hours, unavailable, seed, optimizer, restarts, workers, staffing,
+        facilities and constraints.
+    """
+    strategy = str(data.get("strategy", "standard"))
+    if strategy not in STRATEGIES:
+        raise TimetableError(f"Unknown strategy '{strategy}'. Choose one of: {', '.join(STRATEGIES)}")
+        
+    optimizer = str(data.get("optimizer", LOCAL_SEARCH_METHOD))
+    if optimizer not in OPTIMIZERS:
+        raise TimetableError(f"Unknown optimizer '{optimizer}'. Choose one of: {', '.join(OPTIMIZERS)}")
+        
+    seed = data.get("seed")
+    if seed is not None:
+        try:
+            seed = int(seed)
+        except (ValueError, TypeError):
+            raise TimetableError("Seed must be a valid integer")
+        
+    subject_hours = data.get("subject_hours") or {}
+    if not isinstance(subject_hours, dict):
+        raise TimetableError("Subject hours must be an object of subject to periods")
+    try:
+        subject_hours = {str(k).strip(): int(v) for k, v in subject_hours.items()}
+    except (ValueError, TypeError):
+        raise TimetableError("Subject hours must be whole numbers")
+    if any(h < 0 for h in subject_hours.values()):
+        raise TimetableError("Subject hours cannot be negative")
+        
+    try:
+        periods_per_day = int(data.get("periods_per_day", DEFAULT_PERIODS))
+    except (ValueError, TypeError):
+        raise TimetableError("Periods per day must be a valid integer")
+    unavailable = extract_unavailable(data.get("unavailable"), periods_per_day)
+        
+    try:
+        restarts = int(data.get("restarts", 1))
+        workers = int(data.get("workers", GENERATION_WORKERS))
+    except (ValueError, TypeError):
+        raise TimetableError("Restarts and workers must be valid integers")
+    if restarts < 1 or restarts > MAX_RESTARTS:
+        raise TimetableError(f"Restarts must be between 1 and {MAX_RESTARTS}")
+    workers = max(1, min(workers, GENERATION_WORKERS))
+        
+    return {
+        "strategy": strategy,
+        "subject_hours": subject_hours,
+        "unavailable": unavailable,
+        "seed": seed,
+        "optimizer": optimizer,
+        "restarts": restarts,
+        "workers": workers,
+        "staffing": extract_staffing_options(data),
+        "facilities": extract_facility_options(data),
+        "constraints": extract_constraint_options(data)
+    }
+
+def extract_unavailable(raw: Any, periods_per_day: int) -> Dict[str, List[Any]]:
+    """
+    Validate teacher unavailability.
+
+    Args:
+        raw: Teacher -> list of blocked days ("Monday") or [day, period] pairs.
+        periods_per_day: Number of periods in a day; pair periods must be within it.
+
+    Returns:
+        The entries with teacher names stripped and pair periods as integers.
+
+    Raises:
+        ValidationError: If an entry is not a known day or a [day, period] pair in range.
+    """
+    unavailable = raw or {}
+    if not isinstance(unavailable, dict) or not all(isinstance(v, list) for v in unavailable.values()):
+        raise ValidationError("Unavailable must map each teacher to a list of days or [day, period] pairs")
+    days = [d.value for d in DayOfWeek]
+    cleaned: Dict[str, List[Any]] = {}
+    for teacher, entries in unavailable.items():
+        blocked: List[Any] = []
+        for entry in entries:
+            if isinstance(entry, str):
+                if entry not in days:
+                    raise ValidationError(f"Unknown day {entry!r} in unavailable for {teacher}; "
+                                          f"use one of: {', '.join(days)}")
+                blocked.append(entry)
+                continue
+            if not (isinstance(entry, list) and len(entry) == 2):
+                raise ValidationError("Unavailable entries must be a day or a [day, period] pair")
+            day, period = entry
+            if day not in days:
+                raise ValidationError(f"Unknown day {day!r} in unavailable for {teacher}; use one of: {', '.join(days)}")
+            # bool is an int subclass, and a float or null period names no slot
+            if isinstance(period, bool) or not isinstance(period, (int, str)) or not str(period).strip().isdigit():
+                raise ValidationError(f"Unavailable period {period!r} on {day} for {teacher} must be a whole number")
+            period = int(period)
+            if not 1 <= period <= periods_per_day:
+                raise ValidationError(f"Unavailable period {period} on {day} for {teacher} "
+                                      f"must be between 1 and {periods_per_day}")
+            blocked.append([day, period])
+        cleaned[str(teacher).strip()] = blocked
+    return cleaned
+
+def extract_staffing_options(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract teacher qualifications, weekly limits and preferences.
+    
+    Args:
+        data: The JSON request body; "qualifications" and "preferences" map
+            teachers to subject lists, "max_hours" maps teachers to periods and
+            "split" lists subjects to share between teachers.
+        
+    Returns:
+        Keyword arguments for `assignment.assign_teachers`; only the options present.
+    """
+    staffing: Dict[str, Any] = {}
+    for key in ("qualifications", "preferences"):
+        value = data.get(key)
+        if not value:
+            continue
+        if not isinstance(value, dict) or not all(isinstance(v, (list, str)) for v in value.values()):
+            raise TimetableError(f"{key.capitalize()} must map each teacher to a list of subjects")
+        staffing[key] = {
+            str(teacher).strip(): sorted({s.strip() for s in (v.split(",") if isinstance(v, str) else map(str, v)) if s.strip()})
+            for teacher, v in value.items()
+        }
+        
+    max_hours = data.get("max_hours")
+    if max_hours:
+        if not isinstance(max_hours, dict):
+            raise TimetableError("Max hours must be an object of teacher to periods")
+        try:
+            staffing["max_hours"] = {str(k).strip(): int(v) for k, v in max_hours.items()}
+        except (ValueError, TypeError):
+            raise TimetableError("Max hours must be whole numbers")
+        if any(h < 0 for h in staffing["max_hours"].values()):
+            raise TimetableError("Max hours cannot be negative")
+            
+    split = data.get("split")
+    if split:
+        if isinstance(split, str):
+            split = split.split(",")
+        if not isinstance(split, list):
+            raise TimetableError("Split must be a list of subjects")
+        staffing["split"] = sorted({str(s).strip() for s in split if str(s).strip()})
+        
+    return staffing
+
+def extract_facility_options(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract rooms and which subjects need them.
+    
+    Args:
+        data: The JSON request body; "rooms" is a list of {"name", "type", "capacity"},
+            "subject_rooms" maps subjects to a room type, "class_size" is the
+            class's head count and each entry of "sections" may carry a "size".
+        
+    Returns:
+        Facilities for the scheduler; only the options present.
+    """
+    facilities: Dict[str, Any] = {}
+    rooms = data.get("rooms") or []
+    if not isinstance(rooms, list) or not all(isinstance(r, dict) and r.get("name") for r in rooms):
+        raise TimetableError("Rooms must be a list of objects with a name")
+    if len(rooms) > MAX_ROOMS:
+        raise TimetableError(f"Too many rooms. Maximum allowed is {MAX_ROOMS}")
+    cleaned = []
+    for room in rooms:
+        try:
+            capacity = None if room.get("capacity") is None else int(room["capacity"])
+        except (ValueError, TypeError):
+            raise TimetableError("Room capacity must be a whole number")
+        cleaned.append({
+            "name": str(room["name"]).strip(),
+            "type": str(room.get("type") or "classroom").strip(),
+            "capacity": capacity
+        })
+    if len({r["name"] for r in cleaned}) != len(cleaned):
+        raise TimetableError("Room names must be unique")
+    if cleaned:
+        facilities["rooms"] = cleaned
+        
+    subject_rooms = data.get("subject_rooms") or {}
+    if not isinstance(subject_rooms, dict):
+        raise TimetableError("Subject rooms must be an object of subject to room type")
+    types = {r["type"] for r in cleaned}
+    for subject, room_type in subject_rooms.items():
+        if str(room_type).strip() not in types:
+            raise TimetableError(f"No rooms of type '{room_type}' for {subject}")
+    if subject_rooms:
+        facilities["subject_rooms"] = {str(k).strip(): str(v).strip() for k, v in subject_rooms.items()}
+        
+    sizes = {}
+    if isinstance(data.get("sections"), list):
+        for i, section in enumerate(data["sections"]):
+            if isinstance(section, dict) and section.get("size") is not None:
+                sizes[str(section.get("name") or f"Section {i + 1}").strip()] = section["size"]
+    try:
+        if data.get("class_size") is not None:
+            facilities["class_size"] = int(data["class_size"])
+        if sizes:
+            facilities["section_sizes"] = {name: int(size) for name, size in sizes.items()}
+    except (ValueError, TypeError):
+        raise TimetableError("Class and section sizes must be whole numbers")
+        
+    return facilities
+
+def extract_constraint_options(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract and normalize a declarative constraint spec.
+    
+    Args:
+        data: The JSON request body; "constraints" may hold max_consecutive,
+            max_daily, teachers (teacher -> {max_daily, max_consecutive}),
+            subject_spread (subject -> periods per day, "*" for every other
+            subject, or one number for all), forbidden (a list of
+            {"subject" or "teacher", "day", "period"}; a missing day or period
+            means all of them) and weights (rule -> "hard" or a soft penalty).
+        
+    Returns:
+        The spec for `constraint_spec.compile_constraints`; only the options present.
+    """
+    raw = data.get("constraints") or {}
+    if not isinstance(raw, dict):
+        raise TimetableError("Constraints must be an object")
+    unknown = sorted(set(raw) - {"max_consecutive", "max_daily", "teachers", "subject_spread", "forbidden", "weights"})
+    if unknown:
+        raise TimetableError(f"Unknown constraint option(s): {', '.join(unknown)}")
+    
+    def limit(value: Any, name: str) -> int:
+        try:
+            value = int(value)
+        except (ValueError, TypeError):
+            raise TimetableError(f"Constraint {name} must be a whole number")
+        if value < 1:
+            raise TimetableError(f"Constraint {name} must be at least 1")
+        return value
+    
+    spec: Dict[str, Any] = {}
+    for key in ("max_consecutive", "max_daily"):
+        if raw.get(key) is not None:
+            spec[key] = limit(raw[key], key)
+            
+    teachers = raw.get("teachers") or {}
+    if not isinstance(teachers, dict) or not all(isinstance(v, dict) for v in teachers.values()):
+        raise TimetableError("Constraint teachers must map each teacher to an object of limits")
+    cleaned: Dict[str, Dict[str, int]] = {}
+    for teacher, limits in teachers.items():
+        extra = sorted(set(limits) - {"max_consecutive", "max_daily"})
+        if extra:
+            raise TimetableError(f"Unknown limit(s) for {teacher}: {', '.join(extra)}")
+        cleaned[str(teacher).strip()] = {k: limit(v, k) for k, v in limits.items() if v is not None}
+    if cleaned:
+        spec["teachers"] = cleaned
+        
+    spread = raw.get("subject_spread")
+    if spread is not None:
+        if not isinstance(spread, dict):
+            spread = {"*": spread}
+        spec["subject_spread"] = {str(k).strip(): limit(v, "subject_spread") for k, v in spread.items()}
+        
+    forbidden = raw.get("forbidden") or []
+    if not isinstance(forbidden, list) or not all(isinstance(e, dict) for e in forbidden):
+        raise TimetableError("Forbidden slots must be a list of objects")
+    entries = []
+    for entry in forbidden:
+        if bool(entry.get("subject")) == bool(entry.get("teacher")):
+            raise TimetableError("Each forbidden slot needs either a subject or a teacher")
+        kind = "subject" if entry.get("subject") else "teacher"
+        cleaned_entry: Dict[str, Any] = {kind: str(entry[kind]).strip()}
+        if entry.get("day"):
+            if entry["day"] not in DEFAULT_DAYS:
+                raise TimetableError(f"Unknown day '{entry['day']}' in forbidden slots")
+            cleaned_entry["day"] = entry["day"]
+        if entry.get("period") is not None:
+            period = limit(entry["period"], "period")
+            if period > MAX_PERIODS:
+                raise TimetableError(f"Forbidden period must be between 1 and {MAX_PERIODS}")
+            cleaned_entry["period"] = period
+        entries.append(cleaned_entry)
+    if entries:
+        spec["forbidden"] = entries
+        
+    weights = raw.get("weights") or {}
+    if not isinstance(weights, dict):
+        raise TimetableError("Constraint weights must be an object of rule to weight")
+    soft: Dict[str, int] = {}
+    for rule, weight in weights.items():
+        if rule not in ("max_consecutive", "max_daily", "subject_spread", "forbidden"):
+            raise TimetableError(f"Unknown rule '{rule}' in weights")
+        if weight is None or weight == "hard":
+            continue
+        soft[rule] = limit(weight, "weight")
+    if soft:
+        spec["weights"] = soft
+        
+    return spec
+
+def extract_term_request(data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Extract a /term body: a /generate body plus a "term" calendar.
+    
+    Args:
+        data: The JSON request body. "term" holds weeks (count), an optional
+            start (ISO date of the first Monday), rotation (week labels cycled
+            through, default ["A"]), overrides (week number -> label, e.g. an
+            exam week), variants (label -> subject_hours/unavailable/constraints
+            replacing the body's), holidays (ISO dates or {"week", "day"}) and
+            short_weeks ("resolve" to solve shortened weeks on their own days,
+            "trim" to drop the closed days from the regular week).
+        
+    Returns:
+        Tuple containing:
+            - spec (Dict): The parsed base request, as from `parse_generation_request`.
+            - term (Dict): weeks, start, labels (one per week), closed
+              (week -> closed days), options (label -> generation options)
+              and short_weeks.
+    """
+    from feasibility import check_feasibility
+    
+    spec = parse_generation_request(data)
+    if spec["sections"] is not None:
+        raise TimetableError("Term planning works on single-class requests")
+    raw = data.get("term")
+    if not isinstance(raw, dict):
+        raise TimetableError("A term object is required")
+        
+    try:
+        weeks = int(raw.get("weeks", 0))
+    except (ValueError, TypeError):
+        raise TimetableError("Term weeks must be a whole number")
+    if weeks < 1 or weeks > MAX_TERM_WEEKS:
+        raise TimetableError(f"Term weeks must be between 1 and {MAX_TERM_WEEKS}")
+    start = None
+    if raw.get("start"):
+        try:
+            start = date.fromisoformat(str(raw["start"]))
+        except ValueError:
+            raise TimetableError("Term start must be an ISO date (YYYY-MM-DD)")
+        if start.weekday() != 0:
+            raise TimetableError("Term start must be a Monday")
+            
+    rotation = raw.get("rotation") or ["A"]
+    if not isinstance(rotation, list) or not all(str(label).strip() for label in rotation):
+        raise TimetableError("Rotation must be a list of week labels")
+    labels = [str(rotation[i % len(rotation)]).strip() for i in range(weeks)]
+    overrides = raw.get("overrides") or {}
+    if not isinstance(overrides, dict):
+        raise TimetableError("Overrides must map week numbers to labels")
+    for week, label in overrides.items():
+        try:
+            week = int(week)
+        except (ValueError, TypeError):
+            raise TimetableError("Override weeks must be whole numbers")
+        if not 1 <= week <= weeks:
+            raise TimetableError(f"Override week {week} is outside the term")
+        labels[week - 1] = str(label).strip()
+        
+    variants = raw.get("variants") or {}
+    if not isinstance(variants, dict) or not all(isinstance(v, dict) for v in variants.values()):
+        raise TimetableError("Variants must map week labels to objects")
+    options = {}
+    for label in sorted(set(labels)):
+        variant = variants.get(label, {})
+        unknown = sorted(set(variant) - {"subject_hours", "unavailable", "constraints"})
+        if unknown:
+            raise TimetableError(f"Unknown option(s) in variant {label}: {', '.join(unknown)}")
+        if not variant:
+            options[label] = spec["options"]
+            continue
+        options[label] = extract_generation_options(dict(data, **variant))
+        check_feasibility(spec["subjects"], spec["teachers"], spec["periods_per_day"], **options[label])
+        
+    closed: Dict[int, List[str]] = {}
+    for holiday in raw.get("holidays") or []:
+        if isinstance(holiday, dict):
+            try:
+                week, day = int(holiday["week"]), str(holiday["day"])
+            except (KeyError, ValueError, TypeError):
+                raise TimetableError("Each holiday needs a week and a day")
+        else:
+            if start is None:
+                raise TimetableError("Holidays given as dates need a term start")
+            try:
+                offset = (date.fromisoformat(str(holiday)) - start).days
+            except ValueError:
+                raise TimetableError(f"Invalid holiday date '{holiday}'")
+            week, day = offset // 7 + 1, DEFAULT_DAYS[offset % 7] if offset % 7 < len(DEFAULT_DAYS) else None
+            if day is None:
+                continue
+        if not 1 <= week <= weeks:
+            raise TimetableError(f"Holiday week {week} is outside the term")
+        if day not in DEFAULT_DAYS:
+            raise TimetableError(f"Unknown holiday day '{day}'")
+        closed.setdefault(week, [])
+        if day not in closed[week]:
+            closed[week].append(day)
+            
+    short_weeks = str(raw.get("short_weeks", "resolve"))
+    if short_weeks not in ("resolve", "trim"):
+        raise TimetableError("short_weeks must be 'resolve' or 'trim'")
+        
+    return spec, {
+        "weeks": weeks,
+        "start": start,
+        "labels": labels,
+        "closed": closed,
+        "options": options,
+        "short_weeks": short_weeks
+    }
+
+def extract_batch_request_data(data: Dict[str, Any]) -> Tuple[List[Tuple[str, List[str], List[str]]], int]:
+    """
+    Extract and clean a whole-school request.
+    
+    Args:
+        data: The JSON request body with a "sections" list, where each entry
+            has "name", "subjects" and "teachers".
+        
+    Returns:
+        Tuple containing:
+            - sections (List[Tuple[str, List[str], List[str]]]): (name, subjects, teachers) per section.
+            - periods_per_day (int): Validated periods per day.
+    """
+    sections_raw = data.get("sections")
+    if not isinstance(sections_raw, list):
+        raise TimetableError("Sections must be a list")
+        
+    sections = []
+    periods_per_day = DEFAULT_PERIODS
+    for i, section in enumerate(sections_raw):
+        if not isinstance(section, dict):
+            raise TimetableError("Each section must be an object")
+        subjects, teachers, periods_per_day = extract_request_data({
+            "subjects": section.get("subjects", ""),
+            "teachers": section.get("teachers", ""),
+            "periods_per_day": data.get("periods_per_day", DEFAULT_PERIODS)
+        })
+        name = str(section.get("name") or f"Section {i + 1}").strip()
+        sections.append((name, subjects, teachers))
+        
+    return sections, periods_per_day
+
 def validate_request_data(subjects: List[str], teachers: List[str], periods_per_day: int):
     """
     Validate the extracted data against business rules.
@@ -85,6 +622,33 @@ def validate_request_data(subjects: List[str], teachers: List[str], periods_per_
     if len(subjects) > len(teachers) * 2:
         raise TimetableError("Too many subjects for the number of teachers")
 
+def validate_batch_request_data(sections: List[Tuple[str, List[str], List[str]]], periods_per_day: int):
+    """
+    Validate a whole-school request; every section must pass `validate_request_data`.
+    
+    Args:
+        sections: (name, subjects, teachers) per section.
+        periods_per_day: Number of periods.
+        
+    Raises:
+        TimetableError: If validation fails.
+    """
+    if not sections:
+        raise TimetableError("Please enter at least one section")
+        
+    if len(sections) > MAX_SECTIONS:
+        raise TimetableError(f"Too many sections. Maximum allowed is {MAX_SECTIONS}")
+        
+    names = set()
+    for name, subjects, teachers in sections:
+        if name in names:
+            raise TimetableError(f"Duplicate section name: {name}")
+        names.add(name)
+        try:
+            validate_request_data(subjects, teachers, periods_per_day)
+        except TimetableError as e:
+            raise TimetableError(f"{name}: {e.message}")
+
 def generate_csv(timetable: Dict[str, List[Dict[str, Any]]]) -> str:
     """
     Convert timetable JSON structure to CSV string.
@@ -95,24 +659,195 @@ def generate_csv(timetable: Dict[str, List[Dict[str, Any]]]) -> str:
     Returns:
         CSV formatted string.
     """
-    import io
-    import csv
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Headers
-    headers = ["Day", "Period", "Subject", "Teacher"]
-    writer.writerow(headers)
-    
-    # Rows
-    for day, sessions in timetable.items():
-        for session in sessions:
-            writer.writerow([
-                day,
-                session['period'],
-                session['subject'],
-                session['teacher']
-            ])
-            
-    return output.getvalue()
+    from export import iter_csv
+    
+    return "".join(iter_csv([("", timetable)]))
+
+def extract_export_options(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract export settings and the timetables to export.
+    
+    Args:
+        data: The JSON request body (or query arguments). Timetables come from
+            "timetable" (one), a compact /generate response, "timetables" (a
+            list of {"name", "timetable"} or an object of name to timetable)
+            and/or "result_ids".
+        
+    Returns:
+        Dictionary with format, teacher, week_of, compress, timetables
+        (list of (name, timetable)), result_ids and named.
+    """
+    from export import EXPORT_FORMATS, result_sources
+    from encoding import decode_compact
+    import datetime
+    
+    fmt = str(data.get("format", "csv")).lower()
+    if fmt not in EXPORT_FORMATS:
+        raise TimetableError(f"Unknown export format '{fmt}'. Choose one of: {', '.join(EXPORT_FORMATS)}")
+        
+    week_of = data.get("week_of")
+    if week_of:
+        try:
+            week_of = datetime.date.fromisoformat(str(week_of))
+        except ValueError:
+            raise TimetableError("week_of must be a date like 2024-09-02")
+    
+    timetables = []
+    if data.get("encoding") == "compact":
+        # A compact /generate response posted back as is
+        try:
+            timetables.extend(result_sources("", decode_compact(data)))
+        except (KeyError, IndexError, TypeError):
+            raise TimetableError("Invalid compact timetable")
+    elif data.get("timetable"):
+        timetables.append(("", data["timetable"]))
+    listed = data.get("timetables") or []
+    if isinstance(listed, dict):
+        listed = [{"name": name, "timetable": timetable} for name, timetable in listed.items()]
+    if not isinstance(listed, list):
+        raise TimetableError("Timetables must be a list or an object of name to timetable")
+    for i, entry in enumerate(listed):
+        if not isinstance(entry, dict) or not isinstance(entry.get("timetable"), dict):
+            raise TimetableError("Each timetable entry needs a timetable object")
+        timetables.append((str(entry.get("name") or f"Timetable {i + 1}"), entry["timetable"]))
+    for name, timetable in timetables:
+        if not all(isinstance(sessions, list) for sessions in timetable.values()):
+            raise TimetableError("A timetable must map each day to a list of sessions")
+        
+    result_ids = data.get("result_ids") or []
+    if isinstance(result_ids, str):
+        result_ids = [r.strip() for r in result_ids.split(",") if r.strip()]
+    if not isinstance(result_ids, list):
+        raise TimetableError("Result ids must be a list")
+        
+    if not timetables and not result_ids:
+        raise TimetableError("No timetable data provided")
+        
+    compress = data.get("gzip", False)
+    if isinstance(compress, str):
+        compress = compress.lower() in ("1", "true", "yes")
+        
+    return {
+        "format": fmt,
+        "teacher": str(data["teacher"]).strip() if data.get("teacher") else None,
+        "week_of": week_of or None,
+        "compress": bool(compress),
+        "timetables": timetables,
+        "result_ids": [str(r) for r in result_ids],
+        # One plain timetable keeps the original four-column CSV
+        "named": len(timetables) + len(result_ids) > 1 or bool(result_ids) or bool(listed)
+    }
+
+def extract_history_filters(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract /history filters from query arguments.
+    
+    Args:
+        args: Query arguments (status, strategy, subjects, teachers, periods, since, until).
+        
+    Returns:
+        Filters for `database.history_page` and `database.history_stats`.
+    """
+    filters: Dict[str, Any] = {
+        "status": args.get("status") or None,
+        "strategy": args.get("strategy") or None,
+        "since": args.get("since") or None,
+        "until": args.get("until") or None
+    }
+    for key in ("subjects", "teachers", "periods"):
+        value = args.get(key)
+        if value:
+            try:
+                filters[key] = int(value)
+            except ValueError:
+                raise TimetableError(f"{key} must be an integer")
+    return filters
+
+def extract_timetable_filters(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract /timetables/slots filters from query arguments.
+    
+    Args:
+        args: Query arguments (teacher, day, period, subject, section, timetable).
+        
+    Returns:
+        Filters for `store.query_slots`.
+    """
+    filters: Dict[str, Any] = {key: args.get(key) or None for key in ("teacher", "subject", "section", "timetable")}
+    day = args.get("day")
+    if day:
+        day = day.strip().capitalize()
+        if day not in [d.value for d in DayOfWeek]:
+            raise TimetableError(f"Unknown day '{args.get('day')}'")
+        filters["day"] = day
+    if args.get("period"):
+        try:
+            filters["period"] = int(args["period"])
+        except ValueError:
+            raise TimetableError("period must be an integer")
+    return filters
+
+def extract_repair_request(data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Extract the timetable to repair and the change to apply.
+    
+    Args:
+        data: The JSON request body: a /generate result (inline or as "result"),
+            a "delta" with any of unavailable, subject_hours, add, remove and pin,
+            and optionally the "constraints" spec the timetable was generated with.
+        
+    Returns:
+        Tuple containing:
+            - result (Dict): timetable, subject_teacher_map and optional days/time_slots.
+            - delta (Dict): Keyword arguments for `TimetableRepairer.repair`.
+    """
+    result = data.get("result") or data
+    if not isinstance(result.get("timetable"), dict) or not isinstance(result.get("subject_teacher_map"), dict):
+        raise TimetableError("A timetable and its subject_teacher_map are required")
+    if not all(isinstance(sessions, list) for sessions in result["timetable"].values()):
+        raise TimetableError("A timetable must map each day to a list of sessions")
+        
+    delta = data.get("delta") or {}
+    if not isinstance(delta, dict) or not delta:
+        raise TimetableError("A delta describing the change is required")
+    # Unavailable periods are checked against the width of the timetable being repaired
+    periods = len(result.get("time_slots") or []) or max((len(s) for s in result["timetable"].values()), default=0)
+    options = extract_generation_options({
+        "unavailable": delta.get("unavailable"),
+        "subject_hours": delta.get("subject_hours"),
+        "periods_per_day": periods
+    })
+    
+    add = delta.get("add") or {}
+    if not isinstance(add, dict):
+        raise TimetableError("Add must be an object of subject to {teacher, hours}")
+    try:
+        add = {
+            str(subject).strip(): dict({"teacher": str(spec["teacher"]).strip()},
+                                       **({"hours": int(spec["hours"])} if "hours" in spec else {}))
+            for subject, spec in add.items()
+        }
+    except (KeyError, ValueError, TypeError):
+        raise TimetableError("Each added subject needs a teacher and whole-number hours")
+        
+    remove = delta.get("remove") or []
+    if isinstance(remove, str):
+        remove = [s.strip() for s in remove.split(",") if s.strip()]
+    if not isinstance(remove, list):
+        raise TimetableError("Remove must be a list of subjects")
+        
+    pins = []
+    for pin in delta.get("pin") or []:
+        try:
+            pins.append((str(pin["day"]), int(pin["period"]), str(pin["subject"]).strip()))
+        except (KeyError, ValueError, TypeError):
+            raise TimetableError("Each pin needs a day, a period and a subject")
+        
+    return result, {
+        "unavailable": options["unavailable"],
+        "subject_hours": options["subject_hours"],
+        "add": add,
+        "remove": [str(s).strip() for s in remove],
+        "pins": pins,
+        "constraints": extract_constraint_options(data)
+    }